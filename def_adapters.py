@@ -0,0 +1,168 @@
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from def_schema import CSV_DTYPES
+
+# Broker export adapters.
+#
+# An adapter turns one broker's CSV export into the ledger's columns. It is recognised by
+# its header signature (the columns the export always has), and the first import of a
+# header compiles a MappingPlan for it: which columns to read, the read_csv dtypes (labels
+# straight to categoricals) and the adapter's conversion. Plans are cached per exact
+# header, so later imports of the same export skip detection. Conversions are whole-column
+# pandas/numpy operations, and labels derived from numbers or dates are formatted once per
+# distinct value, so a new broker never brings back per-row Python loops.
+#
+#   plan = adapters.plan_for(header)        # detection, cached per header
+#   new_data = plan.read('statement.csv')   # ledger columns, ready for LedgerValidation
+#
+# A new broker is a BrokerAdapter subclass with its signature, dtypes and convert():
+#
+#   class MyBroker(BrokerAdapter):
+#       name = 'My Broker'
+#       required = ['Trade Date', 'Instrument', 'Net P/L']
+#       def convert(self, frame): ...
+#
+#   adapters.register(MyBroker())
+
+LEDGER_COLUMNS = [
+    'TextDate', 'Summary', 'MarketName', 'Period', 'ProfitAndLoss', 'Transaction type',
+    'Reference', 'Open level', 'Close level', 'Size', 'Currency', 'PL Amount',
+    'Cash transaction', 'DateUtc', 'OpenDateUtc', 'CurrencyIsoCode'
+]
+IG_SIGNATURE = ['DateUtc', 'OpenDateUtc', 'PL Amount', 'Transaction type', 'MarketName']
+TEXT_DATE_FORMAT = '%d/%m/%Y'
+
+def labels(values, formatter):
+    # Categorical of formatter(value), formatting each distinct value once; missing stays missing
+    codes, uniques = pd.factorize(values)
+    label_codes, categories = pd.factorize(np.array([formatter(value) for value in uniques], dtype=object))
+    label_codes = np.append(label_codes, -1)[codes]  # code -1 (missing) stays -1
+    return pd.Series(pd.Categorical.from_codes(label_codes, categories=categories), index=values.index)
+
+def day_labels(dates):
+    # TextDate ('31/12/2008') of every timestamp, formatted once per distinct day
+    return labels(dates.dt.normalize(), lambda day: day.strftime(TEXT_DATE_FORMAT))
+
+class BrokerAdapter:
+    name = 'Broker'
+    required = []  # header columns that identify the export
+    optional = []  # read when present
+    dtypes = {}  # read_csv dtypes of the source columns
+
+    def matches(self, header):
+        return set(self.required) <= set(header)
+
+    def convert(self, frame):
+        # Source columns -> ledger columns; whole-column operations only
+        return frame
+
+class IGAdapter(BrokerAdapter):
+    # The ledger's own format; the plan is a plain read with the schema dtypes
+    name = 'IG'
+    required = IG_SIGNATURE
+    optional = [column for column in LEDGER_COLUMNS + ['Balance', 'Daily Return'] if column not in IG_SIGNATURE]
+    dtypes = CSV_DTYPES
+
+class MetaTraderAdapter(BrokerAdapter):
+    # MetaTrader-style account history: one row per closed ticket, buy/sell in 'Type' with an
+    # unsigned volume, and 'balance' rows for deposits (positive) and withdrawals (negative).
+    # Net P&L is Profit + Commission + Swap; times are 'YYYY.MM.DD HH:MM:SS'.
+    name = 'MetaTrader'
+    required = ['Ticket', 'Open Time', 'Type', 'Volume', 'Symbol', 'Open Price', 'Close Time', 'Close Price', 'Profit']
+    optional = ['Commission', 'Swap']
+    dtypes = {'Ticket': str, 'Type': 'category', 'Symbol': 'category', 'Open Time': str, 'Close Time': str}
+    date_format = '%Y.%m.%d %H:%M:%S'
+    sides = {'buy': 1, 'sell': -1}
+
+    def convert(self, frame):
+        kind = frame['Type'].astype(str).str.lower()
+        side = kind.map(self.sides).to_numpy(dtype=float)  # NaN on balance rows
+        cash = (kind == 'balance').to_numpy()
+        pnl = pd.to_numeric(frame['Profit'], errors='coerce').to_numpy(dtype=float)
+        for column in self.optional:
+            if column in frame.columns:
+                pnl = pnl + np.nan_to_num(pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=float))
+        closed = pd.to_datetime(frame['Close Time'], format=self.date_format, errors='coerce')
+        opened = pd.to_datetime(frame['Open Time'], format=self.date_format, errors='coerce')
+        # Balance rows carry one time; it is the close time of the ledger row
+        closed = closed.where(~cash | closed.notna(), opened)
+        opened = opened.where(~cash, closed)
+
+        transaction = np.select([cash & (pnl < 0), cash], ['WITH', 'DEPO'], 'DEAL')
+        summary = np.select([cash & (pnl < 0), cash], ['Cash Out', 'Cash In'], 'Closing trades')
+        size = pd.Series(pd.to_numeric(frame['Volume'], errors='coerce').to_numpy(dtype=float) * side, index=frame.index)
+        pnl = pd.Series(pnl, index=frame.index)
+        return pd.DataFrame({
+            'TextDate': day_labels(closed),
+            'Summary': pd.Categorical(summary),
+            'MarketName': frame['Symbol'],  # empty on balance rows
+            'Period': '-',
+            'ProfitAndLoss': labels(pnl, lambda value: f"{value:,.2f}"),
+            'Transaction type': pd.Categorical(transaction),
+            'Reference': frame['Ticket'],
+            'Open level': pd.to_numeric(frame['Open Price'], errors='coerce').astype('Float64').where(~cash),
+            'Close level': pd.to_numeric(frame['Close Price'], errors='coerce').astype('Float64').where(~cash),
+            'Size': size.astype('Float64'),
+            'Currency': None,  # account currency is not in the export
+            'PL Amount': pnl,
+            'Cash transaction': pd.array(cash, dtype='boolean'),
+            'DateUtc': closed,
+            'OpenDateUtc': opened,
+            'CurrencyIsoCode': None,
+        }, index=frame.index)
+
+class MappingPlan:
+
+    def __init__(self, adapter, header):
+        self.adapter = adapter
+        self.header = tuple(header)
+        wanted = set(adapter.required) | set(adapter.optional)
+        self.usecols = [column for column in self.header if column in wanted]
+        self.dtypes = {column: dtype for column, dtype in adapter.dtypes.items() if column in self.usecols}
+
+    def read(self, file_path):
+        frame = pd.read_csv(file_path, usecols=self.usecols, dtype=self.dtypes)
+        return self.adapter.convert(frame)
+
+class AdapterRegistry:
+
+    def __init__(self):
+        self.adapters = []
+        self.plans = {}  # header -> MappingPlan
+        self.lock = threading.Lock()
+
+    def register(self, adapter, first=False):
+        # A specific format goes first when its signature overlaps a broader one
+        with self.lock:
+            if first:
+                self.adapters.insert(0, adapter)
+            else:
+                self.adapters.append(adapter)
+            self.plans.clear()
+
+    def unregister(self, name):
+        with self.lock:
+            self.adapters = [adapter for adapter in self.adapters if adapter.name != name]
+            self.plans.clear()
+
+    def plan_for(self, header):
+        header = tuple(header)
+        with self.lock:
+            plan = self.plans.get(header)
+            if plan is None:
+                adapter = next((adapter for adapter in self.adapters if adapter.matches(header)), None)
+                if adapter is None:
+                    raise ValueError(f"Unrecognised export format; columns: {', '.join(header)}")
+                plan = self.plans[header] = MappingPlan(adapter, header)
+                logging.info(f"Export format detected: {adapter.name} ({len(plan.usecols)} of {len(header)} columns)")
+        return plan
+
+    def read(self, file_path):
+        header = pd.read_csv(file_path, nrows=0).columns
+        return self.plan_for(header).read(file_path)
+
+adapters = AdapterRegistry()
+adapters.register(IGAdapter())
+adapters.register(MetaTraderAdapter())
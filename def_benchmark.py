@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import shutil
+import subprocess
+import statistics
+import numpy as np
+import pandas as pd
+from def_dataframes import DataFrameOperations
+from def_ingest import read_import, known_rows, commit_import
+from def_ledger_store import store_directory
+from def_metrics import TradingMetrics
+
+# Benchmark harness with a synthetic ledger generator. Headless, like def_report.
+#
+#   python def_benchmark.py --rows 10000 1000000 --markets 50 --output bench_results.json
+#   python def_benchmark.py --rows 10000 --compare bench_results.json
+
+# Same headers, in the same order, as FileOperations.create_empty_csv
+LEDGER_HEADERS = [
+    'TextDate', 'Summary', 'MarketName', 'Period', 'ProfitAndLoss', 'Transaction type',
+    'Reference', 'Open level', 'Close level', 'Size', 'Currency', 'PL Amount',
+    'Cash transaction', 'DateUtc', 'OpenDateUtc', 'CurrencyIsoCode'
+]
+
+MARKET_PREFIXES = ['Spot FX', 'Spot FX (mini)']
+CURRENCIES = ['AUD', 'USD', 'EUR', 'GBP', 'JPY', 'CHF', 'CAD', 'NZD', 'CZK', 'SGD']
+DEFAULT_ROWS = [10_000, 1_000_000, 10_000_000]
+CHUNK_ROWS = 1_000_000
+STEPS = ['ingest', 'calculate_metrics', 'generate_report', 'market_switch', 'date_refilter']
+
+def synthetic_markets(count):
+    pairs = [(base, quote) for base in CURRENCIES for quote in CURRENCIES if base != quote]
+    markets = []
+    for i in range(count):
+        base, quote = pairs[i % len(pairs)]
+        prefix = MARKET_PREFIXES[(i // len(pairs)) % len(MARKET_PREFIXES)]
+        batch = i // (len(pairs) * len(MARKET_PREFIXES))
+        markets.append(f"{prefix} {base}/{quote}" + (f" #{batch}" if batch else ""))
+    return markets
+
+def format_money(values):
+    # IG exports use thousands separators, which the ingestion path has to strip
+    return pd.Series(values).map('{:,.2f}'.format)
+
+def generate_chunk(rng, start_row, rows, markets, start_time):
+    row_index = np.arange(start_row, start_row + rows)
+
+    # Roughly 96% closed deals, 3% CFD funding, 1% cash movements; the first row is always a deposit
+    kind = rng.choice(4, size=rows, p=[0.96, 0.015, 0.015, 0.01])
+    if start_row == 0:
+        kind[0] = 3
+    is_deal = kind == 0
+    is_funding_paid = kind == 1
+    is_funding_received = kind == 2
+    is_cash = kind == 3
+
+    close_time = start_time + (row_index * 600 + rng.integers(0, 600, size=rows)).astype('timedelta64[s]')
+    holding = np.where(is_deal, rng.exponential(4 * 3600, size=rows).astype(np.int64), 0).astype('timedelta64[s]')
+    open_time = close_time - holding
+
+    pl_amount = np.round(rng.normal(5.0, 120.0, size=rows), 2)
+    pl_amount = np.where(is_funding_paid, -np.round(rng.uniform(0.01, 5.0, size=rows), 2), pl_amount)
+    pl_amount = np.where(is_funding_received, np.round(rng.uniform(0.01, 2.0, size=rows), 2), pl_amount)
+    cash_in = rng.random(size=rows) < 0.8
+    pl_amount = np.where(is_cash, np.where(cash_in, 1000.0, -500.0), pl_amount)
+    if start_row == 0:
+        pl_amount[0] = 10_000.0
+
+    size = np.round(rng.choice([0.25, 0.5, 1.0, 2.0, 5.0], size=rows) * rng.choice([-1, 1], size=rows), 2)
+    open_level = np.round(rng.uniform(1_000, 25_000, size=rows), 1)
+    close_level = np.round(open_level + rng.normal(0, 25, size=rows), 1)
+
+    market = np.asarray(markets, dtype=object)[rng.integers(0, len(markets), size=rows)]
+    summary = np.select(
+        [is_deal, is_funding_paid, is_funding_received, is_cash & cash_in],
+        ['Closing trades', 'CFD funding Interest Paid', 'CFD funding Interest Recieved', 'Cash In'],
+        'Cash Out')
+    transaction_type = np.select([is_deal, is_funding_paid, is_cash & ~cash_in], ['DEAL', 'WITH', 'WITH'], 'DEPO')
+
+    close_series = pd.Series(close_time)
+    pl_text = format_money(pl_amount)
+    return pd.DataFrame({
+        'TextDate': close_series.dt.strftime('%d/%m/%Y'),
+        'Summary': summary,
+        'MarketName': np.where(is_cash, 'BPAY RECEIVED', market),
+        'Period': '-',
+        'ProfitAndLoss': np.where(is_cash, 'A$' + pl_text, pl_text),
+        'Transaction type': transaction_type,
+        'Reference': pd.Series(row_index).map('SYN{:08X}'.format),
+        'Open level': np.where(is_deal, open_level.astype(str), '-'),
+        'Close level': np.where(is_deal, close_level, 0.0),
+        'Size': np.where(is_deal, pd.Series(size).map('{:+g}'.format), '-'),
+        'Currency': 'A$',
+        'PL Amount': pl_text,
+        'Cash transaction': is_cash,
+        'DateUtc': close_series.dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'OpenDateUtc': pd.Series(open_time).dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'CurrencyIsoCode': 'AUD',
+    }, columns=LEDGER_HEADERS)
+
+def generate_ledger(file_path, rows, market_count=20, seed=0):
+    # Written in chunks so 10M-row ledgers never have to fit in memory at once
+    rng = np.random.default_rng(seed)
+    markets = synthetic_markets(market_count)
+    start_time = np.datetime64('2008-05-29T23:00:00')
+    written = 0
+    with open(file_path, 'w', newline='', encoding='utf-8') as f:
+        while written < rows:
+            chunk_rows = min(CHUNK_ROWS, rows - written)
+            chunk = generate_chunk(rng, written, chunk_rows, markets, start_time)
+            chunk.to_csv(f, index=False, header=written == 0)
+            written += chunk_rows
+    logging.info(f"Generated synthetic ledger {file_path}: {rows} rows across {market_count} markets")
+    return file_path
+
+def ledger_path(data_dir, rows, market_count, seed):
+    return os.path.join(data_dir, f"synthetic_{rows}_{market_count}m_seed{seed}.csv")
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def ingest(file_path, master_path):
+    # Mirrors FileOperations.updateFile without the dialog and widget refresh
+    new_data, _, _ = read_import(file_path, master_path)
+    master_data = DataFrameOperations.read_master(master_path)
+    new_data = new_data[~known_rows(master_data, new_data, master_path)]
+    return commit_import(master_data, new_data, master_path)
+
+def evaluate_report(metrics):
+    values = []
+    for title, metric_func in metrics.generate_report():
+        try:
+            values.append(metric_func())
+        except Exception as e:
+            logging.debug(f"Benchmark metric {title} failed: {str(e)}")
+    return values
+
+def switch_markets(metrics, markets):
+    for market in markets:
+        metrics.filter_by_market(market)
+    metrics.filter_by_market(None)
+
+def refilter_dates(metrics, start_date, end_date):
+    metrics.start_date = start_date
+    metrics.end_date = end_date
+    metrics.filter_by_market(None)
+
+def run_case(file_path, data_dir, repeat, switch_count):
+    results = {step: [] for step in STEPS}
+    master_path = os.path.join(data_dir, "bench_master.csv")
+
+    for _ in range(repeat):
+        shutil.rmtree(store_directory(master_path), ignore_errors=True)
+        with open(master_path, 'w', newline='') as f:
+            f.write(",".join(LEDGER_HEADERS) + "\n")
+        seconds, _ = timed(lambda: ingest(file_path, master_path))
+        results['ingest'].append(seconds)
+
+        trades = DataFrameOperations.load_ledger(file_path)
+        metrics = TradingMetrics(trades)
+        seconds, _ = timed(metrics.calculate_metrics)
+        results['calculate_metrics'].append(seconds)
+
+        seconds, _ = timed(lambda: evaluate_report(metrics))
+        results['generate_report'].append(seconds)
+
+        markets = sorted(trades.loc[trades['Transaction type'] == 'DEAL', 'MarketName'].unique())[:switch_count]
+        seconds, _ = timed(lambda: switch_markets(metrics, markets))
+        results['market_switch'].append(seconds / max(len(markets) + 1, 1))
+
+        first, last = trades['DateUtc'].min(), trades['DateUtc'].max()
+        quarter = (last - first) / 4
+        seconds, _ = timed(lambda: refilter_dates(metrics, (first + quarter).date(), (last - quarter).date()))
+        results['date_refilter'].append(seconds)
+
+    shutil.rmtree(store_directory(master_path), ignore_errors=True)
+    if os.path.exists(master_path):
+        os.remove(master_path)
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+def summarize(times):
+    return {'best': min(times), 'median': statistics.median(times), 'runs': times}
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    baseline_cases = {(case['rows'], case['markets'], case['step']): case for case in baseline['results']}
+    regressions = 0
+    print(f"{'rows':>10} {'markets':>7} {'step':<18} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for case in results:
+        old = baseline_cases.get((case['rows'], case['markets'], case['step']))
+        if old is None:
+            continue
+        ratio = case['best'] / old['best'] if old['best'] else float('inf')
+        flag = " REGRESSION" if ratio > 1 + threshold else ""
+        regressions += bool(flag)
+        print(f"{case['rows']:>10} {case['markets']:>7} {case['step']:<18} {old['best']:>10.4f} {case['best']:>10.4f} {ratio:>7.2f}{flag}")
+    return regressions
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark finapp ingestion and metrics on synthetic ledgers.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="Ledger sizes to benchmark")
+    parser.add_argument('--markets', type=int, default=20, help="Number of markets in each synthetic ledger")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--switch-count', type=int, default=5, help="Markets visited in the market switching step")
+    parser.add_argument('--data-dir', default='bench_data', help="Where synthetic ledgers are generated and reused")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help="Baseline results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Allowed slowdown before a step counts as a regression")
+    parser.add_argument('--generate-only', action='store_true')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    results = []
+    for rows in args.rows:
+        file_path = ledger_path(args.data_dir, rows, args.markets, args.seed)
+        if not os.path.exists(file_path):
+            generate_ledger(file_path, rows, args.markets, args.seed)
+        if args.generate_only:
+            continue
+
+        case = run_case(file_path, args.data_dir, args.repeat, args.switch_count)
+        for step in STEPS:
+            results.append({'rows': rows, 'markets': args.markets, 'step': step, **summarize(case[step])})
+            logging.info(f"{rows} rows, {step}: best {min(case[step]):.4f}s")
+
+    if args.generate_only:
+        return 0
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Benchmark results written to {args.output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
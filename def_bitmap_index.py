@@ -0,0 +1,151 @@
+import json
+import logging
+import numpy as np
+import pandas as pd
+from def_schema import float_values
+from def_sessions import SESSION_NAMES, OFF_HOURS, session_masks, in_session
+
+# Bitmap indexes over derived trade attributes, for filters that combine several dimensions.
+#
+# Every (dimension, value) pair is a packed bitset over the ledger rows (one bit per row,
+# 64 rows per uint64 word), built once per ledger. A filter is an expression over those
+# pairs and resolves with bitwise AND/OR/NOT on the words, so a 2M-row ledger is combined
+# 31k words at a time and only the final bitset is expanded into a row selection:
+#
+#   {'direction': 'long', 'duration': ['<15m', '15m-1h']}    # long AND (<15m OR 15m-1h)
+#   ('or', {'outcome': 'win'}, {'session': 'London'})          # any expression, nested
+#   ('not', {'summary': 'Closing trades'})
+#
+# A dict ANDs its dimensions and ORs the values listed for one dimension; ('and', ...),
+# ('or', ...) and ('not', expression) nest; None selects every row.
+
+DIRECTIONS = ['long', 'short']  # sign of Size
+OUTCOMES = ['win', 'loss']  # DEAL rows only, PL Amount > 0 / <= 0 as in profitable_trades/losing_trades
+SIZE_BUCKETS = [('<=1', 1), ('1-2', 2), ('2-5', 5), ('5-10', 10), ('>10', np.inf)]  # |Size| up to and including the edge
+DURATION_BUCKETS = [  # holding period in hours, below the edge
+    ('<15m', 0.25), ('15m-1h', 1), ('1h-4h', 4), ('4h-1d', 24), ('1d-1w', 24 * 7), ('>1w', np.inf)]
+DIMENSIONS = ['direction', 'size', 'duration', 'outcome', 'transaction', 'summary', 'session']
+WORD_BITS = 64
+
+def pack(mask):
+    # Boolean array -> uint64 words, row i in bit i % 64 of word i // 64
+    mask = np.asarray(mask, dtype=bool)
+    padded = np.zeros(-(-len(mask) // WORD_BITS) * WORD_BITS, dtype=bool)
+    padded[:len(mask)] = mask
+    return np.packbits(padded, bitorder='little').view(np.uint64)
+
+def unpack(bitmap, rows):
+    return np.unpackbits(bitmap.view(np.uint8), count=rows, bitorder='little').view(bool)
+
+def popcount(bitmap):
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(bitmap).sum())
+    return int(np.unpackbits(bitmap.view(np.uint8)).sum())
+
+def bucket_codes(values, buckets, right):
+    # Bucket number of every value, -1 where the value is missing
+    edges = np.array([edge for _, edge in buckets[:-1]])
+    codes = np.searchsorted(edges, values, side='right' if right else 'left')
+    codes[np.isnan(values)] = -1
+    return codes
+
+def holding_hours(trades):
+    if 'duration' in trades.columns:
+        return trades['duration'].to_numpy(dtype=float)
+    return ((trades['DateUtc'] - trades['OpenDateUtc']).dt.total_seconds() / 3600).to_numpy(dtype=float)
+
+def canonical(expression):
+    # Stable text of an expression, for cache keys and labels
+    return json.dumps(expression, sort_keys=True, default=str)
+
+class BitmapIndex:
+
+    def __init__(self, trades):
+        self.rows = len(trades)
+        self.bitmaps = {}
+        self.everything = pack(np.ones(self.rows, dtype=bool))
+        if trades.empty:
+            return
+
+        size = float_values(trades['Size']) if 'Size' in trades.columns else np.full(self.rows, np.nan)
+        self.add_mask('direction', 'long', size > 0)
+        self.add_mask('direction', 'short', size < 0)
+        self.add_codes('size', bucket_codes(np.abs(size), SIZE_BUCKETS, right=False), [label for label, _ in SIZE_BUCKETS])
+        self.add_codes('duration', bucket_codes(holding_hours(trades), DURATION_BUCKETS, right=True),
+                       [label for label, _ in DURATION_BUCKETS])
+
+        deals = (trades['Transaction type'] == 'DEAL').to_numpy()
+        pnl = float_values(trades['PL Amount'])
+        self.add_mask('outcome', 'win', deals & (pnl > 0))
+        self.add_mask('outcome', 'loss', deals & (pnl <= 0))
+
+        for dimension, column in (('transaction', 'Transaction type'), ('summary', 'Summary')):
+            if column in trades.columns:
+                codes, values = pd.factorize(trades[column], sort=True)
+                self.add_codes(dimension, codes, list(values))
+
+        masks = session_masks(trades['DateUtc'])
+        for session in SESSION_NAMES + [OFF_HOURS]:
+            self.add_mask('session', session, in_session(masks, session))
+        logging.info(f"Bitmap index: {sum(len(values) for values in self.bitmaps.values())} bitmaps over {self.rows} rows")
+
+    def add_mask(self, dimension, value, mask):
+        self.bitmaps.setdefault(dimension, {})[value] = pack(mask)
+
+    def add_codes(self, dimension, codes, values):
+        for code, value in enumerate(values):
+            self.add_mask(dimension, value, codes == code)
+
+    def values(self, dimension):
+        return list(self.bitmaps.get(dimension, {}))
+
+    def bitmap(self, dimension, value):
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown filter dimension: {dimension}")
+        # A value the ledger never has selects nothing (e.g. a Summary category of another ledger)
+        return self.bitmaps.get(dimension, {}).get(value, np.zeros_like(self.everything))
+
+    def evaluate(self, expression):
+        # Packed bitset of the rows an expression selects
+        if expression is None:
+            return self.everything
+        if isinstance(expression, dict):
+            result = self.everything
+            for dimension, values in expression.items():
+                if isinstance(values, (list, tuple, set)):
+                    selected = np.zeros_like(self.everything)
+                    for value in values:
+                        selected = selected | self.bitmap(dimension, value)
+                else:
+                    selected = self.bitmap(dimension, values)
+                result = result & selected
+            return result
+        if isinstance(expression, (list, tuple)) and expression:
+            operator, operands = expression[0], expression[1:]
+            if operator == 'not' and len(operands) == 1:
+                return self.everything & ~self.evaluate(operands[0])
+            if operator == 'and':
+                result = self.everything
+                for operand in operands:
+                    result = result & self.evaluate(operand)
+                return result
+            if operator == 'or':
+                result = np.zeros_like(self.everything)
+                for operand in operands:
+                    result = result | self.evaluate(operand)
+                return result
+        raise ValueError(f"Invalid filter expression: {expression!r}")
+
+    def mask(self, expression):
+        return unpack(self.evaluate(expression), self.rows)
+
+    def positions(self, expression):
+        return np.flatnonzero(self.mask(expression))
+
+    def count(self, expression):
+        return popcount(self.evaluate(expression))
+
+    def counts(self, dimension, expression=None):
+        # {value: rows} of one dimension within an expression, e.g. for filter menus
+        selected = self.evaluate(expression)
+        return {value: popcount(selected & bitmap) for value, bitmap in self.bitmaps.get(dimension, {}).items()}
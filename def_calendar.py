@@ -0,0 +1,175 @@
+import copy
+import logging
+import numpy as np
+import pandas as pd
+from def_timezones import to_local_seconds, utc_seconds
+from def_schema import cents_values, to_money
+
+# Calendar aggregation cube: P&L, trade count and wins of DEAL rows bucketed by
+# year-month, ISO week, weekday and hour of day in one of the world-clock timezones.
+#
+# Every bucket is integer arithmetic on local epoch seconds (no datetime objects), and
+# the cube only keeps one row per occupied (year-month, weekday, hour) cell plus one per
+# ISO week, so it stays a few thousand rows however long the ledger gets. New imports are
+# folded in with add(); tables and heatmaps are group-bys over the cells. P&L is summed
+# in cents, so cells merged over many imports stay exact, and reported in dollars.
+#
+#   cube = CalendarCube.from_trades(trades, timezone='America/New_York')
+#   cube.table('weekday')                   # pnl / trades / wins / win_rate per weekday
+#   cube.heatmap('weekday', 'hour', 'pnl')  # 7 x 24 grid
+
+DIMENSIONS = ['year', 'month', 'year_month', 'iso_week', 'weekday', 'hour']
+MEASURES = ['pnl', 'trades', 'wins']
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+CELL_SIZE = 7 * 24  # weekday x hour cells per year-month
+
+def civil_from_days(days):
+    # Days since 1970-01-01 to (year, month, day) in the proleptic Gregorian calendar
+    days = np.asarray(days, dtype=np.int64) + 719468
+    era = np.floor_divide(days, 146097)
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    shifted_month = (5 * day_of_year + 2) // 153  # March-based
+    day = day_of_year - (153 * shifted_month + 2) // 5 + 1
+    month = np.where(shifted_month < 10, shifted_month + 3, shifted_month - 9)
+    year = year_of_era + era * 400 + (month <= 2)
+    return year, month, day
+
+def days_from_civil(year, month, day):
+    year = np.asarray(year, dtype=np.int64) - (np.asarray(month) <= 2)
+    era = np.floor_divide(year, 400)
+    year_of_era = year - era * 400
+    shifted_month = (np.asarray(month) + 9) % 12
+    day_of_year = (153 * shifted_month + 2) // 5 + np.asarray(day) - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+def iso_weeks(days, weekday):
+    # ISO week as iso_year * 100 + week: the week belongs to the year of its Thursday
+    thursday = days - weekday + 3
+    iso_year, _, _ = civil_from_days(thursday)
+    week = (thursday - days_from_civil(iso_year, 1, 1)) // 7 + 1
+    return iso_year * 100 + week
+
+def calendar_keys(times, timezone='UTC'):
+    # Integer calendar buckets of naive-UTC timestamps in `timezone`
+    local = to_local_seconds(timezone, utc_seconds(times))
+    days = np.floor_divide(local, 86400)
+    weekday = (days + 3) % 7  # 1970-01-01 was a Thursday; 0 = Monday
+    year, month, _ = civil_from_days(days)
+    return {
+        'year_month': year * 12 + month - 1,
+        'iso_week': iso_weeks(days, weekday),
+        'weekday': weekday,
+        'hour': np.floor_divide(local - days * 86400, 3600),
+    }
+
+def accumulate(keys, pnl, wins):
+    # Sums per distinct key via bincount over the key span
+    base = keys.min()
+    slots = keys - base
+    trades = np.bincount(slots)
+    occupied = np.flatnonzero(trades)
+    return pd.DataFrame({
+        'pnl': np.bincount(slots, weights=pnl)[occupied],
+        'trades': trades[occupied],
+        'wins': np.bincount(slots, weights=wins)[occupied].astype(np.int64),
+    }, index=pd.Index(occupied + base, name='key'))
+
+def merge(table, update):
+    if table.empty:
+        return update
+    merged = table.add(update, fill_value=0)
+    return merged.astype({'trades': np.int64, 'wins': np.int64})
+
+def with_win_rate(table):
+    table['win_rate'] = table['wins'] / table['trades'].where(table['trades'] > 0)
+    return table
+
+class CalendarCube:
+
+    def __init__(self, timezone='UTC'):
+        self.timezone = timezone
+        self.cells = pd.DataFrame(columns=MEASURES)  # key: year_month * CELL_SIZE + weekday * 24 + hour; pnl in cents
+        self.weeks = pd.DataFrame(columns=MEASURES)  # key: iso_year * 100 + week; pnl in cents
+        self.rows = 0
+
+    @classmethod
+    def from_trades(cls, trades, timezone='UTC'):
+        cube = cls(timezone)
+        cube.add(trades)
+        return cube
+
+    def __len__(self):
+        return self.rows
+
+    def add(self, trades):
+        # Folds new ledger rows into the cube; non-DEAL rows and rows without a date are ignored
+        if trades is None or trades.empty:
+            return self
+        if 'Transaction type' in trades.columns:
+            trades = trades[trades['Transaction type'] == 'DEAL']
+        times = pd.to_datetime(trades['DateUtc'], errors='coerce')
+        cents = cents_values(trades).astype(float)
+        valid = times.notna().to_numpy()
+        if not valid.any():
+            return self
+
+        keys = calendar_keys(times[valid], self.timezone)
+        cents = cents[valid]
+        wins = (cents > 0).astype(float)
+        cell_keys = (keys['year_month'] * 7 + keys['weekday']) * 24 + keys['hour']
+        self.cells = merge(self.cells, accumulate(cell_keys, cents, wins))
+        self.weeks = merge(self.weeks, accumulate(keys['iso_week'], cents, wins))
+        self.rows += int(valid.sum())
+        logging.debug(f"Calendar cube ({self.timezone}): {self.rows} trades in {len(self.cells)} cells")
+        return self
+
+    def extended(self, trades):
+        # A new cube with the rows folded in; add() rebinds its tables, so this cube, which
+        # other threads or the result cache may still hold, is left as it was
+        return copy.copy(self).add(trades)
+
+    def cell_frame(self):
+        keys = self.cells.index.to_numpy(dtype=np.int64)
+        year_month = keys // CELL_SIZE
+        frame = self.cells.reset_index(drop=True)
+        frame['pnl'] = to_money(frame['pnl'])
+        frame['year'] = year_month // 12
+        frame['month'] = year_month % 12 + 1
+        frame['year_month'] = frame['year'].astype(str) + '-' + frame['month'].astype(str).str.zfill(2)
+        frame['weekday'] = (keys // 24) % 7
+        frame['hour'] = keys % 24
+        return frame
+
+    def table(self, dimension):
+        # pnl / trades / wins / win_rate per value of one dimension
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown calendar dimension: {dimension}")
+        if dimension == 'iso_week':
+            table = self.weeks.assign(pnl=to_money(self.weeks['pnl']))
+            table.index = pd.Index(self.weeks.index.astype(np.int64), name='iso_week')
+        elif self.cells.empty:
+            table = pd.DataFrame(columns=MEASURES, index=pd.Index([], name=dimension))
+        else:
+            table = self.cell_frame().groupby(dimension)[MEASURES].sum()
+        return with_win_rate(table.sort_index())
+
+    def heatmap(self, rows, columns, measure='pnl'):
+        # rows x columns grid of one measure (pnl, trades, wins or win_rate); empty cells are NaN
+        if 'iso_week' in (rows, columns):
+            raise ValueError("ISO weeks are only available as a one-dimensional table")
+        if self.cells.empty:
+            return pd.DataFrame()
+        grouped = with_win_rate(self.cell_frame().groupby([rows, columns])[MEASURES].sum())
+        grid = grouped[measure].unstack(columns)
+        if columns == 'hour':
+            grid = grid.reindex(columns=range(24))
+        elif columns == 'weekday':
+            grid = grid.reindex(columns=range(7))
+        elif columns == 'month':
+            grid = grid.reindex(columns=range(1, 13))
+        if rows == 'weekday':
+            grid = grid.reindex(range(7))
+        return grid
@@ -0,0 +1,579 @@
+import math
+import logging
+from datetime import datetime, timezone
+from PyQt5.QtCore import Qt, QThread, QRect, QRectF, QPointF, pyqtSignal
+from PyQt5.QtGui import QPainter, QPainterPath, QPolygonF, QPen, QColor, QPixmap
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox
+from def_timezones import WORLD_CLOCKS
+
+# Lightweight chart widgets drawn with QPainter (no matplotlib). Everything a chart needs is
+# prepared on a ChartDataLoader thread; on the GUI thread each chart keeps its rendered frame
+# in a pixmap and its curve in a cached QPainterPath, so hovering only repaints the crosshair
+# strips and a new frame is only drawn when the data, the size or the zoom changes.
+
+BACKGROUND = QColor('#001f3f')
+PLOT_BACKGROUND = QColor('#002f5f')
+GRID = QColor(255, 255, 255, 35)
+TEXT = QColor('#ffffff')
+POSITIVE = QColor('#00ff00')
+NEGATIVE = QColor('#ff4136')
+EPISODE = QColor(255, 65, 54, 45)
+MARGIN_LEFT, MARGIN_TOP, MARGIN_RIGHT, MARGIN_BOTTOM = 72, 26, 16, 28
+HISTOGRAM_BINS = 50
+TOP_EPISODES = 5
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+CALENDAR_ZONES = [('UTC', 'UTC')] + WORLD_CLOCKS  # choices for the weekday x hour heatmap
+
+def prepare_calendar_data(metrics, calendar_timezone):
+    # Weekday x hour P&L grid in the chosen zone; the cube is cached per zone
+    data = {'calendar_timezone': calendar_timezone}
+    if metrics.filtered_trades.empty:
+        return data
+    weekday_hour = metrics.calendar_cube(calendar_timezone).heatmap('weekday', 'hour', 'pnl')
+    if not weekday_hour.empty:
+        data['weekday_hour'] = weekday_hour.to_numpy(dtype=float)
+    return data
+
+def prepare_chart_data(metrics, calendar_timezone='UTC'):
+    # Runs on the loader thread; numpy/pandas are already loaded by the time charts refresh
+    import numpy as np
+    import pandas as pd
+    from def_downsample import to_seconds
+
+    data = {'calendar_timezone': calendar_timezone}
+    if metrics.filtered_trades.empty:
+        return data
+
+    data['equity'] = metrics.evaluate('equity_pyramid')
+    data['underwater'] = metrics.evaluate('underwater_pyramid')
+
+    episodes = metrics.drawdown_episodes(top=TOP_EPISODES)
+    last_time = metrics.filtered_trades['DateUtc'].max()
+    data['episodes'] = [
+        (to_seconds([row.start])[0], to_seconds([row.recovery if row.recovered else last_time])[0], row.depth)
+        for row in episodes.itertuples()
+    ]
+
+    returns = metrics.evaluate('returns')
+    returns = returns[np.isfinite(returns)] if len(returns) else returns
+    if len(returns):
+        data['histogram'] = np.histogram(returns, bins=HISTOGRAM_BINS)
+        dates = pd.to_datetime(returns.index)
+        monthly = (1 + returns).groupby([dates.year, dates.month]).prod() - 1
+        data['monthly'] = {(int(year), int(month)): value for (year, month), value in monthly.items()}
+
+    data.update(prepare_calendar_data(metrics, calendar_timezone))
+    return data
+
+class ChartDataLoader(QThread):
+    loaded = pyqtSignal(int, object)
+
+    def __init__(self, metrics, generation, calendar_timezone='UTC', calendar_only=False, parent=None):
+        super().__init__(parent)
+        self.metrics = metrics
+        self.generation = generation
+        self.calendar_timezone = calendar_timezone
+        self.calendar_only = calendar_only
+
+    def run(self):
+        try:
+            if self.calendar_only:
+                data = prepare_calendar_data(self.metrics, self.calendar_timezone)
+            else:
+                data = prepare_chart_data(self.metrics, self.calendar_timezone)
+        except Exception as e:
+            logging.error(f"Error preparing chart data: {str(e)}")
+            data = {}
+        self.loaded.emit(self.generation, data)
+
+def polygon_from_arrays(px, py):
+    # Writes the coordinates straight into the QPolygonF's buffer instead of building a QPointF per point
+    import numpy as np
+    polygon = QPolygonF()
+    polygon.fill(QPointF(), len(px))
+    if len(px):
+        buffer = polygon.data()
+        buffer.setsize(len(px) * 2 * np.dtype(np.float64).itemsize)
+        points = np.frombuffer(buffer, dtype=np.float64).reshape(-1, 2)
+        points[:, 0] = px
+        points[:, 1] = py
+    return polygon
+
+def nice_ticks(low, high, count=5):
+    if not (math.isfinite(low) and math.isfinite(high)) or high <= low:
+        return [low] if math.isfinite(low) else []
+    raw_step = (high - low) / count
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw_step)
+    first = math.ceil(low / step) * step
+    return [first + i * step for i in range(int((high - first) / step) + 1)]
+
+def format_time(seconds, span):
+    moment = datetime.fromtimestamp(seconds, timezone.utc)
+    return moment.strftime('%H:%M' if span < 2 * 86400 else '%Y-%m-%d')
+
+def format_number(value, percent=False, step=None):
+    if percent:
+        # Enough decimals to tell neighbouring ticks apart
+        decimals = max(1, -math.floor(math.log10(step * 100))) if step else 1
+        return f"{value:.{decimals}%}"
+    if abs(value) >= 1_000_000:
+        return f"{value / 1_000_000:,.2f}M"
+    if abs(value) >= 10_000:
+        return f"{value / 1_000:,.1f}k"
+    return f"{value:,.2f}"
+
+class ChartWidget(QWidget):
+
+    def __init__(self, title, parent=None):
+        super().__init__(parent)
+        self.title = title
+        self.frame = None
+        self.hover = None
+        self.setMinimumHeight(160)
+        self.setMouseTracking(True)
+
+    def plot_rect(self):
+        return QRect(MARGIN_LEFT, MARGIN_TOP, max(self.width() - MARGIN_LEFT - MARGIN_RIGHT, 1),
+                     max(self.height() - MARGIN_TOP - MARGIN_BOTTOM, 1))
+
+    def invalidate(self):
+        self.frame = None
+        self.update()
+
+    def resizeEvent(self, event):
+        self.frame = None
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        if self.frame is None or self.frame.size() != self.size():
+            self.frame = QPixmap(self.size())
+            self.frame.fill(BACKGROUND)
+            painter = QPainter(self.frame)
+            painter.setRenderHint(QPainter.Antialiasing)
+            rect = self.plot_rect()
+            painter.fillRect(rect, PLOT_BACKGROUND)
+            painter.setPen(TEXT)
+            painter.drawText(QRect(MARGIN_LEFT, 4, rect.width(), MARGIN_TOP - 6), Qt.AlignLeft | Qt.AlignVCenter, self.title)
+            try:
+                self.render_frame(painter, rect)
+            except Exception as e:
+                logging.error(f"Error drawing chart {self.title}: {str(e)}")
+            painter.end()
+
+        painter = QPainter(self)
+        painter.drawPixmap(event.rect(), self.frame, event.rect())
+        self.render_overlay(painter, self.plot_rect())
+
+    def draw_grid(self, painter, rect, x_ticks, y_ticks):
+        # x_ticks / y_ticks: [(pixel, label)]
+        painter.setPen(QPen(GRID, 1))
+        for x, _ in x_ticks:
+            painter.drawLine(QPointF(x, rect.top()), QPointF(x, rect.bottom()))
+        for y, _ in y_ticks:
+            painter.drawLine(QPointF(rect.left(), y), QPointF(rect.right(), y))
+        painter.setPen(TEXT)
+        for x, label in x_ticks:
+            if x + 50 > self.width():
+                continue
+            painter.drawText(QRectF(x - 50, rect.bottom() + 4, 100, MARGIN_BOTTOM - 6), Qt.AlignHCenter | Qt.AlignTop, label)
+        for y, label in y_ticks:
+            painter.drawText(QRectF(2, y - 8, MARGIN_LEFT - 8, 16), Qt.AlignRight | Qt.AlignVCenter, label)
+
+    def render_frame(self, painter, rect):
+        pass
+
+    def render_overlay(self, painter, rect):
+        pass
+
+    def draw_message(self, painter, rect, message):
+        painter.setPen(TEXT)
+        painter.drawText(rect, Qt.AlignCenter, message)
+
+class TimeSeriesChart(ChartWidget):
+    # Equity or underwater curve over a CurvePyramid; wheel zooms, drag pans, double-click resets
+    range_changed = pyqtSignal(float, float)
+
+    def __init__(self, title, fill=False, percent=False, parent=None):
+        super().__init__(title, parent)
+        self.fill = fill
+        self.percent = percent
+        self.pyramid = None
+        self.episodes = []
+        self.x_range = None
+        self.path = None
+        self.path_key = None
+        self.fill_path = None
+        self.y_range = None
+        self.drag_origin = None
+
+    def set_pyramid(self, pyramid, episodes=None):
+        self.pyramid = pyramid if pyramid is not None and len(pyramid) else None
+        self.episodes = episodes or []
+        self.x_range = None
+        self.path = None
+        self.invalidate()
+
+    def full_range(self):
+        x_start, x_end, _, _ = self.pyramid.bounds()
+        return x_start, max(x_end, x_start + 1)
+
+    def set_x_range(self, x_start, x_end):
+        if self.pyramid is None:
+            return
+        full_start, full_end = self.full_range()
+        span = min(max(x_end - x_start, 60.0), full_end - full_start)
+        x_start = min(max(x_start, full_start), full_end - span)
+        new_range = (x_start, x_start + span)
+        if new_range != self.x_range:
+            self.x_range = new_range
+            self.invalidate()
+            self.range_changed.emit(*new_range)
+
+    def visible_range(self):
+        return self.x_range or self.full_range()
+
+    def build_path(self, rect):
+        # The curve for the current window and size, resampled from the pyramid and cached
+        import numpy as np
+        x_start, x_end = self.visible_range()
+        key = (x_start, x_end, rect.width(), rect.height())
+        if self.path is not None and self.path_key == key:
+            return self.path
+
+        xs, ys = self.pyramid.visible(x_start, x_end, rect.width())
+        finite = np.isfinite(ys)
+        xs, ys = xs[finite], ys[finite]
+        if len(ys) == 0:
+            self.path, self.path_key, self.y_range, self.fill_path = QPainterPath(), key, None, None
+            return self.path
+
+        y_low, y_high = float(ys.min()), float(ys.max())
+        if self.fill:
+            y_low, y_high = min(y_low, 0.0), max(y_high, 0.0)
+        if y_high == y_low:
+            y_high, y_low = y_high + 1, y_low - 1
+        self.y_range = (y_low, y_high)
+
+        px = rect.left() + (xs - x_start) / (x_end - x_start) * rect.width()
+        py = rect.bottom() - (ys - y_low) / (y_high - y_low) * rect.height()
+        path = QPainterPath()
+        path.addPolygon(polygon_from_arrays(px, py))
+        self.fill_path = None
+        if self.fill:
+            # Filling the jagged curve itself is slow; the area is one simple polygon along
+            # the lowest point of each pixel column instead
+            column = np.floor(px).astype(np.int64)
+            starts = np.flatnonzero(np.diff(column, prepend=column[0] - 1))
+            lowest = np.fmax.reduceat(py, starts)
+            baseline = rect.bottom() - (0 - y_low) / (y_high - y_low) * rect.height()
+            self.fill_path = QPainterPath()
+            self.fill_path.addPolygon(polygon_from_arrays(np.concatenate(([px[0]], px[starts], [px[-1]])),
+                                                          np.concatenate(([baseline], lowest, [baseline]))))
+            self.fill_path.closeSubpath()
+        self.path, self.path_key = path, key
+        return path
+
+    def to_pixel_x(self, rect, x):
+        x_start, x_end = self.visible_range()
+        return rect.left() + (x - x_start) / (x_end - x_start) * rect.width()
+
+    def render_frame(self, painter, rect):
+        if self.pyramid is None:
+            self.draw_message(painter, rect, "No trade data")
+            return
+        path = self.build_path(rect)
+        if self.y_range is None:
+            self.draw_message(painter, rect, "No trade data")
+            return
+
+        x_start, x_end = self.visible_range()
+        y_low, y_high = self.y_range
+        x_ticks = [(self.to_pixel_x(rect, x), format_time(x, x_end - x_start)) for x in nice_ticks(x_start, x_end, 6)]
+        y_values = nice_ticks(y_low, y_high, 5)
+        y_step = y_values[1] - y_values[0] if len(y_values) > 1 else None
+        y_ticks = [(rect.bottom() - (y - y_low) / (y_high - y_low) * rect.height(), format_number(y, self.percent, y_step))
+                   for y in y_values]
+        self.draw_grid(painter, rect, x_ticks, y_ticks)
+
+        painter.save()
+        painter.setClipRect(rect)
+        for start, end, depth in self.episodes:
+            left, right = self.to_pixel_x(rect, start), self.to_pixel_x(rect, end)
+            if right < rect.left() or left > rect.right():
+                continue
+            painter.fillRect(QRectF(left, rect.top(), max(right - left, 1), rect.height()), EPISODE)
+            if right - left > 48:
+                painter.setPen(TEXT)
+                painter.drawText(QRectF(left + 2, rect.bottom() - 18, right - left - 4, 16), Qt.AlignLeft, f"-{depth:.1%}")
+        if self.fill_path is not None:
+            painter.setRenderHint(QPainter.Antialiasing, False)
+            painter.fillPath(self.fill_path, QColor(NEGATIVE.red(), NEGATIVE.green(), NEGATIVE.blue(), 110))
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(QPen(NEGATIVE, 1))
+        else:
+            painter.setPen(QPen(POSITIVE, 1))
+        painter.drawPath(path)
+        painter.restore()
+
+    def render_overlay(self, painter, rect):
+        if self.hover is None or self.pyramid is None or self.y_range is None:
+            return
+        import numpy as np
+        x_start, x_end = self.visible_range()
+        x = x_start + (self.hover - rect.left()) / rect.width() * (x_end - x_start)
+        index = min(max(int(np.searchsorted(self.pyramid.x, x)) - 1, 0), len(self.pyramid) - 1)
+        value = self.pyramid.y[index]
+        painter.setPen(QPen(TEXT, 1, Qt.DashLine))
+        painter.drawLine(QPointF(self.hover, rect.top()), QPointF(self.hover, rect.bottom()))
+        label = f"{format_time(self.pyramid.x[index], x_end - x_start)}  {format_number(value, self.percent)}"
+        painter.drawText(self.overlay_label_rect(rect, self.hover), Qt.AlignLeft | Qt.AlignVCenter, label)
+
+    def overlay_label_rect(self, rect, hover):
+        left = min(hover + 6, rect.right() - 180)
+        return QRect(int(left), rect.top() + 2, 180, 16)
+
+    def repaint_hover(self, new_hover):
+        # Only the old and new crosshair strips and their labels are repainted
+        rect = self.plot_rect()
+        for hover in (self.hover, new_hover):
+            if hover is not None:
+                self.update(QRect(int(hover) - 2, rect.top(), 5, rect.height()))
+                self.update(self.overlay_label_rect(rect, hover))
+        self.hover = new_hover
+
+    def mouseMoveEvent(self, event):
+        rect = self.plot_rect()
+        if self.drag_origin is not None and self.pyramid is not None:
+            x_start, x_end = self.drag_origin[1]
+            shift = (event.x() - self.drag_origin[0]) / rect.width() * (x_end - x_start)
+            self.set_x_range(x_start - shift, x_end - shift)
+        hover = event.x() if rect.left() <= event.x() <= rect.right() else None
+        self.repaint_hover(hover)
+
+    def leaveEvent(self, event):
+        self.repaint_hover(None)
+        super().leaveEvent(event)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton and self.pyramid is not None:
+            self.drag_origin = (event.x(), self.visible_range())
+
+    def mouseReleaseEvent(self, event):
+        self.drag_origin = None
+
+    def mouseDoubleClickEvent(self, event):
+        if self.pyramid is not None:
+            self.set_x_range(*self.full_range())
+
+    def wheelEvent(self, event):
+        if self.pyramid is None:
+            return
+        rect = self.plot_rect()
+        x_start, x_end = self.visible_range()
+        anchor = x_start + (event.x() - rect.left()) / rect.width() * (x_end - x_start)
+        factor = 0.8 if event.angleDelta().y() > 0 else 1.25
+        self.set_x_range(anchor - (anchor - x_start) * factor, anchor + (x_end - anchor) * factor)
+
+class HistogramChart(ChartWidget):
+
+    def __init__(self, title, parent=None):
+        super().__init__(title, parent)
+        self.counts = None
+        self.edges = None
+        self.paths = None
+
+    def set_histogram(self, histogram):
+        self.counts, self.edges = histogram if histogram is not None else (None, None)
+        self.paths = None
+        self.invalidate()
+
+    def resizeEvent(self, event):
+        self.paths = None
+        super().resizeEvent(event)
+
+    def render_frame(self, painter, rect):
+        if self.counts is None or len(self.counts) == 0:
+            self.draw_message(painter, rect, "No returns")
+            return
+        low, high = float(self.edges[0]), float(self.edges[-1])
+        high = high if high > low else low + 1e-9
+        peak = max(int(self.counts.max()), 1)
+
+        def to_x(value):
+            return rect.left() + (value - low) / (high - low) * rect.width()
+
+        if self.paths is None:
+            gains, losses = QPainterPath(), QPainterPath()
+            for count, left, right in zip(self.counts.tolist(), self.edges[:-1].tolist(), self.edges[1:].tolist()):
+                height = count / peak * rect.height()
+                bar = QRectF(to_x(left), rect.bottom() - height, max(to_x(right) - to_x(left) - 1, 1), height)
+                (gains if left >= 0 else losses).addRect(bar)
+            self.paths = (gains, losses)
+
+        x_ticks = [(to_x(x), format_number(x, True)) for x in nice_ticks(low, high, 6)]
+        y_ticks = [(rect.bottom() - y / peak * rect.height(), f"{y:g}") for y in nice_ticks(0, peak, 4)]
+        self.draw_grid(painter, rect, x_ticks, y_ticks)
+        painter.fillPath(self.paths[0], POSITIVE)
+        painter.fillPath(self.paths[1], NEGATIVE)
+
+class MonthlyHeatmap(ChartWidget):
+
+    def __init__(self, title, parent=None):
+        super().__init__(title, parent)
+        self.monthly = {}
+
+    def set_monthly(self, monthly):
+        self.monthly = monthly or {}
+        self.invalidate()
+
+    def render_frame(self, painter, rect):
+        if not self.monthly:
+            self.draw_message(painter, rect, "No returns")
+            return
+        years = list(range(min(year for year, _ in self.monthly), max(year for year, _ in self.monthly) + 1))
+        scale = max(abs(value) for value in self.monthly.values()) or 1
+        cell_width = rect.width() / 12
+        cell_height = rect.height() / len(years)
+
+        painter.setPen(TEXT)
+        for month, name in enumerate(MONTHS):
+            painter.drawText(QRectF(rect.left() + month * cell_width, rect.bottom() + 4, cell_width, MARGIN_BOTTOM - 6),
+                             Qt.AlignHCenter | Qt.AlignTop, name)
+        for row, year in enumerate(years):
+            top = rect.top() + row * cell_height
+            painter.setPen(TEXT)
+            painter.drawText(QRectF(2, top, MARGIN_LEFT - 8, cell_height), Qt.AlignRight | Qt.AlignVCenter, str(year))
+            for month in range(12):
+                value = self.monthly.get((year, month + 1))
+                cell = QRectF(rect.left() + month * cell_width + 1, top + 1, cell_width - 2, cell_height - 2)
+                if value is None or value != value:
+                    continue
+                base = POSITIVE if value >= 0 else NEGATIVE
+                painter.fillRect(cell, QColor(base.red(), base.green(), base.blue(), int(40 + 200 * min(abs(value) / scale, 1))))
+                if cell_height >= 14:
+                    painter.setPen(TEXT)
+                    painter.drawText(cell, Qt.AlignCenter, f"{value:.1%}")
+
+class GridHeatmap(ChartWidget):
+    # Fixed rows x columns grid of dollar values, e.g. P&L by weekday and hour from the calendar cube
+
+    def __init__(self, title, row_labels, column_labels, parent=None):
+        super().__init__(title, parent)
+        self.row_labels = row_labels
+        self.column_labels = column_labels
+        self.values = None
+
+    def set_grid(self, values):
+        self.values = values
+        self.invalidate()
+
+    def render_frame(self, painter, rect):
+        if self.values is None:
+            self.draw_message(painter, rect, "No trades")
+            return
+        finite = [abs(value) for row in self.values for value in row if value == value]
+        scale = max(finite, default=0) or 1
+        cell_width = rect.width() / len(self.column_labels)
+        cell_height = rect.height() / len(self.row_labels)
+        label_every = max(1, math.ceil(24 / cell_width))
+
+        painter.setPen(TEXT)
+        for column, label in enumerate(self.column_labels):
+            if column % label_every == 0:
+                painter.drawText(QRectF(rect.left() + column * cell_width - 10, rect.bottom() + 4, cell_width + 20, MARGIN_BOTTOM - 6),
+                                 Qt.AlignHCenter | Qt.AlignTop, label)
+        for row, label in enumerate(self.row_labels):
+            top = rect.top() + row * cell_height
+            painter.setPen(TEXT)
+            painter.drawText(QRectF(2, top, MARGIN_LEFT - 8, cell_height), Qt.AlignRight | Qt.AlignVCenter, label)
+            for column, value in enumerate(self.values[row]):
+                if value != value:
+                    continue
+                cell = QRectF(rect.left() + column * cell_width + 1, top + 1, cell_width - 2, cell_height - 2)
+                base = POSITIVE if value >= 0 else NEGATIVE
+                painter.fillRect(cell, QColor(base.red(), base.green(), base.blue(), int(40 + 200 * min(abs(value) / scale, 1))))
+                label = format_number(value)
+                if cell_height >= 14 and painter.fontMetrics().horizontalAdvance(label) <= cell.width():
+                    painter.setPen(TEXT)
+                    painter.drawText(cell, Qt.AlignCenter, label)
+
+class ChartOperations:
+
+    def create_chart_tabs(self):
+        # Chart1: equity and underwater curves with linked zoom; Chart2: return histogram, monthly
+        # heatmap and the weekday x hour P&L grid
+        self.equity_chart = TimeSeriesChart("Equity")
+        self.underwater_chart = TimeSeriesChart(f"Underwater drawdown (top {TOP_EPISODES} episodes shaded)", fill=True, percent=True)
+        self.equity_chart.range_changed.connect(self.underwater_chart.set_x_range)
+        self.underwater_chart.range_changed.connect(self.equity_chart.set_x_range)
+        chart1_layout = QVBoxLayout(self.chart1View)
+        chart1_layout.addWidget(self.equity_chart, 3)
+        chart1_layout.addWidget(self.underwater_chart, 2)
+
+        self.histogram_chart = HistogramChart("Daily returns")
+        self.heatmap_chart = MonthlyHeatmap("Monthly returns")
+        chart2_layout = QVBoxLayout(self.chart2Tab)
+        chart2_layout.addWidget(self.histogram_chart, 1)
+        chart2_layout.addWidget(self.heatmap_chart, 1)
+
+        # The weekday x hour grid is bucketed in the zone picked here (UTC or a world clock)
+        self.calendar_timezone = 'UTC'
+        self.calendar_zone_box = QComboBox()
+        for name, tz_name in CALENDAR_ZONES:
+            self.calendar_zone_box.addItem(name if name == tz_name else f"{name} ({tz_name})", tz_name)
+        self.calendar_zone_box.currentIndexChanged.connect(lambda index: ChartOperations.set_calendar_timezone(self, self.calendar_zone_box.itemData(index)))
+        zone_layout = QHBoxLayout()
+        zone_layout.addStretch(1)
+        zone_layout.addWidget(QLabel("Heatmap timezone"))
+        zone_layout.addWidget(self.calendar_zone_box)
+        chart2_layout.addLayout(zone_layout)
+        self.calendar_chart = GridHeatmap(f"P&L by weekday and hour ({self.calendar_timezone})", WEEKDAYS, [f"{hour:02d}" for hour in range(24)])
+        chart2_layout.addWidget(self.calendar_chart, 1)
+        self.chart_generation = 0
+
+    def refresh_charts(self):
+        if not hasattr(self, 'equity_chart') or getattr(self, 'metrics', None) is None:
+            return
+        self.chart_generation += 1
+        ChartOperations.start_chart_loader(self, calendar_only=False)
+
+    def start_chart_loader(self, calendar_only):
+        snapshot = self.metrics.snapshot()
+        loader = ChartDataLoader(snapshot, self.chart_generation, self.calendar_timezone, calendar_only, self.chart1View)
+        loader.loaded.connect(lambda generation, data: ChartOperations.merge_chart_snapshot(self, snapshot))
+        if calendar_only:
+            loader.loaded.connect(lambda generation, data: ChartOperations.on_calendar_data(self, generation, data))
+        else:
+            loader.loaded.connect(lambda generation, data: ChartOperations.on_chart_data(self, generation, data))
+        loader.finished.connect(loader.deleteLater)
+        loader.start()
+
+    def merge_chart_snapshot(self, snapshot):
+        # loaded is the loader's last act, so by the time it arrives the snapshot is the GUI
+        # thread's again; the pyramids, returns and cubes it built are kept for later snapshots
+        if getattr(self, 'metrics', None) is not None:
+            self.metrics.merge_snapshot(snapshot)
+
+    def set_calendar_timezone(self, tz_name):
+        # Only the weekday x hour grid is re-bucketed; the other charts keep their data and zoom
+        self.calendar_timezone = tz_name
+        if getattr(self, 'metrics', None) is not None:
+            ChartOperations.start_chart_loader(self, calendar_only=True)
+
+    def on_chart_data(self, generation, data):
+        if generation != self.chart_generation:
+            return  # a newer refresh is already on its way
+        self.equity_chart.set_pyramid(data.get('equity'))
+        self.underwater_chart.set_pyramid(data.get('underwater'), data.get('episodes'))
+        self.histogram_chart.set_histogram(data.get('histogram'))
+        self.heatmap_chart.set_monthly(data.get('monthly'))
+        ChartOperations.on_calendar_data(self, generation, data)
+        logging.info("Charts updated")
+
+    def on_calendar_data(self, generation, data):
+        # A grid bucketed in a zone that has since been changed is dropped; its replacement is on its way
+        if generation == self.chart_generation and data.get('calendar_timezone') == self.calendar_timezone:
+            self.calendar_chart.title = f"P&L by weekday and hour ({self.calendar_timezone})"
+            self.calendar_chart.set_grid(data.get('weekday_hour'))
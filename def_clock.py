@@ -1,10 +1,150 @@
 import sys
-from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel, QComboBox)
-from PyQt5.QtCore import Qt, QTimer, QTime
-from PyQt5.QtGui import QPainter, QColor
+import time
+from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel, QComboBox, QLCDNumber)
+from PyQt5.QtCore import Qt, QObject, QTimer, QRect, QRectF, QPointF, pyqtSignal
+from PyQt5.QtGui import QPainter, QColor, QPixmap, QTransform
+from def_timezones import WORLD_CLOCKS, offset_span
+
+# World clocks. A single ClockTicker drives every clock in the application: one single-shot
+# timer re-armed for the next whole second, so all clocks flip together on the second and
+# the GUI thread wakes at most once a second. ZoneTime keeps each zone's UTC offset until
+# its next DST change, and AnalogClock keeps its face in a pixmap and only repaints the
+# area swept by the hands.
+
+CLOCK_WIDGETS = ['japanClock', 'australiaClock', 'germanyClock', 'londonClock', 'newyorkClock', 'sanfransiscoClock']  # WORLD_CLOCKS order
+
+class ClockTicker(QObject):
+    tick = pyqtSignal(int)  # UTC seconds, emitted just after each second boundary
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.on_timeout)
+
+    def subscribe(self, slot):
+        self.tick.connect(slot)
+        slot(int(time.time()))  # show the time straight away
+        if not self.timer.isActive():
+            self.schedule()
+
+    def schedule(self):
+        # 1 ms past the next boundary, so int(time.time()) is already the new second
+        self.timer.start(1000 - int(time.time() * 1000) % 1000 + 1)
+
+    def on_timeout(self):
+        self.schedule()
+        self.tick.emit(int(time.time()))
+
+ticker = None
+
+def shared_ticker():
+    global ticker
+    if ticker is None:
+        ticker = ClockTicker(QApplication.instance())
+    return ticker
+
+class ZoneTime:
+    # Local time of one zone; the UTC offset is looked up again only when a DST change is due
+
+    def __init__(self, tz_name=None):
+        self.tz_name = tz_name
+        self.offset = 0
+        self.valid_from = self.valid_until = 0
+
+    def local_seconds(self, utc):
+        if self.tz_name is None:
+            return utc + time.localtime(utc).tm_gmtoff
+        if not self.valid_from <= utc < self.valid_until:
+            self.offset, self.valid_until = offset_span(self.tz_name, utc)
+            self.valid_from = utc
+        return utc + self.offset
+
+def format_clock(local):
+    seconds = local % 86400
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+class AnalogClock(QWidget):
+
+    def __init__(self, tz_name=None, parent=None):
+        super().__init__(parent)
+        self.zone = ZoneTime(tz_name)
+        self.face = None
+        self.local = None
+
+    def radius(self):
+        return max(min(self.width(), self.height()) // 2 - 10, 1)
+
+    def hands(self, local):
+        # (angle, length, colour, width) of the hour, minute and second hands
+        seconds = local % 86400
+        hour, minute, second = seconds // 3600, seconds % 3600 // 60, seconds % 60
+        radius = self.radius()
+        return [
+            ((hour % 12 + minute / 60) * 30, radius * 0.5, QColor(0, 0, 0), 6),
+            ((minute + second / 60) * 6, radius * 0.8, QColor(0, 0, 0), 4),
+            (second * 6, radius * 0.9, QColor(255, 0, 0), 2),
+        ]
+
+    def hand_rect(self, angle, length, width):
+        transform = QTransform().translate(self.rect().center().x(), self.rect().center().y()).rotate(angle)
+        return transform.mapRect(QRectF(-width / 2, -length, width, length)).toAlignedRect().adjusted(-2, -2, 2, 2)
+
+    def set_time(self, utc):
+        local = self.zone.local_seconds(utc)
+        if local == self.local:
+            return
+        dirty = QRect()
+        old_hands = self.hands(self.local) if self.local is not None else []
+        for index, (angle, length, _, width) in enumerate(self.hands(local)):
+            if index < len(old_hands) and old_hands[index][0] == angle:
+                continue
+            dirty = dirty.united(self.hand_rect(angle, length, width))
+            if index < len(old_hands):
+                dirty = dirty.united(self.hand_rect(old_hands[index][0], old_hands[index][1], old_hands[index][3]))
+        self.local = local
+        self.update(dirty if old_hands else self.rect())
+
+    def resizeEvent(self, event):
+        self.face = None
+        super().resizeEvent(event)
+
+    def render_face(self):
+        self.face = QPixmap(self.size())
+        self.face.fill(Qt.transparent)
+        painter = QPainter(self.face)
+        painter.setRenderHint(QPainter.Antialiasing)
+        center, radius = self.rect().center(), self.radius()
+        painter.setBrush(QColor(255, 255, 255))
+        painter.drawEllipse(center, radius, radius)
+        painter.translate(center)
+        for mark in range(60):
+            painter.setPen(QColor(0, 0, 0))
+            painter.drawLine(QPointF(0, -radius * (0.88 if mark % 5 == 0 else 0.94)), QPointF(0, -radius))
+            painter.rotate(6)
+        painter.end()
+
+    def paintEvent(self, event):
+        if self.face is None or self.face.size() != self.size():
+            self.render_face()
+        painter = QPainter(self)
+        painter.drawPixmap(event.rect(), self.face, event.rect())
+        if self.local is None:
+            return
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setClipRect(event.rect())
+        for angle, length, colour, width in self.hands(self.local):
+            painter.save()
+            painter.setPen(colour)
+            painter.setBrush(colour)
+            painter.translate(self.rect().center())
+            painter.rotate(angle)
+            painter.drawRect(QRectF(-width / 2, -length, width, length))
+            painter.restore()
 
 class ClockWidget(QWidget):
-    def __init__(self):
+    def __init__(self, tz_name=None):
         super().__init__()
         self.setWindowTitle("Clock")
         self.setGeometry(100, 100, 400, 400)
@@ -12,71 +152,60 @@ class ClockWidget(QWidget):
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
 
+        # Styled once; ticks only change the text
         self.time_label = QLabel()
+        self.time_label.setStyleSheet("font-size: 30px;")
+        self.time_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.layout.addWidget(self.time_label)
 
+        self.analog_clock = AnalogClock(tz_name)
+        self.analog_clock.setVisible(False)
+        self.layout.addWidget(self.analog_clock, 1)
+
         self.combo_box = QComboBox()
         self.combo_box.addItems(["Digital", "Analog"])
         self.combo_box.currentIndexChanged.connect(self.update_display)
         self.layout.addWidget(self.combo_box)
 
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_time)
-        self.timer.start(1000)  # Update every second
+        self.zone = ZoneTime(tz_name)
+        self.utc = int(time.time())
+        shared_ticker().subscribe(self.update_time)
 
-        self.current_time = QTime.currentTime()
-        self.update_time()
-
-    def update_time(self):
-        self.current_time = QTime.currentTime()
-        self.update_display()
-
-    def update_display(self):
+    def update_time(self, utc):
+        self.utc = utc
         if self.combo_box.currentText() == "Digital":
-            self.time_label.setText(self.current_time.toString("hh:mm:ss"))
-            self.time_label.setStyleSheet("font-size: 30px;")
-            self.time_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.time_label.setVisible(True)
-            self.update()  # Trigger a repaint for the analog clock
+            text = format_clock(self.zone.local_seconds(utc))
+            if text != self.time_label.text():
+                self.time_label.setText(text)
         else:
-            self.time_label.setVisible(False)
-            self.update()  # Trigger a repaint for the analog clock
+            self.analog_clock.set_time(utc)
 
-    def paintEvent(self, event):
-        if self.combo_box.currentText() == "Analog":
-            painter = QPainter(self)
-            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-
-            # Draw clock face
-            rect = self.rect()
-            radius = min(rect.width(), rect.height()) // 2 - 10
-            center = rect.center()
-            painter.setBrush(QColor(255, 255, 255))
-            painter.drawEllipse(center, radius, radius)
-
-            # Draw hour hand
-            hour_angle = (self.current_time.hour() % 12 + self.current_time.minute() / 60) * 30
-            self.draw_hand(painter, hour_angle, radius * 0.5, QColor(0, 0, 0), 6)
-
-            # Draw minute hand
-            minute_angle = (self.current_time.minute() + self.current_time.second() / 60) * 6
-            self.draw_hand(painter, minute_angle, radius * 0.8, QColor(0, 0, 0), 4)
-
-            # Draw second hand
-            second_angle = self.current_time.second() * 6
-            self.draw_hand(painter, second_angle, radius * 0.9, QColor(255, 0, 0), 2)
-
-    def draw_hand(self, painter, angle, length, color, width):
-        painter.save()
-        painter.setPen(QColor(color))
-        painter.setBrush(QColor(color))
-        painter.translate(self.rect().center())
-        painter.rotate(angle)
-        painter.drawRect(-width // 2, -length, width, length)
-        painter.restore()
+    def update_display(self):
+        digital = self.combo_box.currentText() == "Digital"
+        self.time_label.setVisible(digital)
+        self.analog_clock.setVisible(not digital)
+        self.update_time(self.utc)
+
+class WorldClockOperations:
+
+    def start_world_clocks(self):
+        # Drives the six QLCDNumber clocks in the main window from the shared ticker
+        self.world_clocks = []
+        for widget_name, (_, tz_name) in zip(CLOCK_WIDGETS, WORLD_CLOCKS):
+            clock = getattr(self, widget_name)
+            clock.setDigitCount(8)
+            clock.setSegmentStyle(QLCDNumber.Flat)
+            self.world_clocks.append((clock, ZoneTime(tz_name)))
+        shared_ticker().subscribe(lambda utc: WorldClockOperations.update_world_clocks(self, utc))
+
+    def update_world_clocks(self, utc):
+        if self.centralwidget.window().isMinimized():
+            return
+        for clock, zone in self.world_clocks:
+            clock.display(format_clock(zone.local_seconds(utc)))
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     clock = ClockWidget()
     clock.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    sys.exit(app.exec())
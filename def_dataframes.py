@@ -1,5 +1,8 @@
 import logging
 import pandas as pd
+from def_profiling import profiler
+from def_schema import apply_schema, running_balance, log_memory, CENTS_COLUMN
+from def_ledger_store import read_master_ledger
 
 class DataFrameOperations:
 
@@ -47,12 +50,68 @@ class DataFrameOperations:
         self.returns = df['Daily Return'].dropna().values
         
         # Prepare the trades dataframe
-        self.trades = df[df['Transaction type'] == 'DEAL'].copy()
-        self.trades['profit'] = self.trades['PL Amount']
-        self.trades['balance'] = self.trades['Balance']
-        self.trades['duration'] = (self.trades['DateUtc'] - self.trades['OpenDateUtc']).dt.total_seconds() / 3600  # duration in hours
-        self.trades['in_position'] = self.trades['Size'] != 0
+        # The boolean selection is already a new frame; derived columns are added to it
+        # without a second full copy
+        deals = df[df['Transaction type'] == 'DEAL']
+        self.trades = deals.assign(
+            profit=deals['PL Amount'],
+            balance=deals['Balance'],
+            duration=(deals['DateUtc'] - deals['OpenDateUtc']).dt.total_seconds() / 3600,  # duration in hours
+            in_position=(deals['Size'] != 0).fillna(False),  # Size is a nullable float; '-' is not a position
+        )
         
         logging.debug(f"Processed DataFrame shape: {self.trades.shape}")
         logging.debug(f"Trades DataFrame columns: {self.trades.columns}")
-        logging.debug(f"Trades DataFrame head: {self.trades.head()}")
\ No newline at end of file
+        logging.debug(f"Trades DataFrame head: {self.trades.head()}")
+
+    @staticmethod
+    def load_ledger(file_path):
+        # Qt-free loader used by the headless report runner
+        # read_ledger parses straight into the schema dtypes (categoricals, nullable floats, dates);
+        # a segment store is read segment by segment and merged by date
+        with profiler.stage("load.read_csv"):
+            df = read_master_ledger(file_path)
+        logging.info(f"Ledger loaded from {file_path}. Shape: {df.shape}")
+
+        with profiler.stage("load.parse"):
+            if 'Balance' not in df.columns:
+                df['Balance'] = running_balance(df[CENTS_COLUMN])
+
+        with profiler.stage("load.sort"):
+            df = df.sort_values('DateUtc', kind='stable').reset_index(drop=True)
+        log_memory(df, "Ledger memory")
+        return df
+
+    # Ingestion steps used by FileOperations.updateFile, kept Qt-free so they can be benchmarked
+
+    @staticmethod
+    def parse_import_dates(new_data):
+        new_data['DateUtc'] = pd.to_datetime(new_data['DateUtc'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
+        new_data['OpenDateUtc'] = pd.to_datetime(new_data['OpenDateUtc'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
+        return new_data
+
+    @staticmethod
+    def parse_import_amounts(new_data):
+        # Amounts (and a Balance from the file) parse into the schema; a missing Balance is the
+        # exact running sum of the cents
+        new_data = apply_schema(new_data)
+        if 'Balance' not in new_data.columns:
+            new_data['Balance'] = running_balance(new_data[CENTS_COLUMN])
+        return new_data
+
+    @staticmethod
+    def add_daily_returns(new_data):
+        new_data = new_data.sort_values('DateUtc')
+        new_data['Daily Return'] = new_data.groupby(new_data['DateUtc'].dt.date)['Balance'].pct_change(fill_method=None)
+        return new_data
+
+    @staticmethod
+    def read_master(csv_file_path):
+        return read_master_ledger(csv_file_path)
+
+    @staticmethod
+    def merge_ledgers(master_data, new_data):
+        # Categoricals with different categories concatenate as text, so the schema is re-applied
+        combined_data = apply_schema(pd.concat([master_data, new_data], ignore_index=True))
+        # Stable, so the rows come out in the order a segment store reads them back
+        return combined_data.sort_values('DateUtc', kind='stable').reset_index(drop=True)
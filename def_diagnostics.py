@@ -0,0 +1,106 @@
+import logging
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QCheckBox, QPushButton, QTableWidget,
+                             QTableWidgetItem, QHeaderView, QFileDialog, QMessageBox)
+from def_profiling import profiler
+
+HISTOGRAM_BARS = " ▁▂▃▄▅▆▇█"
+
+def format_histogram(stats):
+    rows = stats.histogram_rows()
+    if not rows:
+        return ""
+    peak = max(count for _, count in rows)
+    bars = "".join(HISTOGRAM_BARS[max(1, round(count / peak * (len(HISTOGRAM_BARS) - 1)))] for _, count in rows)
+    return f"{bars}  ({format_ms(rows[0][0])} – {format_ms(rows[-1][0])})"
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.3f}"
+
+class DiagnosticsWidget(QWidget):
+    COLUMNS = ['Name', 'Calls', 'Total ms', 'Mean ms', 'Min ms', 'Max ms', 'Histogram (≤ ms)']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        self.enable_checkbox = QCheckBox("Enable profiling")
+        self.enable_checkbox.setChecked(profiler.enabled)
+        self.enable_checkbox.toggled.connect(self.on_enable_toggled)
+        controls.addWidget(self.enable_checkbox)
+
+        for text, slot in [("Refresh", self.refresh), ("Reset", self.on_reset),
+                           ("Export Speedscope...", self.export_speedscope), ("Export cProfile...", self.export_cprofile)]:
+            button = QPushButton(text)
+            button.clicked.connect(slot)
+            controls.addWidget(button)
+        controls.addStretch(1)
+        layout.addLayout(controls)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSortingEnabled(True)
+        layout.addWidget(self.table)
+
+        # Only polls while profiling is on and the tab is on screen
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        if profiler.enabled:
+            self.refresh()
+            self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def on_enable_toggled(self, checked):
+        if checked:
+            profiler.enable()
+            self.refresh_timer.start()
+        else:
+            profiler.disable()
+            self.refresh_timer.stop()
+        self.refresh()
+
+    def on_reset(self):
+        profiler.reset()
+        self.refresh()
+
+    def refresh(self):
+        rows = profiler.summary_rows()
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(rows))
+        for row, (name, stats) in enumerate(rows):
+            values = [name, stats.calls, stats.total * 1000, stats.mean() * 1000, stats.min * 1000, stats.max * 1000]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem()
+                if isinstance(value, str):
+                    item.setText(value)
+                else:
+                    item.setData(Qt.DisplayRole, round(value, 3) if isinstance(value, float) else value)
+                self.table.setItem(row, col, item)
+            self.table.setItem(row, len(values), QTableWidgetItem(format_histogram(stats)))
+        self.table.setSortingEnabled(True)
+
+    def export_speedscope(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Speedscope Trace", "finapp.speedscope.json", "JSON Files (*.json)")
+        if file_path:
+            profiler.export_speedscope(file_path)
+
+    def export_cprofile(self):
+        if profiler.cprofile is None:
+            QMessageBox.information(self, "Export cProfile", "cProfile was not enabled. Start finapp with FINAPP_PROFILE=cprofile.")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export cProfile Stats", "finapp.prof", "Profile Files (*.prof)")
+        if file_path:
+            try:
+                profiler.export_cprofile(file_path)
+            except Exception as e:
+                logging.error(f"Error exporting cProfile stats: {str(e)}")
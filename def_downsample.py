@@ -0,0 +1,86 @@
+import numpy as np
+
+# Level-of-detail downsampling for the equity and underwater charts.
+#
+# CurvePyramid builds per-block min/max levels (block sizes 8, 16, 32, ...) once, O(n).
+# visible() then answers any zoom/pan window with an M4 envelope (first, min, max and
+# last value of every pixel column) read from the coarsest level that still has a few
+# blocks per column, so a 10M-point curve costs O(pixels) per frame instead of O(n).
+
+BASE_BLOCK = 8        # finest pyramid level; below this the raw points are used directly
+BLOCKS_PER_COLUMN = 4  # pick the level with at least this many blocks per pixel column
+
+def to_seconds(times):
+    # Datetime-like values to float seconds since the epoch, which is what the charts plot
+    return np.asarray(times, dtype='datetime64[ns]').astype(np.int64) / 1e9
+
+class CurvePyramid:
+
+    def __init__(self, x, y):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.levels = []  # (block size, block minima, block maxima)
+
+        block = BASE_BLOCK
+        usable = len(self.y) // block * block
+        if usable:
+            blocks = self.y[:usable].reshape(-1, block)
+            minima, maxima = np.nanmin(blocks, axis=1), np.nanmax(blocks, axis=1)
+            self.levels.append((block, minima, maxima))
+            while len(minima) >= 2:
+                pairs = len(minima) // 2 * 2
+                minima = np.fmin(minima[:pairs:2], minima[1:pairs:2])
+                maxima = np.fmax(maxima[:pairs:2], maxima[1:pairs:2])
+                block *= 2
+                self.levels.append((block, minima, maxima))
+
+    def __len__(self):
+        return len(self.y)
+
+    def bounds(self):
+        if len(self.y) == 0:
+            return None
+        return self.x[0], self.x[-1], np.nanmin(self.y), np.nanmax(self.y)
+
+    def visible(self, x_start, x_end, pixels):
+        # (xs, ys) polyline for the window [x_start, x_end] drawn into `pixels` columns
+        first = max(np.searchsorted(self.x, x_start, side='left') - 1, 0)
+        last = min(np.searchsorted(self.x, x_end, side='right') + 1, len(self.x))
+        count = last - first
+        pixels = max(int(pixels), 1)
+        if count <= 4 * pixels:
+            return self.x[first:last], self.y[first:last]
+
+        per_column = count / pixels
+        level = None
+        for candidate in self.levels:
+            if candidate[0] * BLOCKS_PER_COLUMN > per_column:
+                break
+            level = candidate
+
+        edges = np.unique(np.linspace(first, last, pixels + 1).astype(np.int64))
+        starts, stops = edges[:-1], edges[1:]
+        if level is None:
+            column_min = np.fmin.reduceat(self.y[first:last], starts - first)
+            column_max = np.fmax.reduceat(self.y[first:last], starts - first)
+        else:
+            # Each whole block is assigned to the column its first point falls in, which
+            # misplaces at most one block (under 1/BLOCKS_PER_COLUMN of a pixel) per edge
+            block, minima, maxima = level
+            block_first = -(-first // block)
+            block_last = min(last // block, len(minima))
+            column_blocks = np.clip(-(-starts // block), block_first, block_last)
+            has_blocks = column_blocks < np.append(column_blocks[1:], block_last)
+            column_min = np.full(len(starts), np.nan)
+            column_max = np.full(len(starts), np.nan)
+            if block_first < block_last:
+                offsets = np.minimum(column_blocks, block_last - 1) - block_first
+                column_min[has_blocks] = np.fmin.reduceat(minima[block_first:block_last], offsets)[has_blocks]
+                column_max[has_blocks] = np.fmax.reduceat(maxima[block_first:block_last], offsets)[has_blocks]
+
+        first_values, last_values = self.y[starts], self.y[stops - 1]
+        column_min = np.fmin(column_min, np.fmin(first_values, last_values))
+        column_max = np.fmax(column_max, np.fmax(first_values, last_values))
+        xs = np.repeat(self.x[starts], 4)
+        ys = np.column_stack((first_values, column_min, column_max, last_values)).ravel()
+        return xs, ys
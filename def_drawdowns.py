@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+# Drawdown engine. The running peak and the underwater series are computed once, in a
+# single vectorised pass, and every drawdown metric (max drawdown %/$, pain index, ulcer
+# index, Burke and Sterling ratios) as well as the episode table and the underwater chart
+# read from the same arrays.
+#
+#   analysis = DrawdownAnalysis(trades['Balance'], times=trades['DateUtc'])
+#   analysis.top(5)              # five deepest episodes
+#   analysis.duration_stats()    # count / mean / median / max episode length
+
+EPISODE_COLUMNS = ['start', 'trough', 'recovery', 'peak_value', 'trough_value', 'depth', 'depth_amount',
+                   'length', 'to_trough', 'to_recovery', 'recovered']
+
+class DrawdownAnalysis:
+
+    def __init__(self, values, times=None):
+        # values: balance or cumulative-return points in time order; NaNs are carried
+        # through the same way pandas' cummax skips them
+        self.index = values.index if isinstance(values, pd.Series) else pd.RangeIndex(len(values))
+        self.values = np.asarray(values, dtype=float)
+        self.times = np.asarray(times) if times is not None else None
+        self.peak = np.fmax.accumulate(self.values) if len(self.values) else np.empty(0)
+        self.amount = self.peak - self.values  # currency (or index points) below the peak, >= 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.fraction = 1 - self.values / self.peak  # drawdown as a positive fraction of the peak
+        self._episodes = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def fraction_series(self):
+        return pd.Series(self.fraction, index=self.index)
+
+    def amount_series(self):
+        return pd.Series(self.amount, index=self.index)
+
+    def max_depth(self):
+        # Deepest drawdown as a positive fraction, NaN when there is nothing to measure
+        finite = self.fraction[~np.isnan(self.fraction)]
+        return finite.max() if len(finite) else np.nan
+
+    def max_amount(self):
+        finite = self.amount[~np.isnan(self.amount)]
+        return finite.max() if len(finite) else np.nan
+
+    def episode_positions(self):
+        # (start, trough, end) positions of every underwater run; start is the peak before
+        # the run, end is the first point back at the peak or -1 if not yet recovered
+        underwater = np.flatnonzero(self.values < self.peak)
+        if len(underwater) == 0:
+            empty = np.empty(0, dtype=int)
+            return empty, empty, empty
+
+        breaks = np.flatnonzero(np.diff(underwater) > 1) + 1
+        run_starts = np.concatenate(([0], breaks))
+        run_ends = np.concatenate((breaks, [len(underwater)]))
+        run_values = self.values[underwater]
+
+        # Trough: first minimum inside each run
+        run_min = np.fmin.reduceat(run_values, run_starts)
+        run_id = np.repeat(np.arange(len(run_starts)), run_ends - run_starts)
+        at_min = np.flatnonzero(run_values == run_min[run_id])
+        troughs = underwater[at_min[np.searchsorted(run_id[at_min], np.arange(len(run_starts)))]]
+
+        starts = np.maximum(underwater[run_starts] - 1, 0)
+        last_underwater = underwater[run_ends - 1]
+        ends = np.where(last_underwater + 1 < len(self.values), last_underwater + 1, -1)
+        return starts, troughs, ends
+
+    def episodes(self):
+        if self._episodes is not None:
+            return self._episodes
+
+        starts, troughs, ends = self.episode_positions()
+        recovered = ends >= 0
+        finish = np.where(recovered, ends, len(self.values) - 1)
+        labels = self.times if self.times is not None else np.arange(len(self.values))
+
+        episodes = pd.DataFrame({
+            'start': labels[starts] if len(starts) else labels[:0],
+            'trough': labels[troughs] if len(troughs) else labels[:0],
+            'recovery': labels[ends] if len(ends) else labels[:0],
+            'peak_value': self.peak[troughs],
+            'trough_value': self.values[troughs],
+            'depth': self.fraction[troughs],
+            'depth_amount': self.amount[troughs],
+            'length': labels[finish] - labels[starts] if len(starts) else labels[:0] - labels[:0],
+            'to_trough': labels[troughs] - labels[starts] if len(starts) else labels[:0] - labels[:0],
+            'to_recovery': labels[finish] - labels[troughs] if len(starts) else labels[:0] - labels[:0],
+            'recovered': recovered,
+        }, columns=EPISODE_COLUMNS)
+        # Episodes still underwater have no recovery point
+        episodes['recovery'] = episodes['recovery'].where(episodes['recovered'])
+        self._episodes = episodes
+        return episodes
+
+    def top(self, n=5):
+        return self.episodes().nlargest(n, 'depth').reset_index(drop=True)
+
+    def duration_stats(self):
+        lengths = self.episodes()['length']
+        if lengths.empty:
+            return {'count': 0, 'mean': None, 'median': None, 'max': None, 'recovered': 0}
+        return {
+            'count': len(lengths),
+            'mean': lengths.mean(),
+            'median': lengths.median(),
+            'max': lengths.max(),
+            'recovered': int(self.episodes()['recovered'].sum()),
+        }
@@ -1,6 +1,9 @@
 from PyQt5.QtWidgets import QComboBox, QWidget, QVBoxLayout, QLabel
 import pandas as pd
 import logging
+from def_metrics_widgets import MetricsWidgetOperations
+from def_ledger_store import read_master_ledger
+
 class DropDownBoxOperations:
 
     def create_dropdown(self):
@@ -48,7 +51,7 @@ class DropDownBoxOperations:
             self.metrics.filter_by_market(selected_market)
         
         # Refresh the metrics
-        self.metrics.refresh_metrics_and_ui()
+        MetricsWidgetOperations.refresh_metrics_and_ui(self)
         
         # Refresh the UI to reflect the changes
         self.refresh_ui()
@@ -74,7 +77,7 @@ class DropDownBoxOperations:
     def populate_start_date(self):
         try:
             # Read the master.csv file
-            df = pd.read_csv(self.csv_file_path, parse_dates=['OpenDateUtc'])
+            df = read_master_ledger(self.csv_file_path, columns=['OpenDateUtc'])
             
             if df.empty:
                 # If the dataframe is empty, use the current date
@@ -114,7 +117,7 @@ class DropDownBoxOperations:
     def populate_end_date(self):
         try:
             # Read the master.csv file
-            df = pd.read_csv(self.csv_file_path, parse_dates=['DateUtc'])
+            df = read_master_ledger(self.csv_file_path, columns=['DateUtc'])
             
             if df.empty:
                 # If the dataframe is empty, use the current date
@@ -147,7 +150,7 @@ class DropDownBoxOperations:
             
             # Update metrics based on new date range
             self.metrics.set_date_range(selected_date, current_end_date)
-            self.metrics.refresh_metrics_and_ui()
+            MetricsWidgetOperations.refresh_metrics_and_ui(self)
             
             # Refresh the UI (this should be implemented in FinApp)
             self.refresh_ui()
@@ -1,16 +1,18 @@
 import os
+import csv
 import logging
-from PyQt5.QtWidgets import ( QMessageBox, QFileDialog )
-import pandas as pd
-from def_metrics import TradingMetrics
-from def_dates import DateOperations
-from def_ratings import RatingOperations
+from PyQt5.QtWidgets import ( QMessageBox, QFileDialog, QInputDialog )
+from def_ledger_store import ledger_store, store_exists
+
+# pandas, scipy and the metric modules are imported inside the methods that need them,
+# so that constructing FileOperations at startup stays cheap.
 
 class FileOperations:
 
-    def __init__(self, window_operations, csv_file_path):  # Add tab_widget as a parameter
+    def __init__(self, window_operations, csv_file_path, ui):
         self.window_operations = window_operations
         self.csv_file_path = csv_file_path
+        self.ui = ui  # the main window, refreshed after the ledger changes
 
     def create_empty_csv(file_path):
         headers = [
@@ -18,10 +20,17 @@ class FileOperations:
             'Reference', 'Open level', 'Close level', 'Size', 'Currency', 'PL Amount',
             'Cash transaction', 'DateUtc', 'OpenDateUtc', 'CurrencyIsoCode'
         ]
-        df = pd.DataFrame(columns=headers)
+        if os.path.exists(file_path):
+            logging.info(f"CSV file already exists at {file_path}")
+            return
+        if store_exists(file_path):
+            logging.info(f"Ledger store already exists for {file_path}")
+            return
         try:
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            df.to_csv(file_path, index=False)
+            if os.path.dirname(file_path):
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'w', newline='') as f:
+                csv.writer(f).writerow(headers)
             logging.info(f"Created empty CSV file at {file_path}")
         except Exception as e:
             logging.info(f"Failed to create empty CSV file at {file_path}")
@@ -47,85 +56,65 @@ class FileOperations:
             return
 
         logging.info(f"Selected file: {file_path}")
-        
+
+        from def_profiling import profiler
+        from def_dataframes import DataFrameOperations
+        from def_ingest import read_import, known_rows, commit_import, import_metrics, master_lock
+
         try:
             logging.info(f"Getting new data ...")   
-            new_data = pd.read_csv(file_path)
-            logging.info(f"New data loaded successfully. Shape: {new_data.shape}")           
-
-            # Convert 'DateUtc' and 'OpenDateUtc' to datetime with a specified format
-            new_data['DateUtc'] = pd.to_datetime(new_data['DateUtc'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-            new_data['OpenDateUtc'] = pd.to_datetime(new_data['OpenDateUtc'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-
-            # Check for NaT values after conversion
-            if new_data['DateUtc'].isnull().any() or new_data['OpenDateUtc'].isnull().any():
-                logging.warning(f"NaT in OpenDateUtc: {new_data['DateUtc']}")
-                logging.warning(f"NaT in OpenDateUtc: {new_data['OpenDateUtc']}")
-                logging.warning("There are NaT values in DateUtc or OpenDateUtc after conversion.")
-                logging.warning(f"NaT count in DateUtc: {new_data['DateUtc'].isnull().sum()}")
-                logging.warning(f"NaT count in OpenDateUtc: {new_data['OpenDateUtc'].isnull().sum()}")
-                self.window_operations.updateOverviewTab("<font color='#ff0000'>There are NaT values in DateUtc or OpenDateUtc after conversion.</font>")
-                return
-
-            # Log the data types after conversion
-            logging.warning(f"Data types after conversion: {new_data.dtypes}")
-            logging.warning(f"First few entries of DateUtc after conversion: {new_data['DateUtc'].head()}")
+            # Format detection, row validation (bad rows to a quarantine file) and normalisation
+            new_data, validation, rejected_path = read_import(file_path, self.csv_file_path)
 
-            # Convert DateUtc and OpenDateUtc to Unix time format with 'T'
-            # new_data['DateUtc'] = new_data['DateUtc'].apply(lambda x: f"{int(x.timestamp())}T" if pd.notnull(x) else 'NaT')
-            # new_data['OpenDateUtc'] = new_data['OpenDateUtc'].apply(lambda x: f"{int(x.timestamp())}T" if pd.notnull(x) else 'NaT')
+            if new_data.empty:
+                rejected_text = f" Rejected rows: {rejected_path}" if rejected_path else ""
+                self.window_operations.updateOverviewTab(
+                    f"<font color='#ff0000'>No valid rows to import. {validation.summary()}.{rejected_text}</font>")
+                return
             
-            # Process the new data
-            new_data['PL Amount'] = new_data['PL Amount'].replace({',': ''}, regex=True).astype(float)
+            # Update the file
+            with master_lock:
+                try:
+                    with profiler.stage("ingest.read_master"):
+                        master_data = DataFrameOperations.read_master(self.csv_file_path)
+                    logging.info(f"Data loaded successfully. Shape: {master_data.shape}")
+                except Exception as e:
+                    logging.error(f"Error reading data file: {str(e)}")
+                    self.window_operations.updateOverviewTab(f"<font color='#ff0000'>Error reading master data file: {str(e)}</font>")
+                    return
+
+                # Rows an overlapping export repeats are already in the master
+                known = known_rows(master_data, new_data, self.csv_file_path)
+                new_data = new_data[~known]
+                combined_data = commit_import(master_data, new_data, self.csv_file_path, os.path.basename(file_path))
+            logging.info(f"File updated successfully. {len(new_data)} new rows added.")
+            summary = validation.summary(int(known.sum()))
             
-            if 'Balance' not in new_data.columns:
-                new_data['Balance'] = new_data['PL Amount'].cumsum()
+            if rejected_path is None:
+                self.window_operations.updateOverviewTab(f"<font color='#00ff00'>Master file updated successfully. {summary}.</font>")
             else:
-                new_data['Balance'] = new_data['Balance'].replace({',': ''}, regex=True).astype(float)
+                self.window_operations.updateOverviewTab(
+                    f"<font color='#ffaa00'>Master file updated. {summary}. Rejected rows: {rejected_path}</font>")
             
-            # Ensure DateUtc is still in datetime format for grouping
-            # new_data['DateUtc'] = pd.to_datetime(new_data['DateUtc'], errors='coerce')
+            # Calendar cubes already built for the old ledger only need the new rows folded in,
+            # into new cubes: the old ones may still be in use by a chart or leaderboard thread
+            previous_metrics = getattr(self, 'metrics', None)
+            ledger_cubes = getattr(previous_metrics, 'ledger_cubes', {})
+            if getattr(previous_metrics, 'as_of_version', None) is not None:
+                ledger_cubes = {}  # built for an earlier version of the ledger
 
-            # Check again for NaT values after conversion to Unix time format
-            # if new_data['DateUtc'].isnull().any():
-            #     logging.warning("There are NaT values in DateUtc after converting to Unix time format.")
-            #     self.window_operations.updateOverviewTab("<font color='#ff0000'>There are NaT values in DateUtc after converting to Unix time format.</font>")
-            #     return
+            # Metrics over the merged ledger already in memory, instead of reading the file back
+            with profiler.stage("ingest.metrics"):
+                self.metrics = import_metrics(combined_data, self.csv_file_path)
 
-            new_data = new_data.sort_values('DateUtc')
-            
-            # Calculate daily returns
-            new_data['Daily Return'] = new_data.groupby(new_data['DateUtc'].dt.date)['Balance'].pct_change(fill_method=None)
-            
-            # Update the file
-            try:
-                master_data = pd.read_csv(self.csv_file_path, parse_dates=['DateUtc', 'OpenDateUtc'])
-                logging.info(f"Data loaded successfully. Shape: {master_data.shape}")
-            except Exception as e:
-                logging.error(f"Error reading data file: {str(e)}")
-                self.window_operations.updateOverviewTab(f"<font color='#ff0000'>Error reading master data file: {str(e)}</font>")
-                return
-            
-            combined_data = pd.concat([master_data, new_data], ignore_index=True)
-            combined_data = combined_data.sort_values('DateUtc').reset_index(drop=True)
-            combined_data.to_csv(self.csv_file_path, index=False)
-            logging.info(f"File updated successfully. {len(new_data)} new rows added.")
-            
-            self.window_operations.updateOverviewTab(f"<font color='#00ff00'>Master file updated successfully. {len(new_data)} new rows added.</font>")
-            
-            # Reinitialize TradingMetrics with the updated file
-            self.metrics = TradingMetrics(self.csv_file_path)
-            
-            # Reset date range and market filter
-            DateOperations.set_date_range(self)
-            self.populate_market_combo()
-            
-            # Refresh the UI
-            TradingMetrics.refresh_metrics_and_ui(self)
-            RatingOperations.update_trader_rating(self)
+            with profiler.stage("ingest.calendar"):
+                self.metrics.ledger_cubes = {timezone: cube.extended(new_data) for timezone, cube in ledger_cubes.items()}
+
+            # Reset date range and market filter, rebuild the metric cards and charts
+            self.ui.show_ledger(self.metrics)
 
             # After processing, update the tab text
-            self.tab_widget.setTabText(self.tab_widget.indexOf(self.window_operations.overviewTab), "Updated Overview")
+            self.ui.tabWidget.setTabText(self.ui.tabWidget.indexOf(self.ui.overviewTab), "Updated Overview")
 
         except Exception as e:
             logging.error(f"Error reading new data file: {str(e)}")
@@ -138,6 +127,9 @@ class FileOperations:
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         
         if reply == QMessageBox.Yes:
+            import pandas as pd
+            from def_metrics import TradingMetrics
+
             try:
                 # Create an empty DataFrame with the correct headers
                 empty_df = pd.DataFrame(columns=[
@@ -146,23 +138,79 @@ class FileOperations:
                     'Cash transaction', 'DateUtc', 'OpenDateUtc', 'CurrencyIsoCode'
                 ])
                 
-                # Save the empty DataFrame to the master.csv file
-                empty_df.to_csv(self.csv_file_path, index=False)
+                # Save the empty DataFrame to the master.csv file; a segment store is emptied
+                # instead, its segments are deleted once no reader needs them
+                if store_exists(self.csv_file_path):
+                    ledger_store(self.csv_file_path).clear()
+                else:
+                    empty_df.to_csv(self.csv_file_path, index=False)
                 
                 self.window_operations.updateOverviewTab("<font color='#00ff00'>Master file deleted and replaced with an empty file containing headers.</font>")
                 
                 # Reinitialize TradingMetrics with the empty file
                 self.metrics = TradingMetrics(self.csv_file_path)
                 
-                # Reset date range and market filter
-                self.set_date_range()
-                self.populate_market_combo()
-                
-                # Refresh the UI
-                self.refresh_metrics_and_ui()
+                # Reset date range and market filter, rebuild the metric cards and charts
+                self.ui.show_ledger(self.metrics)
                 
             except Exception as e:
                 logging.error(f"Error deleting master file: {str(e)}")
                 self.window_operations.updateOverviewTab(f"<font color='#ff0000'>Error deleting master file: {str(e)}</font>")
         else:
-            self.window_operations.updateOverviewTab("Delete master file operation cancelled.")
\ No newline at end of file
+            self.window_operations.updateOverviewTab("Delete master file operation cancelled.")
+
+    def showImportHistory(self):
+        # self is the main window ui: revert an import, go back to a version, or view the
+        # ledger as of one; all of them only rewrite the store's manifest
+        if not store_exists(self.csv_file_path):
+            QMessageBox.information(self.centralwidget, 'Import History', "No imports recorded yet.")
+            return
+        from def_ingest import master_lock
+        from def_metrics import TradingMetrics
+
+        store = ledger_store(self.csv_file_path)
+        history = list(reversed(store.history()))
+        items = [f"{'* ' if record['current'] else ''}Version {record['version']}: {record['action']} "
+                 f"{record['label']} ({record['created']}, {record['rows']:,} rows)" for record in history]
+        item, ok = QInputDialog.getItem(self.centralwidget, 'Import History', "Ledger versions, newest first:", items, 0, False)
+        if not ok:
+            return
+        record = history[items.index(item)]
+        version = record['version']
+
+        box = QMessageBox(self.centralwidget)
+        box.setWindowTitle('Import History')
+        box.setText(f"Version {version}: {record['action']} {record['label']}")
+        revert_button = box.addButton("Revert this import", QMessageBox.DestructiveRole)
+        restore_button = box.addButton("Restore this version", QMessageBox.AcceptRole)
+        view_button = box.addButton("View as of", QMessageBox.ActionRole)
+        box.addButton(QMessageBox.Cancel)
+        revert_button.setEnabled(record['action'] == 'import')
+        box.exec_()
+        clicked = box.clickedButton()
+
+        try:
+            if clicked == view_button:
+                # Read-only: imports still go to the current version
+                metrics = TradingMetrics(store.read(version=version))
+                metrics.ledger_fingerprint = store.fingerprint(version)
+                metrics.as_of_version = version
+                self.show_ledger(metrics)
+                self.window_operations.updateOverviewTab(
+                    f"<font color='#ffaa00'>Viewing the ledger as of version {version} ({record['rows']:,} rows).</font>")
+                return
+            if clicked == revert_button:
+                with master_lock:
+                    current = store.revert(version)
+                message = f"Reverted the import of {record['label']} (version {version}) as version {current}."
+            elif clicked == restore_button:
+                with master_lock:
+                    current = store.restore(version)
+                message = f"Restored version {version} as version {current}."
+            else:
+                return
+            self.show_ledger(TradingMetrics(self.csv_file_path))
+            self.window_operations.updateOverviewTab(f"<font color='#00ff00'>{message}</font>")
+        except Exception as e:
+            logging.error(f"Import history action failed: {str(e)}")
+            self.window_operations.updateOverviewTab(f"<font color='#ff0000'>Import history: {str(e)}</font>")
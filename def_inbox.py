@@ -0,0 +1,190 @@
+import os
+import time
+import queue
+import logging
+from PyQt5.QtCore import QCoreApplication, QThread, QTimer, QFileSystemWatcher, pyqtSignal
+from def_ledger_store import ledger_signature
+
+# Drop-folder import. Broker exports saved into the inbox directory (FINAPP_INBOX, or
+# 'inbox' next to the master file) are imported without File > Update File.
+#
+# A QFileSystemWatcher wakes the GUI thread when the directory changes, and a file is only
+# handed over once its size and modification time are the same on two scans
+# INBOX_SETTLE_MS apart, so half-written downloads are left alone. Where the platform cannot
+# watch the directory it is polled instead. The InboxImporter thread takes files one at a
+# time through the def_ingest pipeline (validation, deduplication against the master,
+# one new ledger segment), builds the new TradingMetrics off the GUI thread and moves the file
+# to inbox/imported (or inbox/failed). The GUI thread then only folds the new rows into the
+# calendar cubes and refreshes the views.
+
+INBOX_ENVIRONMENT = 'FINAPP_INBOX'
+INBOX_SETTLE_MS = 1000
+INBOX_POLL_MS = 5000
+IMPORTED_DIRECTORY = 'imported'
+FAILED_DIRECTORY = 'failed'
+
+def inbox_directory(csv_file_path):
+    return os.environ.get(INBOX_ENVIRONMENT) or os.path.join(os.path.dirname(os.path.abspath(csv_file_path)), 'inbox')
+
+def move_to(file_path, directory):
+    # Into directory/, with the time appended when a file of that name is already there
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, os.path.basename(file_path))
+    if os.path.exists(target):
+        stem, extension = os.path.splitext(os.path.basename(file_path))
+        target = os.path.join(directory, f"{stem}_{time.strftime('%Y%m%d-%H%M%S')}{extension}")
+    os.replace(file_path, target)
+    return target
+
+class InboxImporter(QThread):
+    imported = pyqtSignal(str, object, object, str)  # file name, metrics (None if nothing new), new rows, summary
+    failed = pyqtSignal(str, str)  # file name, error
+
+    def __init__(self, csv_file_path, directory, parent=None):
+        super().__init__(parent)
+        self.csv_file_path = csv_file_path
+        self.directory = directory
+        self.files = queue.Queue()
+
+    def enqueue(self, file_path):
+        self.files.put(file_path)
+
+    def stop(self):
+        self.files.put(None)
+        self.wait()
+
+    def run(self):
+        # The master read for one file is reused for the next one while a batch is queued,
+        # as long as nothing else has written it in between
+        master = None
+        while True:
+            file_path = self.files.get()
+            if file_path is None:
+                break
+            master = self.import_file(file_path, master)
+            if self.files.empty():
+                master = None
+
+    def import_file(self, file_path, master):
+        from def_dataframes import DataFrameOperations
+        from def_ingest import read_import, known_rows, commit_import, import_metrics, master_lock
+
+        name = os.path.basename(file_path)
+        try:
+            new_data, validation, rejected_path = read_import(file_path, self.csv_file_path)
+            if new_data.empty:
+                raise ValueError(f"No valid rows to import. {validation.summary()}")
+            with master_lock:
+                signature = ledger_signature(self.csv_file_path)
+                if master is None or master[0] != signature:
+                    master = (signature, DataFrameOperations.read_master(self.csv_file_path))
+                known = known_rows(master[1], new_data, self.csv_file_path)
+                new_data = new_data[~known]
+                combined_data = commit_import(master[1], new_data, self.csv_file_path, name)
+                master = (ledger_signature(self.csv_file_path), combined_data)
+            metrics = import_metrics(combined_data, self.csv_file_path) if not new_data.empty else None
+            summary = validation.summary(int(known.sum()))
+            if rejected_path is not None:
+                summary = f"{summary}. Rejected rows: {rejected_path}"
+            move_to(file_path, os.path.join(self.directory, IMPORTED_DIRECTORY))
+            logging.info(f"Inbox import of {name}: {summary}")
+            self.imported.emit(name, metrics, new_data, summary)
+        except Exception as e:
+            logging.error(f"Inbox import of {name} failed: {str(e)}")
+            try:
+                move_to(file_path, os.path.join(self.directory, FAILED_DIRECTORY))
+            except OSError as move_error:
+                logging.error(f"Could not move {name} out of the inbox: {str(move_error)}")
+            self.failed.emit(name, str(e))
+            master = None
+        return master
+
+class InboxOperations:
+
+    def start_inbox(self):
+        self.inbox_directory = inbox_directory(self.csv_file_path)
+        try:
+            os.makedirs(self.inbox_directory, exist_ok=True)
+        except OSError as e:
+            logging.error(f"Inbox {self.inbox_directory} not available: {str(e)}")
+            return
+        self.inbox_seen = {}  # file name -> (size, mtime) at the previous scan
+        self.inbox_queued = set()  # handed to the importer, not reported back yet
+
+        self.inbox_importer = InboxImporter(self.csv_file_path, self.inbox_directory, self.centralwidget)
+        self.inbox_importer.imported.connect(lambda name, metrics, new_data, summary: InboxOperations.on_inbox_imported(self, name, metrics, new_data, summary))
+        self.inbox_importer.failed.connect(lambda name, error: InboxOperations.on_inbox_failed(self, name, error))
+        self.inbox_importer.start()
+        QCoreApplication.instance().aboutToQuit.connect(self.inbox_importer.stop)  # the thread waits on its queue
+
+        self.inbox_timer = QTimer(self.centralwidget)
+        self.inbox_timer.timeout.connect(lambda: InboxOperations.scan_inbox(self))
+        self.inbox_watcher = QFileSystemWatcher(self.centralwidget)
+        self.inbox_watched = self.inbox_watcher.addPath(self.inbox_directory)
+        if self.inbox_watched:
+            self.inbox_watcher.directoryChanged.connect(lambda _: InboxOperations.scan_inbox(self))
+            self.inbox_timer.setInterval(INBOX_SETTLE_MS)
+        else:
+            logging.warning(f"Cannot watch {self.inbox_directory}; polling every {INBOX_POLL_MS} ms")
+            self.inbox_timer.setInterval(INBOX_POLL_MS)
+            self.inbox_timer.start()
+        logging.info(f"Inbox: {self.inbox_directory}")
+
+        # Files dropped while the application was closed
+        InboxOperations.scan_inbox(self)
+
+    def scan_inbox(self):
+        current = {}
+        try:
+            with os.scandir(self.inbox_directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.lower().endswith('.csv'):
+                        stat = entry.stat()
+                        current[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError as e:
+            logging.error(f"Error scanning inbox: {str(e)}")
+            return
+
+        settling = False
+        for name, signature in current.items():
+            if name in self.inbox_queued:
+                continue
+            if self.inbox_seen.get(name) == signature:
+                self.inbox_queued.add(name)
+                self.inbox_importer.enqueue(os.path.join(self.inbox_directory, name))
+            else:
+                settling = True
+        self.inbox_seen = current
+
+        # The settle timer only runs while a file may still be growing
+        if settling:
+            self.inbox_timer.start()
+        elif self.inbox_watched:
+            self.inbox_timer.stop()
+
+    def on_inbox_imported(self, name, metrics, new_data, summary):
+        self.inbox_queued.discard(name)
+        if metrics is None:
+            self.window_operations.updateOverviewTab(f"<font color='#00ff00'>Inbox: {name} had nothing new. {summary}.</font>")
+            return
+
+        # Calendar cubes already built for the old ledger only need the new rows folded in,
+        # into new cubes: the old ones may still be in use by a chart or leaderboard thread
+        previous_metrics = getattr(self, 'metrics', None)
+        ledger_cubes = getattr(previous_metrics, 'ledger_cubes', {})
+        if getattr(previous_metrics, 'as_of_version', None) is not None:
+            ledger_cubes = {}  # built for an earlier version of the ledger
+        metrics.ledger_cubes = {timezone: cube.extended(new_data) for timezone, cube in ledger_cubes.items()}
+
+        market = self.marketComboBox.currentText()
+        self.show_ledger(metrics)
+        index = self.marketComboBox.findText(market)
+        if index >= 0:
+            self.marketComboBox.setCurrentIndex(index)
+        self.window_operations.updateOverviewTab(f"<font color='#00ff00'>Inbox: imported {name}. {summary}.</font>")
+
+    def on_inbox_failed(self, name, error):
+        if not os.path.exists(os.path.join(self.inbox_directory, name)):
+            self.inbox_queued.discard(name)  # a file that could not be moved out is not retried
+        self.window_operations.updateOverviewTab(
+            f"<font color='#ff0000'>Inbox: {name} moved to {FAILED_DIRECTORY}/. {error}</font>")
@@ -0,0 +1,93 @@
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from def_adapters import adapters
+from def_dataframes import DataFrameOperations
+from def_metrics import TradingMetrics
+from def_profiling import profiler
+from def_result_cache import result_cache
+from def_ledger_store import ledger_store, store_exists
+from def_schema import apply_schema, CENTS_COLUMN
+from def_validation import LedgerValidation, quarantine_path
+
+# Import pipeline shared by File > Update File, the inbox worker and the benchmark; Qt-free.
+#
+#   new_data, validation, rejected_path = read_import('export.csv', 'master.csv')
+#   known = known_rows(master_data, new_data, 'master.csv')   # rows an overlapping export repeats
+#   combined = commit_import(master_data, new_data[~known], 'master.csv', 'export.csv')
+#   metrics = import_metrics(combined, 'master.csv')
+#
+# Broker exports usually overlap (each one covers the last weeks), so rows the master
+# already holds are recognised by a hash of their identity columns and dropped. The rows
+# left are written as one new segment of the master's store (def_ledger_store), so an
+# import costs the size of the import rather than of the ledger.
+# Reading the master, deduplicating and committing happen under master_lock, as the inbox
+# worker and File > Update File may import at the same time.
+
+IDENTITY_COLUMNS = ['Reference', 'DateUtc', 'OpenDateUtc', 'Transaction type', 'MarketName', CENTS_COLUMN]
+master_lock = threading.Lock()
+
+def row_keys(frame):
+    # uint64 hash of the identity columns of every row (by value, also for categoricals)
+    columns = [column for column in IDENTITY_COLUMNS if column in frame.columns]
+    return pd.util.hash_pandas_object(frame[columns], index=False).to_numpy()
+
+def read_import(file_path, master_path):
+    # Detects the export format, validates every row (bad rows go to a quarantine file next
+    # to the master) and normalises the rest into the ledger schema
+    with profiler.stage("ingest.read_csv"):
+        new_data = adapters.read(file_path)
+    logging.info(f"New data loaded successfully. Shape: {new_data.shape}")
+
+    with profiler.stage("ingest.validate"):
+        validation = LedgerValidation(new_data)
+        rejected_path = None
+        if validation.rejected_count():
+            rejected_path = validation.write_quarantine(new_data, quarantine_path(master_path, file_path))
+        new_data = validation.accepted_rows(new_data)
+    logging.info(validation.summary())
+    if new_data.empty:
+        return new_data, validation, rejected_path
+
+    with profiler.stage("ingest.parse_amounts"):
+        new_data = DataFrameOperations.parse_import_amounts(new_data)
+    with profiler.stage("ingest.daily_returns"):
+        new_data = DataFrameOperations.add_daily_returns(new_data)
+    with profiler.stage("ingest.schema"):
+        new_data = apply_schema(new_data)
+    return new_data, validation, rejected_path
+
+def known_rows(master_data, new_data, master_path=None):
+    # Mask of the import rows the master already holds; a segment store keeps the keys of
+    # its rows, so only the import is hashed
+    if master_data.empty or new_data.empty:
+        return np.zeros(len(new_data), dtype=bool)
+    with profiler.stage("ingest.deduplicate"):
+        keys = row_keys(new_data)
+        known = None
+        if master_path is not None and store_exists(master_path):
+            known = ledger_store(master_path).contains(keys)
+        return known if known is not None else np.isin(keys, row_keys(master_data))
+
+def commit_import(master_data, new_data, master_path, label=''):
+    # Merges the import into the master ledger and writes it as one new segment and version
+    # of the master's store (a CSV master becomes a store on its first import); label names
+    # the import in the store's history. Returns the combined ledger
+    with profiler.stage("ingest.write_master"):
+        combined_data = DataFrameOperations.merge_ledgers(master_data, new_data)
+        if new_data.empty:
+            return combined_data  # nothing new; the ledger stays as it is
+        store = ledger_store(master_path)
+        if not store.exists():
+            store.migrate(master_data, row_keys(master_data))
+        store.append(new_data, row_keys(new_data), label)
+    store.compact_in_background()
+    return combined_data
+
+def import_metrics(combined_data, master_path):
+    # TradingMetrics over the merged ledger already in memory; the master's new fingerprint
+    # keeps the persistent result cache working as if the file had been loaded
+    metrics = TradingMetrics(combined_data)
+    metrics.ledger_fingerprint = result_cache.fingerprint(master_path)
+    return metrics
@@ -0,0 +1,140 @@
+import logging
+import numpy as np
+import pandas as pd
+from def_metric_registry import format_metric
+from def_result_cache import DEFAULT_RISK_FREE_RATE
+from def_schema import cents_values, float_values, to_money
+
+# Per-market leaderboard. The core report of every MarketName is computed in one pass over
+# market-sorted arrays instead of one filter_by_market() + calculate_metrics() per market:
+# counts and sums are bincounts over the market codes, daily P&L is a reduceat over
+# (market, day) runs, and only the compounded drawdown walks each market's daily returns.
+#
+# The numbers are the ones TradingMetrics reports after filter_by_market(market) over the
+# same date range, including its conventions: Profit Factor divides by the (negative) sum
+# of losing trades, returns are daily P&L over the first DEAL balance, and the Sharpe ratio
+# uses the population standard deviation.
+#
+#   board = leaderboard(metrics.trades, metrics.start_date, metrics.end_date)
+#   board.sort_values('sharpe_ratio', ascending=False).head(10)
+
+LEADERBOARD_COLUMNS = ['trades', 'win_rate', 'profit_factor', 'expectancy', 'sharpe_ratio', 'max_drawdown', 'net_pnl']
+LEADERBOARD_TITLES = {
+    'trades': 'Total Trades', 'win_rate': 'Win Rate', 'profit_factor': 'Profit Factor', 'expectancy': 'Expectancy',
+    'sharpe_ratio': 'Sharpe Ratio', 'max_drawdown': 'Max Drawdown %', 'net_pnl': 'Net P&L',
+}
+LEADERBOARD_KINDS = {
+    'trades': 'count', 'win_rate': 'percent', 'profit_factor': 'ratio', 'expectancy': 'dollars',
+    'sharpe_ratio': 'ratio', 'max_drawdown': 'percent', 'net_pnl': 'dollars',
+}
+DAYS_PER_YEAR = 365  # matches TradingMetrics.cash_rate
+NANOSECONDS_PER_DAY = 86_400 * 1_000_000_000
+GRID_CELLS = 1 << 22  # (market, day) cells binned directly before sorting is cheaper
+
+def safe_divide_array(numerator, denominator):
+    # Elementwise safe_divide: a zero or NaN denominator gives inf
+    result = np.full(len(numerator), float('inf'))
+    valid = (denominator != 0) & ~np.isnan(denominator)
+    np.divide(numerator, denominator, out=result, where=valid)
+    return result
+
+def day_numbers(dates):
+    return (pd.Timestamp(dates) - pd.Timestamp(0)).days if dates is not None else None
+
+def leaderboard(trades, start_date=None, end_date=None, risk_free_rate=DEFAULT_RISK_FREE_RATE):
+    if trades is None or trades.empty or 'MarketName' not in trades.columns:
+        return pd.DataFrame(columns=LEADERBOARD_COLUMNS, index=pd.Index([], name='market'))
+
+    # DEAL rows with a market and a date inside the range; dates as whole days since the epoch
+    times = trades['DateUtc'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    valid_time = times != np.iinfo(np.int64).min
+    days = np.floor_divide(times, NANOSECONDS_PER_DAY)
+    codes, markets = pd.factorize(trades['MarketName'], sort=True)  # missing markets get -1
+    selected = (trades['Transaction type'] == 'DEAL').to_numpy() & valid_time & (codes >= 0)
+    if start_date is not None:
+        selected &= days >= day_numbers(start_date)
+    if end_date is not None:
+        selected &= days <= day_numbers(end_date)
+    positions = np.flatnonzero(selected)
+    if len(positions) == 0:
+        return pd.DataFrame(columns=LEADERBOARD_COLUMNS, index=pd.Index([], name='market'))
+
+    # Markets that only have rows outside the selection drop out of the codes
+    used = np.bincount(codes[positions], minlength=len(markets)) > 0
+    codes = (np.cumsum(used) - 1)[codes[positions]]
+    markets = np.asarray(markets[used], dtype=object)  # plain names, also when MarketName is categorical
+    pnl = float_values(trades['PL Amount'].iloc[positions])  # wins and losses, NaN for missing amounts
+    cents = cents_values(trades)[positions]  # sums, exact as integer-valued floats below 2**53 cents
+    balance = (trades['Balance'].to_numpy(dtype=float)[positions] if 'Balance' in trades.columns
+               else np.full(len(positions), np.nan))
+    days = days[positions]
+    count = len(markets)
+
+    # Trade counts and sums: one bincount each over the market codes
+    trade_count = np.bincount(codes, minlength=count)
+    wins = np.bincount(codes, weights=pnl > 0, minlength=count)
+    losses = np.bincount(codes, weights=pnl <= 0, minlength=count)
+    profit = to_money(np.bincount(codes, weights=np.where(cents > 0, cents, 0), minlength=count))
+    loss = to_money(np.bincount(codes, weights=np.where(cents < 0, cents, 0), minlength=count))
+    net_pnl = to_money(np.bincount(codes, weights=cents, minlength=count))
+
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        win_rate = safe_divide_array(wins, trade_count.astype(float))
+        average_win = safe_divide_array(profit, wins)
+        average_loss = safe_divide_array(loss, losses)
+        expectancy = win_rate * average_win - (1 - win_rate) * average_loss
+        profit_factor = safe_divide_array(profit, loss)
+
+        # Daily returns: P&L per (market, day) over the market's first DEAL balance, in
+        # market-major, day-minor order. A dense (market x day) bincount needs no sort; a
+        # sparse grid (few trades over many years) falls back to a stable lexsort.
+        first_day = days.min()
+        span = int(days.max() - first_day) + 1
+        if count * span <= max(4 * len(days), GRID_CELLS):
+            cells = codes.astype(np.int64) * span + (days - first_day)
+            daily_pnl = np.bincount(cells, weights=cents, minlength=count * span)
+            occupied = np.flatnonzero(np.bincount(cells, minlength=count * span))
+            daily_pnl = daily_pnl[occupied]
+            run_codes = occupied // span
+        else:
+            order = np.lexsort((days, codes))
+            sorted_codes, sorted_days = codes[order], days[order]
+            run_starts = np.flatnonzero(np.concatenate(([True], (np.diff(sorted_codes) != 0) | (np.diff(sorted_days) != 0))))
+            daily_pnl = np.add.reduceat(cents[order], run_starts)
+            run_codes = sorted_codes[run_starts]
+        first_position = np.full(count, len(codes))
+        np.minimum.at(first_position, codes, np.arange(len(codes)))  # first DEAL row of each market in ledger order
+        returns = to_money(daily_pnl) / balance[first_position][run_codes]
+
+        trade_days = np.bincount(run_codes, minlength=count)
+        mean_return = np.bincount(run_codes, weights=returns, minlength=count) / trade_days
+        deviation = returns - mean_return[run_codes]
+        std_return = np.sqrt(np.bincount(run_codes, weights=deviation * deviation, minlength=count) / trade_days)
+        sharpe_ratio = safe_divide_array(mean_return - risk_free_rate / DAYS_PER_YEAR, std_return)
+
+        # Compounded drawdown of each market's daily returns
+        run_bounds = np.append(np.flatnonzero(np.diff(run_codes) != 0) + 1, len(run_codes))
+        max_drawdown = np.full(count, np.nan)
+        start = 0
+        for code, stop in zip(run_codes[run_bounds - 1], run_bounds):
+            equity = np.cumprod(1 + returns[start:stop])
+            depth = 1 - equity / np.fmax.accumulate(equity)
+            finite = depth[~np.isnan(depth)]
+            if len(finite):
+                max_drawdown[code] = max(min(-finite.max(), 0), -1)
+            start = stop
+
+    board = pd.DataFrame({
+        'trades': trade_count, 'win_rate': win_rate, 'profit_factor': profit_factor, 'expectancy': expectancy,
+        'sharpe_ratio': sharpe_ratio, 'max_drawdown': max_drawdown, 'net_pnl': net_pnl,
+    }, index=pd.Index(markets, name='market'))
+    logging.info(f"Leaderboard: {count} markets over {len(positions)} trades")
+    return board.sort_values('net_pnl', ascending=False)
+
+def leaderboard_rows(board):
+    # [(market, [(value, text), ...])] in LEADERBOARD_COLUMNS order, for tables that sort on
+    # the raw values and show the formatted ones
+    columns = [board[column].to_numpy() for column in LEADERBOARD_COLUMNS]
+    return [(market, [(float(values[row]), format_metric(values[row], LEADERBOARD_KINDS[column]))
+                      for column, values in zip(LEADERBOARD_COLUMNS, columns)])
+            for row, market in enumerate(board.index)]
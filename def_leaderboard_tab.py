@@ -0,0 +1,123 @@
+import logging
+from PyQt5.QtCore import Qt, QThread, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt5.QtWidgets import QLabel, QTableView, QVBoxLayout, QWidget, QHeaderView, QAbstractItemView
+
+# Leaderboard tab: the core report of every market side by side, sortable on any column.
+# The board is computed (or read from the result cache) on a LeaderboardLoader thread and
+# arrives as plain rows of (value, text) pairs, so sorting 500 markets is a Python sort on
+# the model and neither Qt nor this module touches pandas.
+
+HEADERS = ['Market', 'Total Trades', 'Win Rate', 'Profit Factor', 'Expectancy', 'Sharpe Ratio', 'Max Drawdown %', 'Net P&L']
+NET_PNL_COLUMN = 7
+
+class LeaderboardLoader(QThread):
+    loaded = pyqtSignal(int, object)
+
+    def __init__(self, metrics, generation, parent=None):
+        super().__init__(parent)
+        self.metrics = metrics
+        self.generation = generation
+
+    def run(self):
+        from def_leaderboard import leaderboard_rows
+        try:
+            rows = leaderboard_rows(self.metrics.market_leaderboard())
+        except Exception as e:
+            logging.error(f"Error calculating the market leaderboard: {str(e)}")
+            rows = []
+        self.loaded.emit(self.generation, rows)
+
+def sort_value(value):
+    # NaN (N/A) sorts below every number in either direction of the sort
+    return (value == value, value)
+
+class LeaderboardModel(QAbstractTableModel):
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.sort_column, self.sort_order = NET_PNL_COLUMN, Qt.DescendingOrder
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = list(rows)
+        self.order_rows()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        market, values = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return market if index.column() == 0 else values[index.column() - 1][1]
+        if role == Qt.TextAlignmentRole and index.column() > 0:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def order_rows(self):
+        if self.sort_column == 0:
+            key = lambda row: row[0]
+        else:
+            key = lambda row: sort_value(row[1][self.sort_column - 1][0])
+        self.rows.sort(key=key, reverse=self.sort_order == Qt.DescendingOrder)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self.sort_column, self.sort_order = column, order
+        self.order_rows()
+        self.layoutChanged.emit()
+
+class LeaderboardTabOperations:
+
+    def create_leaderboard_tab(self):
+        self.leaderboardTab = QWidget()
+        self.leaderboardTab.setObjectName("leaderboardTab")
+        layout = QVBoxLayout(self.leaderboardTab)
+        self.leaderboard_status = QLabel()
+        self.leaderboard_status.setStyleSheet("color: #aaaaaa; font-size: 10px;")
+        layout.addWidget(self.leaderboard_status)
+
+        self.leaderboard_model = LeaderboardModel(self.leaderboardTab)
+        self.leaderboard_view = QTableView()
+        self.leaderboard_view.setModel(self.leaderboard_model)
+        self.leaderboard_view.setSortingEnabled(True)
+        self.leaderboard_view.sortByColumn(NET_PNL_COLUMN, Qt.DescendingOrder)
+        self.leaderboard_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.leaderboard_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.leaderboard_view.verticalHeader().setVisible(False)
+        self.leaderboard_view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.leaderboard_view.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.leaderboard_view, 1)
+
+        self.leaderboard_generation = 0
+        self.tabWidget.insertTab(self.tabWidget.indexOf(self.diagnosticsTab), self.leaderboardTab, "Leaderboard")
+
+    def refresh_leaderboard(self):
+        metrics = self.metrics
+        if metrics.trades.empty:
+            self.leaderboard_model.set_rows([])
+            self.leaderboard_status.setText("No trade data available. Please update the master file.")
+            return
+        self.leaderboard_generation += 1
+        self.leaderboard_status.setText("Calculating…")
+        loader = LeaderboardLoader(metrics.snapshot(), self.leaderboard_generation, self.leaderboardTab)
+        loader.loaded.connect(lambda generation, rows: LeaderboardTabOperations.on_leaderboard_loaded(self, generation, rows))
+        loader.finished.connect(loader.deleteLater)
+        loader.start()
+
+    def on_leaderboard_loaded(self, generation, rows):
+        if generation != self.leaderboard_generation:
+            return
+        self.leaderboard_model.set_rows(rows)
+        self.leaderboard_status.setText(f"{len(rows)} markets, {self.metrics.start_date} to {self.metrics.end_date}")
@@ -0,0 +1,554 @@
+import os
+import json
+import time
+import logging
+import threading
+from def_result_cache import combine, segment_hashes
+
+# Segmented, versioned master ledger.
+#
+# The master is a directory next to the ledger path ('m1.csv' -> 'm1.ledger/') holding
+# immutable segments, each a ledger CSV sorted by DateUtc, and a small manifest listing
+# them in order:
+#
+#   m1.ledger/manifest.json
+#   m1.ledger/segments/00000001.csv          rows of one import (or of a compaction)
+#   m1.ledger/segments/00000009.parts.npy    part of every row of a compacted segment
+#   m1.ledger/keys/<part>.npy                dedup keys of one import (def_ingest.row_keys), sorted
+#
+# An import writes one new segment and then swaps in a new manifest; both go through a
+# temporary file, fsync and os.replace, so a crash leaves either the old ledger or the new
+# one and never a half-written history. Segments are never modified. Readers take the
+# segments of one manifest and merge them by DateUtc: concatenated, they are k sorted runs,
+# which a stable sort merges in O(n log k), ties keeping manifest order.
+#
+# The rows of one import are a 'part', and every change to the ledger is a numbered
+# version: an import adds a part, Delete File closes all of them, revert(v) closes the parts
+# version v added and restore(v) reopens exactly the parts of version v. Each part records
+# the versions it is alive in, so undoing an import or going back to an earlier version only
+# rewrites the manifest, whatever the size of the ledger, and read(version=v) shows the
+# ledger as of any kept version. The dedup keys are stored per part, so a reverted import
+# can be imported again. The last MAX_VERSIONS versions are kept.
+#
+# A compactor thread merges COMPACTION_FANIN neighbouring segments (the window with the
+# fewest rows) whenever the ledger has more than COMPACTION_FANIN segments per size tier of
+# its row count, so the segment count stays logarithmic in the ledger's size and reads do
+# not slow down as imports accumulate. Compaction only reorders the segments' text, never
+# re-parses or re-formats a value, and drops the rows of parts no kept version has. The
+# ledger fingerprint of a version is built from its parts, which a compacted segment
+# carries over: compaction changes neither the rows nor the order a reader sees, and a
+# restored version finds its cached results again. Replaced segments are deleted
+# GARBAGE_SECONDS later, after readers of the previous manifest are done with them.
+#
+# A CSV master is migrated into a store by its first import (def_ingest.commit_import);
+# until then, and for read-only tools, the CSV is read as before.
+#
+#   store = ledger_store('m1.csv')
+#   trades = store.read()                    # one frame, merged by DateUtc
+#   version = store.append(new_rows, keys, 'export.csv')   # one segment, crash-safe
+#   store.revert(version)                    # or store.read(version=version - 1)
+#   store.compact_in_background()
+
+STORE_SUFFIX = '.ledger'
+MANIFEST_FILE = 'manifest.json'
+SEGMENT_DIRECTORY = 'segments'
+SEGMENT_SUFFIX = '.csv'
+KEYS_DIRECTORY = 'keys'
+KEYS_SUFFIX = '.npy'
+PARTS_SUFFIX = '.parts.npy'
+MIGRATED_PREFIX = 'migrated-'
+COMPACTION_FANIN = 4
+COMPACTION_MIN_ROWS = 50000  # segments below this are all tier 0
+GARBAGE_SECONDS = 600
+MAX_VERSIONS = 100
+
+def store_directory(ledger_path):
+    return os.path.splitext(os.path.abspath(ledger_path))[0] + STORE_SUFFIX
+
+def sync_file(file_path):
+    with open(file_path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+def sync_directory(directory):
+    # Makes a rename durable; not available on every platform
+    try:
+        descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+def commit_file(temporary, file_path):
+    sync_file(temporary)
+    os.replace(temporary, file_path)
+    sync_directory(os.path.dirname(file_path))
+
+def alive(part, version):
+    # Whether a part's rows are in the ledger at version; 'alive' lists [from, to) spans
+    return any(start <= version and (end is None or version < end) for start, end in part['alive'])
+
+def size_tier(rows):
+    # 0 below COMPACTION_MIN_ROWS, then one tier per COMPACTION_FANIN-fold growth
+    tier = 0
+    limit = COMPACTION_MIN_ROWS
+    while rows >= limit:
+        tier += 1
+        limit *= COMPACTION_FANIN
+    return tier
+
+def compaction_group(segments):
+    # (start, end) of the COMPACTION_FANIN consecutive segments with the fewest rows, once
+    # the ledger has more segments than COMPACTION_FANIN per size tier of its total
+    rows = [segment['rows'] for segment in segments]
+    if len(rows) <= COMPACTION_FANIN * (size_tier(sum(rows)) + 1):
+        return None
+    windows = [sum(rows[start:start + COMPACTION_FANIN]) for start in range(len(rows) - COMPACTION_FANIN + 1)]
+    start = windows.index(min(windows))
+    return start, start + COMPACTION_FANIN
+
+def merge_order(dates):
+    # Positions that merge the concatenated sorted runs by date; ties keep run order
+    import numpy as np
+    return np.argsort(dates, kind='stable')
+
+def merge_frames(frames):
+    # One frame from the frames of consecutive segments, merged by DateUtc. Shared
+    # categories first, so the labels stay categorical through the concat.
+    import pandas as pd
+    from def_schema import apply_schema, CATEGORY_COLUMNS
+    for column in CATEGORY_COLUMNS:
+        parts = [frame[column] for frame in frames if column in frame.columns]
+        if len(parts) > 1 and all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            categories = pd.Index([]).append([part.cat.categories for part in parts]).unique()
+            frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)})
+                      if column in frame.columns else frame for frame in frames]
+    combined = pd.concat(frames, ignore_index=True)
+    if 'DateUtc' in combined.columns:
+        combined = combined.take(merge_order(combined['DateUtc'].to_numpy())).reset_index(drop=True)
+    return apply_schema(combined)
+
+class LedgerStore:
+
+    def __init__(self, ledger_path):
+        self.ledger_path = os.path.abspath(ledger_path)
+        self.directory = store_directory(ledger_path)
+        self.manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        self.segment_directory = os.path.join(self.directory, SEGMENT_DIRECTORY)
+        self.keys_directory = os.path.join(self.directory, KEYS_DIRECTORY)
+        self.lock = threading.RLock()  # manifest read-modify-write
+        self.compactor = None
+        self.key_arrays = {}  # part id -> sorted keys; parts never change
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    # Manifest
+
+    def manifest(self):
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest if 'version' in manifest else self.upgrade()
+
+    def upgrade(self):
+        # A store written before versions: every segment becomes one part of version 1, its
+        # keys file moving to keys/
+        with self.lock:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if 'version' in manifest:
+                return manifest
+            os.makedirs(self.keys_directory, exist_ok=True)
+            manifest.update(version=0, versions=[], parts=[])
+            version = self.record_version(manifest, 'create', "Ledger before import history")
+            for segment in manifest['segments']:
+                part_id = combine([segment['name'], segment['digest']])
+                old_keys = self.segment_path(os.path.splitext(segment['name'])[0] + '.keys.npy')
+                if os.path.exists(old_keys):
+                    os.replace(old_keys, self.keys_path(part_id))
+                segment['parts'] = [part_id]
+                manifest['parts'].append({'id': part_id, 'rows': segment['rows'], 'label': segment['name'],
+                                          'added': version, 'alive': [[version, None]]})
+            self.write_manifest(manifest)
+        logging.info(f"Ledger store {self.directory} upgraded to versioned manifests")
+        return manifest
+
+    def write_manifest(self, manifest):
+        temporary = f"{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        commit_file(temporary, self.manifest_path)
+
+    def segments(self):
+        return self.manifest()['segments']
+
+    def signature(self):
+        # Changes whenever the manifest does, compaction included
+        stat = os.stat(self.manifest_path)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def segment_path(self, name):
+        return os.path.join(self.segment_directory, name)
+
+    def parts_path(self, name):
+        return self.segment_path(os.path.splitext(name)[0] + PARTS_SUFFIX)
+
+    def keys_path(self, part_id):
+        return os.path.join(self.keys_directory, part_id + KEYS_SUFFIX)
+
+    def allocate_name(self, manifest):
+        # Under self.lock; the caller writes the manifest back
+        manifest['next_id'] += 1
+        return f"{manifest['next_id']:08d}{SEGMENT_SUFFIX}"
+
+    # Versions
+
+    def version_parts(self, manifest, version=None):
+        # Ids of the parts that make up a version (the current one by default), in import order
+        version = manifest['version'] if version is None else version
+        if version not in {record['version'] for record in manifest['versions']}:
+            raise ValueError(f"Ledger version {version} is not kept any more")
+        return [part['id'] for part in manifest['parts'] if alive(part, version)]
+
+    def fingerprint(self, version=None):
+        # Digest of the version's parts in order: unchanged by compaction, and a restored
+        # version gets its old fingerprint (and cached results) back
+        return combine(['ledger store'] + self.version_parts(self.manifest(), version))
+
+    def history(self):
+        # Kept versions, oldest first, with the rows each one holds
+        manifest = self.manifest()
+        records = []
+        for record in manifest['versions']:
+            rows = sum(part['rows'] for part in manifest['parts'] if alive(part, record['version']))
+            records.append(dict(record, rows=rows, current=record['version'] == manifest['version']))
+        return records
+
+    def record_version(self, manifest, action, label):
+        manifest['version'] += 1
+        manifest['versions'].append({'version': manifest['version'], 'action': action, 'label': label,
+                                     'created': time.strftime('%Y-%m-%d %H:%M:%S')})
+        return manifest['version']
+
+    def trim_history(self, manifest):
+        # Forgets the versions past MAX_VERSIONS, and the parts no kept version has; their
+        # rows leave the segments at the next compaction
+        if len(manifest['versions']) <= MAX_VERSIONS:
+            return
+        manifest['versions'] = manifest['versions'][-MAX_VERSIONS:]
+        oldest = manifest['versions'][0]['version']
+        parts = []
+        for part in manifest['parts']:
+            part['alive'] = [span for span in part['alive'] if span[1] is None or span[1] > oldest]
+            if part['alive']:
+                parts.append(part)
+        manifest['parts'] = parts
+        kept = {part['id'] for part in parts}
+        unused = [segment for segment in manifest['segments'] if not kept.intersection(segment['parts'])]
+        self.retire(manifest, unused)
+        manifest['segments'] = [segment for segment in manifest['segments'] if segment not in unused]
+
+    def revert(self, version):
+        # A new version without the rows the import of `version` added; later imports stay
+        with self.lock:
+            manifest = self.manifest()
+            record = next((record for record in manifest['versions'] if record['version'] == version), None)
+            parts = [part for part in manifest['parts'] if part['added'] == version and part['alive'][-1][1] is None]
+            if record is None or not parts:
+                raise ValueError(f"Version {version} added no rows that are still in the ledger")
+            current = self.record_version(manifest, 'revert', f"Revert version {version} ({record['label']})")
+            for part in parts:
+                part['alive'][-1][1] = current
+            self.trim_history(manifest)
+            self.write_manifest(manifest)
+        logging.info(f"Ledger version {current}: reverted version {version}")
+        return current
+
+    def restore(self, version):
+        # A new version with exactly the rows of `version`
+        with self.lock:
+            manifest = self.manifest()
+            wanted = set(self.version_parts(manifest, version))
+            current = self.record_version(manifest, 'restore', f"Restore version {version}")
+            for part in manifest['parts']:
+                is_open = part['alive'][-1][1] is None
+                if is_open and part['id'] not in wanted:
+                    part['alive'][-1][1] = current
+                elif not is_open and part['id'] in wanted:
+                    part['alive'].append([current, None])
+            self.trim_history(manifest)
+            self.write_manifest(manifest)
+        logging.info(f"Ledger version {current}: restored version {version}")
+        return current
+
+    # Writing
+
+    def create(self, frame, keys, label=''):
+        # A new store holding frame (the master so far); keys are its dedup keys, row for row
+        with self.lock:
+            os.makedirs(self.segment_directory, exist_ok=True)
+            os.makedirs(self.keys_directory, exist_ok=True)
+            manifest = {'next_id': 0, 'version': 0, 'versions': [], 'parts': [], 'segments': [], 'obsolete': []}
+            version = self.record_version(manifest, 'create', label)
+            if len(frame):
+                self.add_part(manifest, version, label, frame, keys)
+            self.write_manifest(manifest)
+        logging.info(f"Ledger store created at {self.directory} with {len(frame)} rows")
+
+    def migrate(self, frame, keys):
+        # The CSV master becomes the store's first segment; the CSV itself is kept in the store
+        self.create(frame, keys, f"Migrated {os.path.basename(self.ledger_path)}")
+        if os.path.exists(self.ledger_path):
+            kept = os.path.join(self.directory, MIGRATED_PREFIX + os.path.basename(self.ledger_path))
+            os.replace(self.ledger_path, kept)
+            logging.info(f"Migrated {self.ledger_path} into {self.directory}; original kept as {kept}")
+
+    def write_segment(self, name, frame):
+        # frame in date order (ties keep their order) as an immutable segment; returns its manifest entry
+        from def_schema import write_ledger
+        frame = frame.take(merge_order(frame['DateUtc'].to_numpy()))
+        path = self.segment_path(name)
+        temporary = f"{path}.tmp"
+        write_ledger(frame, temporary)
+        digest = combine(segment_hashes(temporary))
+        commit_file(temporary, path)
+        dates = frame['DateUtc']
+        return {'name': name, 'rows': len(frame), 'first': str(dates.iloc[0]), 'last': str(dates.iloc[-1]),
+                'digest': digest, 'parts': []}
+
+    def write_array(self, file_path, values):
+        import numpy as np
+        temporary = f"{file_path}.tmp"
+        with open(temporary, 'wb') as f:
+            np.save(f, values)
+        commit_file(temporary, file_path)
+
+    def add_part(self, manifest, version, label, frame, keys):
+        # The rows of one import: a segment, its dedup keys (sorted, so lookups are binary
+        # searches) and the part that versions refer to
+        import numpy as np
+        name = self.allocate_name(manifest)
+        segment = self.write_segment(name, frame)
+        part_id = combine([name, segment['digest']])
+        segment['parts'] = [part_id]
+        if keys is not None:
+            self.write_array(self.keys_path(part_id), np.sort(keys))
+        manifest['segments'].append(segment)
+        manifest['parts'].append({'id': part_id, 'rows': len(frame), 'label': label, 'added': version,
+                                  'alive': [[version, None]]})
+        return segment
+
+    def append(self, frame, keys=None, label=''):
+        # A new version with the rows of an import in one new segment; O(rows imported)
+        if not len(frame):
+            return None
+        with self.lock:
+            manifest = self.manifest()
+            version = self.record_version(manifest, 'import', label)
+            segment = self.add_part(manifest, version, label, frame, keys)
+            self.trim_history(manifest)
+            self.write_manifest(manifest)
+        logging.info(f"Ledger version {version}: segment {segment['name']} ({segment['rows']} rows) from {label}")
+        return version
+
+    def clear(self):
+        # A new, empty version; restore() brings the rows back
+        with self.lock:
+            manifest = self.manifest()
+            version = self.record_version(manifest, 'clear', 'Delete File')
+            for part in manifest['parts']:
+                if part['alive'][-1][1] is None:
+                    part['alive'][-1][1] = version
+            self.trim_history(manifest)
+            self.write_manifest(manifest)
+        return version
+
+    def retire(self, manifest, segments):
+        now = time.time()
+        manifest['obsolete'].extend({'name': segment['name'], 'since': now} for segment in segments)
+
+    # Reading
+
+    def read(self, columns=None, version=None):
+        # The ledger at a version (the current one by default), merged by DateUtc
+        import numpy as np
+        from def_schema import read_ledger, apply_schema
+        manifest = self.manifest()
+        wanted = set(self.version_parts(manifest, version))
+        frames = []
+        for segment in manifest['segments']:
+            selected = np.array([part in wanted for part in segment['parts']])
+            if not selected.any():
+                continue
+            frame = read_ledger(self.segment_path(segment['name']), columns)
+            if not selected.all():
+                # A compacted segment holding parts this version does not have
+                frame = frame[selected[np.load(self.parts_path(segment['name']))]].reset_index(drop=True)
+            frames.append(frame)
+        if not frames:
+            import pandas as pd
+            from def_adapters import LEDGER_COLUMNS
+            names = [column for column in LEDGER_COLUMNS if columns is None or column in columns]
+            return apply_schema(pd.DataFrame(columns=names))
+        return frames[0] if len(frames) == 1 else merge_frames(frames)
+
+    def contains(self, keys):
+        # Mask of the keys some row of the current version has, None when a part has lost its key file
+        import numpy as np
+        found = np.zeros(len(keys), dtype=bool)
+        for part_id in self.version_parts(self.manifest()):
+            part_keys = self.key_arrays.get(part_id)
+            if part_keys is None:
+                try:
+                    part_keys = self.key_arrays[part_id] = np.load(self.keys_path(part_id))
+                except OSError:
+                    return None
+            if len(part_keys):
+                positions = np.minimum(np.searchsorted(part_keys, keys), len(part_keys) - 1)
+                found |= part_keys[positions] == keys
+        return found
+
+    # Compaction
+
+    def compact(self):
+        # Merges one window of segments; False when there is nothing to merge
+        import numpy as np
+        import pandas as pd
+        with self.lock:
+            manifest = self.manifest()
+            group = compaction_group(manifest['segments'])
+            if group is None:
+                return False
+            sources = manifest['segments'][group[0]:group[1]]
+            kept = {part['id'] for part in manifest['parts']}
+            name = self.allocate_name(manifest)
+            self.write_manifest(manifest)
+
+        # The segments' text as written, reordered by date; values are never re-formatted.
+        # Every row carries the index of its part, and rows of forgotten parts are dropped.
+        frames, indexes, parts = [], [], []
+        for source in sources:
+            frames.append(pd.read_csv(self.segment_path(source['name']), dtype=str, keep_default_na=False))
+            if len(source['parts']) == 1:
+                index = np.zeros(source['rows'], dtype=np.uint32)
+            else:
+                index = np.load(self.parts_path(source['name']))
+            indexes.append(index + len(parts))
+            parts.extend(source['parts'])
+        merged = pd.concat(frames, ignore_index=True).fillna('')
+        index = np.concatenate(indexes)
+        used = np.array([part in kept for part in parts])
+        merged, index = merged[used[index]], index[used[index]]
+        renumber = np.cumsum(used) - 1
+        parts = [part for part, keep in zip(parts, used) if keep]
+        index = renumber[index].astype(np.uint32)
+
+        segment = None
+        if len(merged):
+            order = merge_order(pd.to_datetime(merged['DateUtc'], format='ISO8601').to_numpy())
+            merged, index = merged.take(order), index[order]
+            path = self.segment_path(name)
+            temporary = f"{path}.tmp"
+            merged.to_csv(temporary, index=False)
+            digest = combine(segment_hashes(temporary))
+            commit_file(temporary, path)
+            if len(parts) > 1:
+                self.write_array(self.parts_path(name), index)
+            dates = merged['DateUtc']
+            segment = {'name': name, 'rows': len(merged), 'first': dates.iloc[0], 'last': dates.iloc[-1],
+                       'digest': digest, 'parts': parts}
+
+        with self.lock:
+            manifest = self.manifest()
+            names = [entry['name'] for entry in manifest['segments']]
+            source_names = [source['name'] for source in sources]
+            start = names.index(source_names[0]) if source_names[0] in names else -1
+            if start < 0 or names[start:start + len(sources)] != source_names:
+                # The segments changed underneath; the merged one is not needed
+                manifest['obsolete'].append({'name': name, 'since': time.time()})
+                self.write_manifest(manifest)
+                return False
+            manifest['segments'][start:start + len(sources)] = [segment] if segment else []
+            self.retire(manifest, sources)
+            self.write_manifest(manifest)
+        logging.info(f"Compacted {len(sources)} segments into {name} ({len(merged)} rows, {len(parts)} parts)")
+        return True
+
+    def collect_garbage(self):
+        # Deletes retired segments after GARBAGE_SECONDS, and files no manifest refers to
+        # (left by a crash between writing a file and the manifest, or keys of forgotten
+        # parts) after as long
+        now = time.time()
+        with self.lock:
+            manifest = self.manifest()
+            expired = [entry for entry in manifest['obsolete'] if now - entry['since'] > GARBAGE_SECONDS]
+            if expired:
+                manifest['obsolete'] = [entry for entry in manifest['obsolete'] if entry not in expired]
+                self.write_manifest(manifest)
+            referenced = {entry['name'] for entry in manifest['segments'] + manifest['obsolete']}
+            referenced.update(part['id'] + KEYS_SUFFIX for part in manifest['parts'])
+        names = {entry['name'] for entry in expired}
+        for directory in [self.segment_directory, self.keys_directory]:
+            for file_name in os.listdir(directory):
+                path = os.path.join(directory, file_name)
+                name = file_name[:-len('.tmp')] if file_name.endswith('.tmp') else file_name
+                if name.endswith(PARTS_SUFFIX):
+                    name = name[:-len(PARTS_SUFFIX)] + SEGMENT_SUFFIX
+                orphan = name not in referenced and now - os.path.getmtime(path) > GARBAGE_SECONDS
+                if name in names or orphan:
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        logging.warning(f"Could not delete {path}: {str(e)}")
+
+    def compact_all(self):
+        try:
+            while self.compact():
+                pass
+            self.collect_garbage()
+        except Exception as e:
+            logging.error(f"Ledger compaction failed: {str(e)}")
+
+    def compact_in_background(self):
+        with self.lock:
+            if self.compactor is not None and self.compactor.is_alive():
+                return
+            self.compactor = threading.Thread(target=self.compact_all, name='LedgerCompactor', daemon=True)
+            self.compactor.start()
+
+stores = {}
+stores_lock = threading.Lock()
+
+def ledger_store(ledger_path):
+    # One LedgerStore per ledger in the process, so its lock covers every writer
+    directory = store_directory(ledger_path)
+    with stores_lock:
+        if directory not in stores:
+            stores[directory] = LedgerStore(ledger_path)
+        return stores[directory]
+
+def store_exists(ledger_path):
+    return os.path.exists(os.path.join(store_directory(ledger_path), MANIFEST_FILE))
+
+def store_fingerprint(ledger_path):
+    # Fingerprint of the ledger's store, None while the ledger is still a plain CSV
+    if not store_exists(ledger_path):
+        return None
+    return ledger_store(ledger_path).fingerprint()
+
+def ledger_signature(ledger_path):
+    # Cheap change detector for a master, store or CSV
+    if store_exists(ledger_path):
+        return ledger_store(ledger_path).signature()
+    stat = os.stat(ledger_path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+def read_master_ledger(ledger_path, columns=None):
+    # The master ledger (or some of its columns) in the schema dtypes, from its store or CSV
+    from def_schema import read_ledger
+    if store_exists(ledger_path):
+        return ledger_store(ledger_path).read(columns)
+    return read_ledger(ledger_path, columns)
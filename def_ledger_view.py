@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+# Filtered state without DataFrame copies.
+#
+# A LedgerView is one base ledger plus the positions of the rows it selects. Narrowing a
+# view (view[mask], view.take(positions)) only produces a smaller position array over the
+# same base, and a column is gathered from the base the first time a metric asks for it,
+# so switching filters on a large ledger allocates the few columns the metrics read rather
+# than a copy of every column per filter. Gathered columns are plain pandas Series carrying
+# the base index labels, so code written against the DataFrame slices keeps working:
+#
+#   view = LedgerView(trades, np.flatnonzero(trades['MarketName'] == market))
+#   deals = view[view['Transaction type'] == 'DEAL']
+#   deals['PL Amount'].sum()
+
+def date_mask(times, start_date, end_date):
+    # times.dt.date >= start_date & times.dt.date <= end_date, without building date objects
+    times = pd.Series(times)
+    selected = times.notna()
+    if start_date is not None:
+        selected &= times >= pd.Timestamp(start_date)
+    if end_date is not None:
+        selected &= times < pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    return selected.to_numpy()
+
+class LedgerView:
+
+    def __init__(self, base, rows=None):
+        self.base = base
+        self.rows = None if rows is None else np.asarray(rows, dtype=np.int64)  # None selects every row
+        self.gathered = {}
+
+    def __len__(self):
+        return len(self.base) if self.rows is None else len(self.rows)
+
+    @property
+    def empty(self):
+        return len(self) == 0 or len(self.base.columns) == 0
+
+    @property
+    def shape(self):
+        return (len(self), len(self.base.columns))
+
+    @property
+    def columns(self):
+        return self.base.columns
+
+    @property
+    def index(self):
+        return self.base.index if self.rows is None else self.base.index[self.rows]
+
+    def positions(self):
+        # Positions of the selected rows in the base ledger
+        return np.arange(len(self.base)) if self.rows is None else self.rows
+
+    def column(self, name):
+        if name not in self.gathered:
+            series = self.base[name]
+            self.gathered[name] = series if self.rows is None else series.take(self.rows)
+        return self.gathered[name]
+
+    def take(self, positions):
+        # Sub-view of rows by position within this view
+        return LedgerView(self.base, self.positions()[positions])
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.column(key)
+        if isinstance(key, list):
+            return self.to_frame(key)
+        mask = key.to_numpy(dtype=bool) if isinstance(key, pd.Series) else np.asarray(key, dtype=bool)
+        return self.take(np.flatnonzero(mask))
+
+    def to_frame(self, columns=None):
+        # A real DataFrame of the selected rows, for callers that need one
+        frame = self.base if columns is None else self.base[columns]
+        return frame if self.rows is None else frame.take(self.rows)
@@ -0,0 +1,146 @@
+import logging
+import functools
+import numpy as np
+import pandas as pd
+
+# Metric registry and dependency-graph evaluator.
+#
+# Every metric (and every shared intermediate such as the returns series or the
+# win/loss aggregates) is a node that declares the nodes it needs as inputs. Evaluating
+# a node computes only its subgraph, and each node is computed at most once per filter
+# state: results live in metrics.graph_cache, which calculate_metrics() resets.
+#
+# Custom metrics can be added without touching def_metrics.py:
+#
+#   from def_metric_registry import registry
+#
+#   @registry.metric(inputs=('returns', 'std_dev'), title='Return / Vol', kind='ratio')
+#   def return_over_vol(metrics, returns, std_dev):
+#       return np.mean(returns) / std_dev
+
+KINDS = ('count', 'dollars', 'percent', 'ratio', 'text')
+
+class MetricNode:
+
+    def __init__(self, name, func, inputs=(), title=None, kind='ratio', expensive=False):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown metric kind '{kind}' for {name}; expected one of {KINDS}")
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.title = title
+        self.kind = kind
+        self.expensive = expensive
+
+class MetricRegistry:
+
+    def __init__(self):
+        self.nodes = {}
+
+    def register(self, name, func, inputs=(), title=None, kind='ratio', expensive=False):
+        if name in self.nodes:
+            logging.warning(f"Metric '{name}' is already registered; replacing it")
+        for input_name in inputs:
+            if input_name == name:
+                raise ValueError(f"Metric '{name}' cannot depend on itself")
+        self.nodes[name] = MetricNode(name, func, inputs, title, kind, expensive)
+        return self.nodes[name]
+
+    def unregister(self, name):
+        self.nodes.pop(name, None)
+
+    def metric(self, name=None, inputs=(), title=None, kind='ratio', expensive=False):
+        # Registers a plain function func(metrics, *inputs) as a node
+        def decorator(func):
+            self.register(name or func.__name__, func, inputs, title, kind, expensive)
+            return func
+        return decorator
+
+    def method(self, name=None, inputs=(), title=None, kind='ratio', expensive=False):
+        # Registers a TradingMetrics method as a node. Calling the method with no arguments
+        # goes through the graph (and its cache); extra arguments (e.g. a non-default
+        # confidence) are passed straight through after the inputs are resolved.
+        def decorator(func):
+            node_name = name or func.__name__
+            self.register(node_name, func, inputs, title, kind, expensive)
+
+            @functools.wraps(func)
+            def wrapper(metrics, *args, **kwargs):
+                if not args and not kwargs:
+                    return self.evaluate(metrics, node_name)
+                input_values = [self.evaluate(metrics, input_name) for input_name in self.nodes[node_name].inputs]
+                return func(metrics, *input_values, *args, **kwargs)
+            wrapper.metric_name = node_name
+            return wrapper
+        return decorator
+
+    def evaluation_order(self, names):
+        # Depth-first topological sort of just the subgraph the requested nodes need
+        order, done, in_progress = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in in_progress:
+                raise ValueError(f"Metric dependency cycle through '{name}'")
+            if name not in self.nodes:
+                raise KeyError(f"Unknown metric '{name}'")
+            in_progress.add(name)
+            for input_name in self.nodes[name].inputs:
+                visit(input_name)
+            in_progress.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+    def evaluate(self, metrics, name):
+        cache = metrics.graph_cache
+        if name in cache:
+            return cache[name]
+        for node_name in self.evaluation_order([name]):
+            if node_name in cache:
+                continue
+            node = self.nodes[node_name]
+            cache[node_name] = node.func(metrics, *[cache[input_name] for input_name in node.inputs])
+        return cache[name]
+
+    def evaluate_many(self, metrics, names):
+        return {name: self.evaluate(metrics, name) for name in self.evaluation_order(names) if name in names}
+
+    def report_nodes(self, order=()):
+        # Titled nodes in the given order, followed by any other titled (e.g. custom) nodes
+        named = [self.nodes[name] for name in order if name in self.nodes and self.nodes[name].title]
+        extra = [node for name, node in self.nodes.items() if node.title and name not in order]
+        return named + extra
+
+    def node_for_title(self, title):
+        for node in self.nodes.values():
+            if node.title == title:
+                return node
+        return None
+
+    def is_expensive_title(self, title):
+        node = self.node_for_title(title)
+        return node is not None and node.expensive
+
+def format_metric(value, kind):
+    if isinstance(value, str):
+        return value
+    if value is None or pd.isna(value):
+        return "N/A"
+    if np.isinf(value):
+        return "∞"
+    if kind == 'count':
+        return f"{int(value)}"
+    if kind == 'dollars':
+        return f"${value:.2f}"
+    if kind == 'percent':
+        return f"{value:.2%}"
+    if kind == 'ratio':
+        return f"{value:.2f}"
+    return str(value)
+
+registry = MetricRegistry()
@@ -0,0 +1,283 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, QPoint, QRect, QTimer, pyqtSignal
+from PyQt5.QtWidgets import (QWidget, QGridLayout, QLabel, QVBoxLayout, QScrollArea)
+from def_widgets import WidgetOperations
+from def_charts import ChartOperations
+from def_ratings import RatingOperations
+from def_result_cache import result_cache, result_key, view_params
+
+# Metrics tab of the main window (self is the Ui_MainWindow). The cards are rebuilt for
+# every ledger or filter state and start as placeholders; a card's value is computed once
+# it scrolls into view, expensive ones on the MetricEvaluator thread, so the first paint of
+# the tab never waits on the slowest metric.
+#
+# Card text is persisted per ledger and filter state (TradingMetrics.report_text, under
+# cache_key('report')): cards already computed for the same state are filled in from the
+# result cache, and at startup the cards of the unchanged ledger's report are shown from one
+# stat() and one cache read, before the ledger is even loaded. All cards of one state work
+# on one TradingMetrics.snapshot(), so what is saved under a key was computed for that key.
+
+PENDING_TEXT = "…"
+CALCULATING_TEXT = "Calculating…"
+COLUMNS = 3
+REPORT_SAVE_MS = 1000  # card text is saved once this long has passed without a new value
+
+class MetricEvaluator(QObject):
+    # Computes expensive metrics off the GUI thread; results come back through a queued signal
+    evaluated = pyqtSignal(int, str, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metrics")
+
+    def submit(self, generation, title, metric_func):
+        def run():
+            try:
+                value = metric_func()
+            except Exception as e:
+                logging.error(f"Error calculating metric {title}: {str(e)}")
+                value = None
+            self.evaluated.emit(generation, title, value)
+        self.executor.submit(run)
+
+class MetricsWidgetOperations:
+
+    def create_metrics_view(self):
+        self.metrics_view_layout = QVBoxLayout(self.metricsView1)
+        self.metrics_widget = None
+        self.metrics_scroll_area = None
+        self.metrics_generation = 0
+        self.pending_metric_cards = {}
+        self.metric_cards = {}
+        self.evaluating_snapshots = {}  # title -> copy of the cards' snapshot the evaluator thread is using
+        self.metrics_report = None  # (snapshot, report key) the cards were built for
+        self.report_save_timer = QTimer(self.metricsView1)
+        self.report_save_timer.setSingleShot(True)
+        self.report_save_timer.setInterval(REPORT_SAVE_MS)
+        self.report_save_timer.timeout.connect(lambda: MetricsWidgetOperations.save_report_text(self))
+        self.metric_evaluator = MetricEvaluator(self.metricsView1)
+        self.metric_evaluator.evaluated.connect(
+            lambda generation, title, value: MetricsWidgetOperations.on_metric_evaluated(self, generation, title, value))
+        # Cards are only evaluated while the tab is showing
+        self.tabWidget.currentChanged.connect(lambda _: MetricsWidgetOperations.evaluate_visible_metrics(self))
+
+    def create_card_area(self):
+        scroll_area = QScrollArea()
+        scroll_area.setWidgetResizable(True)
+        
+        container_widget = QWidget()
+        scroll_area.setWidget(container_widget)
+        
+        main_layout = QVBoxLayout(container_widget)
+        
+        # Add some spacing between the date_rating_widget and the metrics grid
+        main_layout.addSpacing(10)
+        
+        grid_layout = QGridLayout()
+        main_layout.addLayout(grid_layout)
+        return scroll_area, grid_layout
+
+    def set_metrics_widget(self, widget):
+        # Replaces the cards shown in the Metrics tab
+        if self.metrics_widget is not None:
+            self.metrics_view_layout.removeWidget(self.metrics_widget)
+            self.metrics_widget.deleteLater()
+        self.metrics_widget = widget
+        self.metrics_view_layout.addWidget(widget, 1)
+
+    def show_cached_report(self):
+        # Startup path: only a stat() of the ledger and one cache read, no pandas
+        fingerprint = result_cache.known_fingerprint(self.csv_file_path)
+        if fingerprint is None:
+            return False
+        values = result_cache.get(result_key(fingerprint, 'report', view_params()))
+        if not values:
+            return False
+        scroll_area, grid_layout = MetricsWidgetOperations.create_card_area(self)
+        for index, (title, text) in enumerate(values):
+            metric_widget = WidgetOperations.create_metric_widget(self, title, "N/A" if text is None else text)
+            grid_layout.addWidget(metric_widget, index // COLUMNS, index % COLUMNS)
+        MetricsWidgetOperations.set_metrics_widget(self, scroll_area)
+        logging.info(f"Metrics tab: {len(values)} cards from the result cache")
+        return True
+
+    def create_metrics_widget(self):
+        logging.info("Creating Metric Widgets")
+        
+        scroll_area, grid_layout = MetricsWidgetOperations.create_card_area(self)
+
+        # Card text of the previous state not saved yet
+        if self.report_save_timer.isActive():
+            self.report_save_timer.stop()
+            MetricsWidgetOperations.save_report_text(self)
+
+        self.metrics_generation += 1
+        self.pending_metric_cards = {}
+        self.metric_cards = {}
+        self.evaluating_snapshots = {}
+        self.metrics_report = None
+        
+        if self.metrics.filtered_trades.empty:
+            no_data_label = QLabel("No trade data available. Please update the master file.")
+            no_data_label.setStyleSheet("color: #ff0000; font-size: 14px;")
+            grid_layout.addWidget(no_data_label, 0, 0)
+            logging.warning("No trade data available")
+        else:
+            # Cards start as placeholders (or with the text persisted for this state); values
+            # are computed once a card scrolls into view (or is requested), so the first paint
+            # never waits on the slowest metric.
+            metrics = self.metrics.snapshot()
+            self.metrics_report = (metrics, metrics.load_report_text())
+
+            row, col = 0, 0
+            for title, metric_func in metrics.generate_report():
+                text = metrics.report_text.get(title)
+                metric_widget = WidgetOperations.create_metric_widget(self, title, PENDING_TEXT if text is None else text)
+                grid_layout.addWidget(metric_widget, row, col)
+                if text is None:
+                    self.pending_metric_cards[title] = (metric_widget, metric_func)
+                self.metric_cards[title] = metric_widget
+                col += 1
+                if col == COLUMNS:
+                    col = 0
+                    row += 1
+
+            self.metrics_scroll_area = scroll_area
+            self.visible_metrics_timer = QTimer(scroll_area)
+            self.visible_metrics_timer.setSingleShot(True)
+            self.visible_metrics_timer.timeout.connect(lambda: MetricsWidgetOperations.evaluate_visible_metrics(self))
+            self.visible_metrics_timer.setInterval(0)
+            scroll_area.verticalScrollBar().valueChanged.connect(lambda *args: self.visible_metrics_timer.start())
+            scroll_area.verticalScrollBar().rangeChanged.connect(lambda *args: self.visible_metrics_timer.start())
+            self.visible_metrics_timer.start()
+
+        logging.info(f"Metrics Widgets created. Is visible: {scroll_area.isVisible()}")
+        
+        return scroll_area
+
+    def evaluate_visible_metrics(self):
+        if self.metrics_scroll_area is None:
+            return
+        viewport = self.metrics_scroll_area.viewport()
+        if not viewport.isVisible():
+            return
+        for title, (metric_widget, _) in list(self.pending_metric_cards.items()):
+            top_left = metric_widget.mapTo(viewport, QPoint(0, 0))
+            if viewport.rect().intersects(QRect(top_left, metric_widget.size())):
+                MetricsWidgetOperations.request_metric(self, title)
+
+    def evaluate_all_metrics(self):
+        for title in list(self.pending_metric_cards):
+            MetricsWidgetOperations.request_metric(self, title)
+
+    def request_metric(self, title):
+        from def_metric_registry import registry
+        metric_widget, metric_func = self.pending_metric_cards.pop(title, (None, None))
+        if metric_widget is None:
+            return
+
+        metrics = self.metrics_report[0]
+        if registry.is_expensive_title(title) and not metrics.has_cached_metric(title):
+            # The evaluator thread works on its own copy of the cards' snapshot, merged back
+            # into it when the value arrives
+            metric_widget.value_label.setText(CALCULATING_TEXT)
+            worker = metrics.snapshot()
+            self.evaluating_snapshots[title] = worker
+            worker_func = dict(worker.generate_report())[title]
+            self.metric_evaluator.submit(self.metrics_generation, title, lambda: worker.cached_metric(title, worker_func))
+            return
+
+        try:
+            value = metrics.cached_metric(title, metric_func)
+        except Exception as e:
+            logging.error(f"Error calculating metric {title}: {str(e)}")
+            value = None
+        MetricsWidgetOperations.show_metric(self, title, value)
+
+    def on_metric_evaluated(self, generation, title, value):
+        if generation != self.metrics_generation or title not in self.metric_cards:
+            return  # the cards were rebuilt while this metric was computing
+        worker = self.evaluating_snapshots.pop(title, None)
+        if worker is not None:
+            self.metrics_report[0].merge_snapshot(worker)
+        MetricsWidgetOperations.show_metric(self, title, value)
+
+    def show_metric(self, title, value):
+        # value is the card text; a failed metric (None) shows N/A and is not persisted
+        self.metric_cards[title].value_label.setText("N/A" if value is None else str(value))
+        if value is not None:
+            self.metrics_report[0].report_text[title] = value
+            self.report_save_timer.start()
+        logging.info(f"Added metric: {title} = {value}")
+
+    def save_report_text(self):
+        if self.metrics_report is not None:
+            metrics, key = self.metrics_report
+            metrics.save_report_text(key)
+
+    def get_metric_explanation(self, metric):
+        explanations = {
+            'Total Trades': "The total number of trades executed in the trading period.",
+            'Total Deposits': "The total amount of money deposited into the trading account.",
+            'Total Withdrawals': "The total amount of money withdrawn from the trading account.",
+            'Gross Profit': "The total amount of money Deposited minus total amount of money withdrawn from the trading account.",
+            'Net Profit': "The total amount of Gross profit - charges and fees.",
+            'CFD Funding Paid': "Amount of money paid when holding a Contract For Difference",
+            'CFD Funding Received': "Amount of money received when holding a Contract For Difference",
+            'Win Rate': "The percentage of trades that resulted in a profit.",
+            'Profit Factor': "The ratio of gross profit to gross loss. Values above 1 indicate overall profitability.",
+            'Sharpe Ratio': "A measure of risk-adjusted return. Higher values indicate better risk-adjusted performance.",
+            'Max Drawdown %': "The largest peak-to-trough decline in the account balance, expressed as a percentage.",
+            'Max Drawdown $': "The largest peak-to-trough decline in the account balance, expressed in dollars.",
+            'Average Trade': "The average profit or loss per trade.",
+            'Expectancy': "The average amount you can expect to win (or lose) per trade.",
+            'Risk-Reward Ratio': "The ratio of the average win to the average loss.",
+            'Sortino Ratio': "Similar to Sharpe ratio, but only considers downside deviation.",
+            'Calmar Ratio': "The ratio of average annual rate of return to maximum drawdown.",
+            'Omega Ratio': "A probability-weighted ratio of gains versus losses for a threshold return target.",
+            'Kappa Three': "A measure of downside risk-adjusted performance.",
+            'Gain to Pain Ratio': "The ratio of the sum of all returns to the absolute value of all losses.",
+            'Van Sharpe Ratio': "A variation of the Sharpe ratio using logarithmic returns.",
+            'Information Ratio': "Measures the risk-adjusted returns of an investment compared to a benchmark.",
+            'Maximum Consecutive Wins': "The highest number of winning trades in a row.",
+            'Maximum Consecutive Losses': "The highest number of losing trades in a row.",
+            'Payoff Ratio': "The ratio of average winning trade to average losing trade.",
+            'Profit per Day': "The average daily profit over the trading period.",
+            'R-Squared': "Indicates how well the trading performance correlates with a benchmark.",
+            'Skewness': "Measures the asymmetry of the return distribution.",
+            'Kurtosis': "Measures the 'tailedness' of the return distribution.",
+            'Value at Risk (95%)': "The maximum loss expected with 95% confidence over a specific time frame.",
+            'Expected Shortfall (95%)': "The expected loss in the worst 5% of cases.",
+            'Modified Sharpe Ratio': "An adjusted Sharpe ratio that accounts for skewness and kurtosis.",
+            'Sterling Ratio': "A risk-adjusted return metric that uses average drawdown instead of standard deviation.",
+            'Burke Ratio': "A performance measurement that uses downside risk to determine reward.",
+            'Tail Ratio': "The ratio of the 95th percentile of returns to the absolute value of the 5th percentile.",
+            'Upside Potential Ratio': "The ratio of upside returns to downside risk.",
+            'Rachev Ratio': "A ratio of expected tail gain to expected tail loss.",
+            'Pain Index': "The average of all drawdowns over the period.",
+            'Ulcer Performance Index': "A risk-adjusted return measure that penalizes deep and long-lasting drawdowns.",
+            'Serenity Index': "A risk-adjusted performance measure that accounts for the length of the track record.",
+            'Bernardo Ledoit Ratio': "The ratio of the average gain to the average loss.",
+            'K-Ratio': "Measures the consistency of returns over time.",
+            'Prospect Ratio': "A ratio that incorporates behavioral finance concepts into performance measurement.",
+            'Tracking Error': "The standard deviation of the difference between the strategy's returns and the benchmark's returns.",
+            'Jensen\'s Alpha': "The average return on the portfolio over and above that predicted by the capital asset pricing model (CAPM).",
+        }
+        return explanations.get(metric, "No explanation available for this metric.")
+
+    def refresh_metrics_and_ui(self):
+        logging.info("Refreshing metrics and UI")
+        
+        # Replace the cards of the previous state in the Metrics tab
+        self.metrics_scroll_area = None
+        MetricsWidgetOperations.set_metrics_widget(self, MetricsWidgetOperations.create_metrics_widget(self))
+        
+        # Update the trader rating
+        if getattr(self, 'trader_rating_label', None) is not None:
+            RatingOperations.update_trader_rating(self)
+
+        # Charts recompute their geometry in the background for the new filter state
+        ChartOperations.refresh_charts(self)
+        
+        logging.info("Metrics and UI refreshed")
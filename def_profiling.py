@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import functools
+import importlib.abc
+import importlib.machinery
+from contextlib import nullcontext
+
+# Classes whose methods are timed while profiling is enabled. They are patched on enable()
+# and restored on disable(), so when profiling is off the original methods run untouched.
+# Only modules that are already imported are patched by enable(); the others are patched
+# when they are first imported, so profiling never imports Qt or pandas by itself.
+INSTRUMENTED_CLASSES = [
+    ('def_metrics', 'TradingMetrics'),
+    ('def_metrics_widgets', 'MetricsWidgetOperations'),
+    ('def_dataframes', 'DataFrameOperations'),
+    ('def_file', 'FileOperations'),
+    ('def_ratings', 'RatingOperations'),
+]
+
+MAX_EVENTS = 1_000_000  # stop recording trace events (not counters) beyond this
+NULL_STAGE = nullcontext()
+
+class TimingStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.histogram = {}  # log2 bucket of microseconds -> count
+
+    def add(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        bucket = int(seconds * 1_000_000).bit_length()
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+    def histogram_rows(self):
+        # (upper bound in seconds, count) for each non-empty bucket, fastest first
+        return [((1 << bucket) / 1_000_000, self.histogram[bucket]) for bucket in sorted(self.histogram)]
+
+class Profiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.stats = {}
+        self.events = []
+        self.start_time = None
+        self.cprofile = None
+        self._originals = []
+        self._lock = threading.Lock()
+        self.pending_modules = set()
+        self._import_hook = _InstrumentOnImport(self)
+
+    def enable(self, cprofile=False):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.start_time = time.perf_counter()
+        self.pending_modules = {module_name for module_name, _ in INSTRUMENTED_CLASSES}
+        sys.meta_path.insert(0, self._import_hook)
+        for module_name in sorted(self.pending_modules):
+            if module_name in sys.modules:
+                self.instrument_module(sys.modules[module_name])
+        if cprofile:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        logging.info(f"Profiling enabled ({len(self._originals)} methods instrumented)")
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.remove_import_hook()
+        for cls, name, original in reversed(self._originals):
+            setattr(cls, name, original)
+        self._originals = []
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        self.enabled = False
+        logging.info("Profiling disabled")
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            self.events = []
+            self.start_time = time.perf_counter()
+
+    def instrument_module(self, module):
+        self.pending_modules.discard(module.__name__)
+        if not self.pending_modules:
+            self.remove_import_hook()
+        for module_name, class_name in INSTRUMENTED_CLASSES:
+            if module_name != module.__name__:
+                continue
+            cls = getattr(module, class_name, None)
+            if cls is None:
+                logging.warning(f"Profiler could not instrument {module_name}.{class_name}: no such class")
+                continue
+            self.instrument_class(cls)
+        if module.__name__ == 'def_metrics':
+            # def_metrics registers the graph nodes when it is imported
+            self.instrument_metric_graph()
+
+    def remove_import_hook(self):
+        self.pending_modules = set()
+        if self._import_hook in sys.meta_path:
+            sys.meta_path.remove(self._import_hook)
+
+    def instrument_class(self, cls):
+        for name, attr in list(vars(cls).items()):
+            if name.startswith('__'):
+                continue
+            if isinstance(attr, staticmethod):
+                wrapped = staticmethod(self.timed(f"{cls.__name__}.{name}")(attr.__func__))
+            elif callable(attr):
+                wrapped = self.timed(f"{cls.__name__}.{name}")(attr)
+            else:
+                continue
+            self._originals.append((cls, name, attr))
+            setattr(cls, name, wrapped)
+
+    def instrument_metric_graph(self):
+        # Registry nodes are called directly by the graph evaluator, not through the class
+        try:
+            from def_metric_registry import registry
+        except Exception as e:
+            logging.warning(f"Profiler could not instrument the metric graph: {str(e)}")
+            return
+        for name, node in registry.nodes.items():
+            self._originals.append((node, 'func', node.func))
+            node.func = self.timed(f"metric.{name}")(node.func)
+
+    def timed(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                self._open(name)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._close(name, start)
+            return wrapper
+        return decorator
+
+    def stage(self, name):
+        # Context manager for ingestion stages; a shared no-op when profiling is off
+        if not self.enabled:
+            return NULL_STAGE
+        return _Stage(self, name)
+
+    def _open(self, name):
+        if len(self.events) < MAX_EVENTS:
+            self.events.append(('O', name, time.perf_counter(), threading.get_ident()))
+
+    def _close(self, name, start):
+        end = time.perf_counter()
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = TimingStats()
+            stats.add(end - start)
+        if len(self.events) < MAX_EVENTS:
+            self.events.append(('C', name, end, threading.get_ident()))
+
+    def summary_rows(self):
+        with self._lock:
+            items = list(self.stats.items())
+        return sorted(items, key=lambda item: item[1].total, reverse=True)
+
+    def export_speedscope(self, file_path):
+        # https://www.speedscope.app/file-format-schema.json, one evented profile per thread
+        events = list(self.events)
+        frames, frame_index, profiles = [], {}, []
+        for thread_id in sorted({event[3] for event in events}):
+            thread_events = [event for event in events if event[3] == thread_id]
+            profile_events = []
+            for kind, name, timestamp, _ in thread_events:
+                if name not in frame_index:
+                    frame_index[name] = len(frames)
+                    frames.append({'name': name})
+                profile_events.append({'type': kind, 'frame': frame_index[name], 'at': (timestamp - self.start_time) * 1000})
+            profiles.append({
+                'type': 'evented',
+                'name': f"thread {thread_id}",
+                'unit': 'milliseconds',
+                'startValue': profile_events[0]['at'],
+                'endValue': profile_events[-1]['at'],
+                'events': profile_events,
+            })
+        trace = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': frames},
+            'profiles': profiles,
+            'name': 'finapp',
+            'exporter': 'finapp def_profiling',
+        }
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f)
+        logging.info(f"Speedscope trace written to {file_path}")
+
+    def export_cprofile(self, file_path):
+        if self.cprofile is None:
+            raise RuntimeError("cProfile was not enabled; call enable(cprofile=True) first")
+        self.cprofile.create_stats()
+        self.cprofile.dump_stats(file_path)
+        logging.info(f"cProfile stats written to {file_path}")
+
+class _Stage:
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._open(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._close(self.name, self.start)
+        return False
+
+class _InstrumentOnImport(importlib.abc.MetaPathFinder):
+    # Import hook that patches a pending module's classes right after the module has run
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def find_spec(self, name, path, target=None):
+        if name not in self.profiler.pending_modules:
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(name, path)
+        if spec is None or not hasattr(spec.loader, 'exec_module'):
+            return None
+        exec_module = spec.loader.exec_module
+        def instrumented_exec_module(module):
+            exec_module(module)
+            if self.profiler.enabled:
+                self.profiler.instrument_module(module)
+        spec.loader.exec_module = instrumented_exec_module
+        return spec
+
+profiler = Profiler()
+
+def enable_from_environment():
+    # FINAPP_PROFILE=1 (or =cprofile) profiles the whole run; called by the entry points
+    mode = os.environ.get('FINAPP_PROFILE')
+    if mode:
+        profiler.enable(cprofile=mode == 'cprofile')
@@ -0,0 +1,279 @@
+import os
+import sys
+import csv
+import json
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from def_dataframes import DataFrameOperations
+from def_metrics import TradingMetrics
+from def_sweep import sweep, rate_grid
+from def_result_cache import result_cache, result_key, view_params
+from def_sessions import SESSION_NAMES, OFF_HOURS
+from def_bitmap_index import canonical
+from def_profiling import enable_from_environment
+
+# Headless report runner. Nothing in here (or in what it imports) may pull in PyQt5,
+# so nightly batch jobs can run without a display server:
+#
+#   python -m finapp report m1.csv --market "Spot FX GBP/USD" --range 2008-05-01:2008-06-30 --format csv
+#
+# --risk-free and --confidence additionally write a parameter sweep table (see def_sweep):
+#
+#   python -m finapp report m1.csv --risk-free 0:0.06:0.0025 --confidence 0.9 --confidence 0.95 --confidence 0.99
+#
+# --sessions writes P&L, trade count and win rate per trading session of each trade's open
+# and close (see def_sessions), --leaderboard the core report of every market side by side
+# (see def_leaderboard).
+#
+# --session narrows the report to the trades closed in one trading session (repeatable, a
+# row each), --where to the trades matching a bitmap-index expression given as JSON (see
+# def_bitmap_index); dimensions are ANDed, the values listed for one dimension ORed:
+#
+#   python -m finapp report m1.csv --session London --session "New York"
+#   python -m finapp report m1.csv --where '{"direction": "long", "duration": ["<15m", "15m-1h"]}'
+#   python -m finapp report m1.csv --where '["or", {"outcome": "win"}, {"session": "London"}]'
+#
+# Reports are kept in the persistent result cache (def_result_cache), keyed by the ledger's
+# content hash; a ledger that has not changed since its last report is not even loaded.
+
+ALL_MARKETS = "All Markets"
+
+def parse_date_range(text):
+    start, _, end = text.partition(':')
+    start = pd.to_datetime(start).date() if start else None
+    end = pd.to_datetime(end).date() if end else None
+    return start, end
+
+def parse_grid(text):
+    # A single value, or START:STOP:STEP (inclusive)
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        return list(rate_grid(start, stop, step))
+    return [float(text)]
+
+def parse_expression(text):
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"--where takes a JSON filter expression: {str(e)}")
+
+def evaluate_report(metrics):
+    return metrics.report_values()
+
+def run_report(ledger_path, markets=None, date_ranges=None, trading_sessions=None, where=None):
+    fingerprint = result_cache.fingerprint(ledger_path)
+    trades = None
+    markets = markets or [ALL_MARKETS]
+    date_ranges = date_ranges or [(None, None)]
+    attributes = canonical(where) if where is not None else None
+
+    rows = []
+    for market in markets:
+        for session in trading_sessions or [None]:
+            for start, end in date_ranges:
+                key = result_key(fingerprint, 'batch_report', view_params(market, session, start, end, attributes=attributes))
+                results = result_cache.get(key)
+                if results is None:
+                    if trades is None:
+                        trades = DataFrameOperations.load_ledger(ledger_path)
+                    metrics = TradingMetrics(trades)
+                    metrics.ledger_fingerprint = fingerprint
+                    filtered = (market != ALL_MARKETS or start is not None or end is not None
+                                or session is not None or where is not None)
+                    if filtered and metrics.start_date is None:
+                        # The row is still written, with no metrics, so it is not silently missing
+                        logging.warning(f"No dated trades in {ledger_path}: no metrics for [{market}, {start} to {end}]")
+                        results = []
+                    else:
+                        if filtered:
+                            metrics.start_date = start or metrics.start_date
+                            metrics.end_date = end or metrics.end_date
+                            metrics.filter_by_market(market)
+                            metrics.filter_by_session(session)
+                            metrics.filter_by_attributes(where)
+
+                        results = evaluate_report(metrics)
+                        result_cache.put(key, results)
+                rows.append({
+                    'ledger': ledger_path,
+                    'market': market,
+                    'session': session,
+                    'where': attributes,
+                    'start': str(start) if start else None,
+                    'end': str(end) if end else None,
+                    'metrics': dict(results),
+                })
+                logging.info(f"Report generated for {ledger_path} [{market}, {session or 'all sessions'}, {start} to {end}]: {len(results)} metrics")
+    return rows
+
+def run_sweep(ledger_path, markets=None, date_ranges=None, risk_free_rates=None, confidences=None):
+    trades = DataFrameOperations.load_ledger(ledger_path)
+    date_ranges = date_ranges or [(None, None)]
+
+    tables = []
+    for start, end in date_ranges:
+        metrics = TradingMetrics(trades)
+        if metrics.start_date is None:
+            continue
+        if start is not None or end is not None:
+            metrics.start_date = start or metrics.start_date
+            metrics.end_date = end or metrics.end_date
+            metrics.filter_by_market(ALL_MARKETS)
+        table = sweep(metrics, risk_free_rates, confidences, markets or [ALL_MARKETS])
+        table.insert(0, 'end', str(end) if end else None)
+        table.insert(0, 'start', str(start) if start else None)
+        table.insert(0, 'ledger', ledger_path)
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+def run_sessions(ledger_path, markets=None, date_ranges=None):
+    trades = DataFrameOperations.load_ledger(ledger_path)
+    date_ranges = date_ranges or [(None, None)]
+
+    tables = []
+    for market in markets or [ALL_MARKETS]:
+        for start, end in date_ranges:
+            metrics = TradingMetrics(trades)
+            if metrics.start_date is None:
+                continue
+            metrics.start_date = start or metrics.start_date
+            metrics.end_date = end or metrics.end_date
+            metrics.filter_by_market(market)
+            for column, side in (('OpenDateUtc', 'open'), ('DateUtc', 'close')):
+                table = metrics.session_metrics(column).reset_index()
+                table.insert(0, 'side', side)
+                table.insert(0, 'end', str(end) if end else None)
+                table.insert(0, 'start', str(start) if start else None)
+                table.insert(0, 'market', market)
+                table.insert(0, 'ledger', ledger_path)
+                tables.append(table)
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+def run_leaderboard(ledger_path, date_ranges=None):
+    trades = DataFrameOperations.load_ledger(ledger_path)
+    fingerprint = result_cache.fingerprint(ledger_path)
+
+    tables = []
+    for start, end in date_ranges or [(None, None)]:
+        metrics = TradingMetrics(trades)
+        if metrics.start_date is None:
+            continue
+        metrics.ledger_fingerprint = fingerprint
+        metrics.start_date = start or metrics.start_date
+        metrics.end_date = end or metrics.end_date
+        table = metrics.market_leaderboard().reset_index()
+        table.insert(0, 'end', str(end) if end else None)
+        table.insert(0, 'start', str(start) if start else None)
+        table.insert(0, 'ledger', ledger_path)
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+def write_table(table, file_path, output_format):
+    if output_format == 'csv':
+        table.to_csv(file_path, index=False)
+    else:
+        table.to_json(file_path, orient='records', indent=2)
+
+def write_json(rows, file_path):
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=2)
+
+def write_csv(rows, file_path):
+    with open(file_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ledger', 'market', 'session', 'where', 'start', 'end', 'metric', 'value'])
+        for row in rows:
+            for metric, value in row['metrics'].items():
+                writer.writerow([row['ledger'], row['market'], row['session'], row['where'], row['start'], row['end'], metric, value])
+
+def report_ledger(ledger_path, markets, date_ranges, output_dir, output_format, risk_free_rates=None, confidences=None,
+                  sessions=False, leaderboard=False, trading_sessions=None, where=None):
+    rows = run_report(ledger_path, markets, date_ranges, trading_sessions, where)
+    stem = os.path.splitext(os.path.basename(ledger_path))[0]
+    file_path = os.path.join(output_dir, f"{stem}_report.{output_format}")
+    if output_format == 'csv':
+        write_csv(rows, file_path)
+    else:
+        write_json(rows, file_path)
+    logging.info(f"Report written to {file_path}")
+
+    if risk_free_rates or confidences:
+        table = run_sweep(ledger_path, markets, date_ranges, risk_free_rates, confidences)
+        sweep_path = os.path.join(output_dir, f"{stem}_sweep.{output_format}")
+        write_table(table, sweep_path, output_format)
+        logging.info(f"Sweep written to {sweep_path}")
+        file_path = f"{file_path}\n{sweep_path}"
+
+    if sessions:
+        table = run_sessions(ledger_path, markets, date_ranges)
+        sessions_path = os.path.join(output_dir, f"{stem}_sessions.{output_format}")
+        write_table(table, sessions_path, output_format)
+        logging.info(f"Session table written to {sessions_path}")
+        file_path = f"{file_path}\n{sessions_path}"
+
+    if leaderboard:
+        table = run_leaderboard(ledger_path, date_ranges)
+        leaderboard_path = os.path.join(output_dir, f"{stem}_leaderboard.{output_format}")
+        write_table(table, leaderboard_path, output_format)
+        logging.info(f"Leaderboard written to {leaderboard_path}")
+        file_path = f"{file_path}\n{leaderboard_path}"
+    return file_path
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="finapp report", description="Generate trading metric reports without the GUI.")
+    parser.add_argument('ledgers', nargs='+', help="Ledger CSV files to report on")
+    parser.add_argument('--market', action='append', dest='markets', help=f"Market to report on (repeatable, default '{ALL_MARKETS}')")
+    parser.add_argument('--range', action='append', dest='ranges', type=parse_date_range,
+                        help="Date range as START:END in YYYY-MM-DD, either side may be empty (repeatable)")
+    parser.add_argument('--risk-free', action='append', dest='risk_free_rates', type=parse_grid,
+                        help="Risk-free rate(s) to sweep, as a value or START:STOP:STEP (repeatable)")
+    parser.add_argument('--confidence', action='append', dest='confidences', type=parse_grid,
+                        help="VaR/ES confidence level(s) to sweep, as a value or START:STOP:STEP (repeatable)")
+    parser.add_argument('--session', action='append', dest='trading_sessions', choices=SESSION_NAMES + [OFF_HOURS],
+                        help="Only count trades closed in this trading session (repeatable, one report row each)")
+    parser.add_argument('--where', type=parse_expression,
+                        help="Only count trades matching a JSON filter expression over direction, size, duration, "
+                             "outcome, transaction, summary and session, e.g. '{\"direction\": \"long\"}'")
+    parser.add_argument('--sessions', action='store_true', help="Also write P&L and win rate per trading session")
+    parser.add_argument('--leaderboard', action='store_true', help="Also write the core report of every market side by side")
+    parser.add_argument('--format', choices=['json', 'csv'], default='json', dest='output_format')
+    parser.add_argument('--output', default='.', dest='output_dir', help="Directory the report files are written to")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="Number of ledgers processed in parallel")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    enable_from_environment()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = max(1, min(args.jobs, len(args.ledgers)))
+    risk_free_rates = [rate for rates in args.risk_free_rates for rate in rates] if args.risk_free_rates else None
+    confidences = [level for levels in args.confidences for level in levels] if args.confidences else None
+    task_args = (args.markets, args.ranges, args.output_dir, args.output_format, risk_free_rates, confidences, args.sessions, args.leaderboard,
+                 args.trading_sessions, args.where)
+    failed = 0
+
+    if jobs == 1:
+        for ledger_path in args.ledgers:
+            try:
+                print(report_ledger(ledger_path, *task_args))
+            except Exception as e:
+                logging.error(f"Error reporting on {ledger_path}: {str(e)}")
+                failed += 1
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {ledger_path: executor.submit(report_ledger, ledger_path, *task_args) for ledger_path in args.ledgers}
+            for ledger_path, future in futures.items():
+                try:
+                    print(future.result())
+                except Exception as e:
+                    logging.error(f"Error reporting on {ledger_path}: {str(e)}")
+                    failed += 1
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import logging
+import threading
+
+# Persistent result cache. Reports, drawdown episode tables and aggregates computed for a
+# ledger are pickled to disk under a key made of
+#
+#   - the ledger fingerprint: a content hash over fixed-size segments of the file,
+#   - the filter state and parameters (market, session, date range, risk-free rate, ...),
+#   - a hash of the metric modules' source, so a code change never serves stale numbers.
+#
+# Fingerprints are remembered per path with the file's size and mtime, so an unchanged
+# ledger is recognised from a single stat() and a restart can show cached results before
+# the ledger itself is read. Any write to the ledger changes size or mtime, the segments
+# are hashed again and every key built from the old fingerprint stops matching. Entries
+# are evicted least-recently-used (by file mtime, refreshed on every hit) once the
+# directory grows past max_bytes. A ledger kept as a segment store (def_ledger_store) is
+# fingerprinted from its manifest instead, without reading any segment.
+#
+# Nothing here imports Qt or pandas; the GUI reads the startup report with it before the
+# analytics stack is loaded.
+
+CACHE_DIR = os.environ.get('FINAPP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'finapp'))
+MAX_BYTES = 512 * 1024 * 1024
+SEGMENT_BYTES = 64 * 1024 * 1024
+FINGERPRINTS_FILE = 'fingerprints.json'
+ENTRY_SUFFIX = '.pickle'
+DEFAULT_RISK_FREE_RATE = 0.02  # the rate TradingMetrics starts with
+CODE_MODULES = ['def_metrics.py', 'def_metric_registry.py', 'def_quantiles.py', 'def_drawdowns.py',
+                'def_calendar.py', 'def_sessions.py', 'def_timezones.py', 'def_leaderboard.py', 'def_bitmap_index.py', 'def_ledger_view.py',
+                'def_schema.py', 'def_result_cache.py', 'def_ledger_store.py']
+
+def segment_hashes(file_path, segment_bytes=SEGMENT_BYTES):
+    hashes = []
+    with open(file_path, 'rb') as f:
+        while True:
+            segment = f.read(segment_bytes)
+            if not segment:
+                break
+            hashes.append(hashlib.blake2b(segment, digest_size=16).hexdigest())
+    return hashes
+
+def combine(parts):
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+code_version_value = None
+
+def code_version():
+    # Hash of the sources whose output is cached, computed once per process
+    global code_version_value
+    if code_version_value is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        parts = []
+        for name in CODE_MODULES:
+            try:
+                with open(os.path.join(directory, name), 'rb') as f:
+                    parts.append(hashlib.blake2b(f.read(), digest_size=16).hexdigest())
+            except OSError:
+                parts.append(name)
+        code_version_value = combine(parts)
+    return code_version_value
+
+def result_key(fingerprint, kind, params=None):
+    params = json.dumps(params or {}, sort_keys=True, default=str)
+    return combine([fingerprint, kind, params, code_version()])
+
+def view_params(market=None, session=None, start=None, end=None, risk_free_rate=DEFAULT_RISK_FREE_RATE, rows=None,
+                attributes=None):
+    # Filter state and parameters of a cached result; None means "not narrowed". rows is
+    # the filtered row count once a filter has been applied, which tells the initial
+    # DEAL-only view apart from a refiltered one over the same dates; attributes is the
+    # text of any bitmap-index filter.
+    return {'market': None if market == "All Markets" else market, 'session': session,
+            'start': start, 'end': end, 'risk_free_rate': risk_free_rate, 'rows': rows, 'attributes': attributes}
+
+class ResultCache:
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    # Ledger fingerprints
+
+    def read_fingerprints(self):
+        try:
+            with open(os.path.join(self.directory, FINGERPRINTS_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_fingerprints(self, fingerprints):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, FINGERPRINTS_FILE)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(fingerprints, f)
+        os.replace(temporary, path)
+
+    def known_fingerprint(self, file_path):
+        # Fingerprint from the stat index only (no reads); None if the file changed or is new
+        from def_ledger_store import store_fingerprint
+        fingerprint = store_fingerprint(file_path)
+        if fingerprint is not None:
+            return fingerprint
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        entry = self.read_fingerprints().get(os.path.abspath(file_path))
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['digest']
+        return None
+
+    def fingerprint(self, file_path):
+        # Content hash of the ledger; segments are only read when size or mtime changed
+        known = self.known_fingerprint(file_path)
+        if known is not None:
+            return known
+        stat = os.stat(file_path)
+        start = time.perf_counter()
+        hashes = segment_hashes(file_path)
+        digest = combine(hashes)
+        with self.lock:
+            fingerprints = self.read_fingerprints()
+            fingerprints[os.path.abspath(file_path)] = {
+                'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'segments': hashes, 'digest': digest}
+            try:
+                self.write_fingerprints(fingerprints)
+            except OSError as e:
+                logging.warning(f"Could not store ledger fingerprint: {str(e)}")
+        logging.info(f"Fingerprinted {file_path} ({len(hashes)} segments) in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return digest
+
+    # Entries
+
+    def get(self, key, default=None):
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        except Exception as e:
+            logging.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+            self.discard(key)
+            self.misses += 1
+            return default
+        try:
+            os.utime(path)  # most recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.entry_path(key)
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, path)
+        except Exception as e:
+            logging.warning(f"Could not write cache entry {key}: {str(e)}")
+            return
+        self.evict()
+
+    def discard(self, key):
+        try:
+            os.remove(self.entry_path(key))
+        except OSError:
+            pass
+
+    def entries(self):
+        # [(mtime, size, path)] oldest first
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        with self.lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def cached(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+result_cache = ResultCache()
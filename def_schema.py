@@ -0,0 +1,181 @@
+import logging
+import numpy as np
+import pandas as pd
+
+# Canonical in-memory schema of a ledger.
+#
+# The CSV keeps every field as text: repeated labels, numbers with '-' for "none" and a
+# sign on sizes, 'True'/'False' flags. In memory the low-cardinality labels are
+# categoricals (ProfitAndLoss too: its text repeats far more than the amounts vary),
+# levels and sizes are nullable floats, the cash flag a nullable boolean and
+# the dates datetime64, which takes a million-row ledger from hundreds of bytes per row to
+# a few dozen. Every loader reads through read_ledger() or passes its frame through
+# apply_schema() (idempotent, so frames that already conform cost nothing), and
+# ledger_text() turns a frame back into the ledger's own text conventions for writing.
+#
+# Money is fixed point: 'PL Cents' holds every P&L amount as int64 minor units, and sums,
+# cumulative balances and per-group totals are taken over it exactly and vectorized.
+# 'PL Amount' is the same amount in float dollars (cents / 100, identical to parsing a
+# two-decimal amount directly) for comparisons and ratios. 'PL Cents' is derived, so it
+# is never written back to the CSV.
+#
+#   trades = read_ledger('master.csv')
+#   memory_report(trades)              # bytes per column, per row and in total
+
+CATEGORY_COLUMNS = [
+    'TextDate', 'Summary', 'MarketName', 'Period', 'ProfitAndLoss', 'Transaction type', 'Currency', 'CurrencyIsoCode']
+NULLABLE_FLOAT_COLUMNS = ['Open level', 'Close level', 'Size']  # '-' means none; sizes carry a sign
+FLOAT_COLUMNS = ['PL Amount', 'Balance', 'Daily Return']  # plain float64, NaN for missing, as the metrics expect
+BOOLEAN_COLUMNS = ['Cash transaction']
+DATE_COLUMNS = ['DateUtc', 'OpenDateUtc']
+SIGNED_COLUMNS = ['Size']
+MISSING_TEXT = '-'
+CENTS_COLUMN = 'PL Cents'
+CENTS_PER_UNIT = 100
+DERIVED_COLUMNS = [CENTS_COLUMN]
+
+# read_csv dtypes: labels become categoricals while parsing, the rest is read as text and
+# parsed once per distinct value by apply_schema()
+CSV_DTYPES = {column: 'category' for column in CATEGORY_COLUMNS}
+CSV_DTYPES.update({column: str for column in NULLABLE_FLOAT_COLUMNS + BOOLEAN_COLUMNS})
+
+def distinct_values(values, parse):
+    # Applies parse() to each distinct value only; ledger text columns repeat heavily
+    codes, uniques = pd.factorize(values)
+    parsed = parse(pd.Series(uniques, dtype=object)).array
+    return pd.Series(parsed.take(codes, allow_fill=True), index=values.index)  # code -1 (missing) -> NA
+
+def parse_number_text(values):
+    text = values.astype(str).str.replace(',', '', regex=False).str.strip()
+    return pd.to_numeric(text.where(text != MISSING_TEXT), errors='coerce').astype('Float64')
+
+def parse_boolean_text(values):
+    text = values.astype(str).str.strip().str.lower()
+    return text.map({'true': True, 'false': False, '1': True, '0': False}).astype('boolean')
+
+def float_values(values):
+    # float64 ndarray of a ledger column, whatever its current dtype (NaN for missing)
+    if values.dtype == object or pd.api.types.is_string_dtype(values):
+        values = distinct_values(values, parse_number_text)
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+def to_category(values):
+    return values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+
+def to_nullable_float(values):
+    if values.dtype == 'Float64':
+        return values
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype('Float64')
+    return distinct_values(values, parse_number_text)
+
+def to_float(values):
+    if values.dtype == np.float64:
+        return values
+    return pd.Series(float_values(values), index=values.index)
+
+def to_boolean(values):
+    if values.dtype == 'boolean':
+        return values
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype('boolean')
+    return distinct_values(values, parse_boolean_text)
+
+def to_datetime(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values, errors='coerce')
+
+CONVERTERS = (
+    [(column, to_category) for column in CATEGORY_COLUMNS] +
+    [(column, to_nullable_float) for column in NULLABLE_FLOAT_COLUMNS] +
+    [(column, to_float) for column in FLOAT_COLUMNS] +
+    [(column, to_boolean) for column in BOOLEAN_COLUMNS] +
+    [(column, to_datetime) for column in DATE_COLUMNS]
+)
+
+def to_cents(amounts):
+    # float dollars -> int64 cents, missing amounts count as 0; exact for two-decimal amounts
+    # below 2**53 cents, since the nearest integer to amount * 100 is the written amount
+    return np.rint(np.nan_to_num(np.asarray(amounts, dtype=float)) * CENTS_PER_UNIT).astype(np.int64)
+
+def to_money(cents):
+    return cents / CENTS_PER_UNIT
+
+def cents_values(trades):
+    # int64 cents of every row, from 'PL Cents' when the frame has it
+    if CENTS_COLUMN in trades.columns:
+        return trades[CENTS_COLUMN].to_numpy(dtype=np.int64)
+    return to_cents(float_values(trades['PL Amount']))
+
+def running_balance(cents):
+    # Exact cumulative sum of a cents Series, in dollars
+    return to_money(cents.cumsum())
+
+def apply_schema(df):
+    # The same frame with every known column in its schema dtype; other columns untouched
+    converted = {}
+    for column, convert in CONVERTERS:
+        if column in df.columns:
+            values = df[column]
+            schema_values = convert(values)
+            if schema_values is not values:
+                converted[column] = schema_values
+    if 'PL Amount' in df.columns and CENTS_COLUMN not in df.columns:
+        amounts = converted.get('PL Amount', df['PL Amount'])
+        cents = to_cents(amounts.to_numpy())
+        converted[CENTS_COLUMN] = pd.Series(cents, index=df.index)
+        converted['PL Amount'] = pd.Series(np.where(amounts.isna(), np.nan, to_money(cents)), index=df.index)
+    return df.assign(**converted) if converted else df
+
+def read_ledger(file_path, columns=None):
+    # A ledger CSV (or just some of its columns) in the schema dtypes
+    usecols = None if columns is None else lambda column: column in columns
+    df = pd.read_csv(file_path, dtype=CSV_DTYPES, usecols=usecols)
+    return apply_schema(df)
+
+def format_numbers(values, signed=False):
+    # Nullable floats back to ledger text: '-' for none, levels as floats ('10100.0') and
+    # signed sizes without a trailing '.0' ('+5', '-0.25')
+    def text(value):
+        if pd.isna(value):
+            return MISSING_TEXT
+        number = repr(float(value))
+        if not signed:
+            return number
+        number = number[:-2] if number.endswith('.0') else number
+        return f"+{number}" if value > 0 else number
+    codes, uniques = pd.factorize(values)
+    labels = np.array([text(value) for value in uniques] + [MISSING_TEXT], dtype=object)
+    return pd.Series(labels[codes], index=values.index)
+
+def ledger_text(df):
+    # Frame ready for to_csv in the ledger's own conventions
+    df = df.drop(columns=[column for column in DERIVED_COLUMNS if column in df.columns])
+    converted = {}
+    for column in NULLABLE_FLOAT_COLUMNS:
+        if column in df.columns and df[column].dtype == 'Float64':
+            converted[column] = format_numbers(df[column], signed=column in SIGNED_COLUMNS)
+    return df.assign(**converted) if converted else df
+
+def write_ledger(df, file_path):
+    ledger_text(df).to_csv(file_path, index=False)
+
+def memory_report(df):
+    # Resident bytes per column (strings and categories counted deeply), largest first
+    usage = df.memory_usage(index=False, deep=True)
+    rows = max(len(df), 1)
+    report = pd.DataFrame({
+        'dtype': [str(df[column].dtype) for column in usage.index],
+        'bytes': usage.to_numpy(),
+        'bytes_per_row': usage.to_numpy() / rows,
+    }, index=usage.index).sort_values('bytes', ascending=False)
+    report.loc['Total'] = ['', int(usage.sum()), usage.sum() / rows]
+    return report
+
+def memory_summary(df):
+    total = int(df.memory_usage(index=True, deep=True).sum())
+    return f"{total / 1e6:.1f} MB for {len(df)} rows ({total / max(len(df), 1):.0f} bytes/row)"
+
+def log_memory(df, label):
+    logging.info(f"{label}: {memory_summary(df)}")
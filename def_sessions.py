@@ -0,0 +1,120 @@
+import functools
+import numpy as np
+import pandas as pd
+from def_timezones import WORLD_CLOCKS, to_local_seconds, utc_seconds, year_range
+from def_schema import cents_values, to_money
+
+# Trading-session tagging for the world-clock timezones.
+#
+# Each session is a local Mon-Fri window in one of the clock zones. All windows and all
+# UTC offsets are whole quarter hours, so whether a session is open only changes on a
+# 15-minute UTC grid: session_grid() builds a bitmask per grid slot once (DST included),
+# and tagging any number of timestamps is one integer divide and one table lookup.
+# Exchange holidays are not modelled.
+#
+#   masks = session_masks(trades['DateUtc'])     # uint8, bit i = SESSIONS[i] open
+#   session_labels(masks)                        # 'London + New York', 'Off hours', ...
+#   session_table(trades, 'OpenDateUtc')         # P&L / trades / win rate per session
+
+SESSIONS = [  # clock name (as in WORLD_CLOCKS), local open, local close in minutes after midnight
+    ('Japan', 9 * 60, 15 * 60),                # Tokyo Stock Exchange
+    ('Australia', 10 * 60, 16 * 60),           # ASX
+    ('Germany', 9 * 60, 17 * 60 + 30),         # Xetra
+    ('London', 8 * 60, 16 * 60 + 30),          # LSE
+    ('New York', 9 * 60 + 30, 16 * 60),        # NYSE / Nasdaq
+    ('San Francisco', 9 * 60, 17 * 60),        # US west-coast business hours
+]
+OFF_HOURS = 'Off hours'
+SESSION_NAMES = [name for name, _, _ in SESSIONS]
+SESSION_COLUMNS = ['pnl', 'trades', 'wins', 'win_rate', 'average_trade']
+SLOT = 15 * 60
+TIMEZONES = dict(WORLD_CLOCKS)
+
+@functools.lru_cache(maxsize=None)
+def session_grid(first_year, last_year):
+    # (first slot in UTC seconds, uint8 bitmask per 15-minute slot up to the end of last_year)
+    start = int(pd.Timestamp(year=first_year, month=1, day=1).value // 1_000_000_000)
+    end = int(pd.Timestamp(year=last_year + 1, month=1, day=1).value // 1_000_000_000)
+    slots = np.arange(start, end, SLOT, dtype=np.int64)
+    grid = np.zeros(len(slots), dtype=np.uint8)
+    for bit, (name, open_minute, close_minute) in enumerate(SESSIONS):
+        local = to_local_seconds(TIMEZONES[name], slots)
+        days = local // 86400
+        minute = (local - days * 86400) // 60
+        is_open = ((days + 3) % 7 < 5) & (minute >= open_minute) & (minute < close_minute)
+        grid |= is_open.astype(np.uint8) << bit
+    return start, grid
+
+def session_masks(times):
+    # Session bitmask of every timestamp (naive UTC); missing times get 0 (off hours)
+    seconds = utc_seconds(times)
+    valid = seconds != np.iinfo(np.int64).min
+    if not valid.any():
+        return np.zeros(len(seconds), dtype=np.uint8)
+    start, grid = session_grid(*year_range(seconds[valid] if not valid.all() else seconds))
+    slots = np.clip((seconds - start) // SLOT, 0, len(grid) - 1)
+    masks = grid[slots]
+    if not valid.all():
+        masks[~valid] = 0
+    return masks
+
+def mask_label(mask):
+    names = [name for bit, name in enumerate(SESSION_NAMES) if mask & (1 << bit)]
+    return ' + '.join(names) if names else OFF_HOURS
+
+def session_labels(masks):
+    # Categorical of session names, overlaps joined with ' + '
+    categories = [mask_label(mask) for mask in range(1 << len(SESSIONS))]
+    return pd.Categorical.from_codes(np.asarray(masks, dtype=np.int64), categories=categories)
+
+def session_bit(session):
+    # Bitmask selecting one session; 0 stands for off hours
+    if session == OFF_HOURS:
+        return 0
+    if session not in SESSION_NAMES:
+        raise ValueError(f"Unknown session: {session}")
+    return 1 << SESSION_NAMES.index(session)
+
+def in_session(masks, session):
+    bit = session_bit(session)
+    return masks == 0 if bit == 0 else (masks & bit) != 0
+
+def tag_sessions(trades):
+    # Session bitmasks for the open and the close of every trade
+    return pd.DataFrame({
+        'OpenSession': session_masks(trades['OpenDateUtc']),
+        'CloseSession': session_masks(trades['DateUtc']),
+    }, index=trades.index)
+
+def summarise(pnl, counts, wins):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {'pnl': pnl, 'trades': counts, 'wins': wins,
+                'win_rate': np.where(counts > 0, wins / np.maximum(counts, 1), np.nan),
+                'average_trade': np.where(counts > 0, pnl / np.maximum(counts, 1), np.nan)}
+
+def session_table(trades, column='DateUtc', masks=None, overlaps=False):
+    # P&L, trade count, wins, win rate and average trade per session of `column`. A trade in
+    # an overlap counts towards every open session; overlaps=True groups by the exact
+    # combination instead, so each trade is counted once.
+    if masks is None:
+        masks = session_masks(trades[column])
+    cents = cents_values(trades).astype(float)
+
+    # One pass over the trades: totals per session combination, then per session from those;
+    # P&L stays in cents until the totals are final
+    size = 1 << len(SESSIONS)
+    combination_cents = np.bincount(masks, weights=cents, minlength=size)
+    combination_trades = np.bincount(masks, minlength=size)
+    combination_wins = np.bincount(masks, weights=(cents > 0), minlength=size).astype(np.int64)
+
+    if overlaps:
+        occupied = np.flatnonzero(combination_trades)
+        table = pd.DataFrame(summarise(to_money(combination_cents[occupied]), combination_trades[occupied], combination_wins[occupied]),
+                             index=pd.Index([mask_label(mask) for mask in occupied], name='session'))
+        return table[SESSION_COLUMNS].sort_values('trades', ascending=False)
+
+    names = SESSION_NAMES + [OFF_HOURS]
+    membership = np.array([in_session(np.arange(size), name) for name in names])
+    table = pd.DataFrame(summarise(to_money(membership @ combination_cents), membership @ combination_trades, membership @ combination_wins),
+                         index=pd.Index(names, name='session'))
+    return table[SESSION_COLUMNS]
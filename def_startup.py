@@ -0,0 +1,46 @@
+import time
+import logging
+from PyQt5.QtCore import QThread, pyqtSignal
+
+class StartupTimer:
+
+    def __init__(self, start_time=None):
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+        self.last_time = self.start_time
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last_time))
+        self.last_time = now
+        logging.info(f"Startup phase '{phase}' took {(self.phases[-1][1]) * 1000:.0f} ms")
+
+    def total(self):
+        return self.last_time - self.start_time
+
+    def summary(self):
+        phases = " | ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in self.phases)
+        return f"Startup: {phases} (total {self.total() * 1000:.0f} ms)"
+
+class LedgerLoader(QThread):
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, csv_file_path, parent=None):
+        super().__init__(parent)
+        self.csv_file_path = csv_file_path
+
+    def run(self):
+        # pandas and scipy are imported here, off the GUI thread and after the window is shown
+        try:
+            from def_dataframes import DataFrameOperations
+            from def_metrics import TradingMetrics
+            from def_result_cache import result_cache
+            fingerprint = result_cache.fingerprint(self.csv_file_path)
+            trades = DataFrameOperations.load_ledger(self.csv_file_path)
+            metrics = TradingMetrics(trades)
+            metrics.ledger_fingerprint = fingerprint
+            self.loaded.emit(metrics)
+        except Exception as e:
+            logging.error(f"Error loading ledger in background: {str(e)}")
+            self.failed.emit(str(e))
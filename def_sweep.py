@@ -0,0 +1,109 @@
+import logging
+import numpy as np
+import pandas as pd
+from def_metrics import daily_returns
+from def_quantiles import quantile_cache
+from def_ledger_view import LedgerView
+
+# Parameter sweeps over the risk-free rate and the tail confidence level.
+#
+# Each market's returns are sorted once (def_quantiles) and every parameter is looked up
+# against that, so a 1000-point grid costs about one evaluation:
+#
+#   from def_sweep import sweep, rate_grid
+#   table = sweep(metrics, risk_free_rates=rate_grid(0, 0.06, 0.0025), confidences=[0.90, 0.95, 0.99],
+#                 markets=["All Markets", "Spot FX GBP/USD"])
+#
+# The result is a tidy DataFrame with one row per (market, parameter, metric). Sharpe,
+# Sortino and Omega only depend on the risk-free rate, VaR and ES only on the confidence
+# level, so the unused parameter is NaN in their rows.
+
+ALL_MARKETS = "All Markets"
+RATE_METRICS = ['sharpe_ratio', 'sortino_ratio', 'omega_ratio']
+CONFIDENCE_METRICS = ['value_at_risk', 'expected_shortfall']
+SWEEP_COLUMNS = ['market', 'risk_free_rate', 'confidence', 'metric', 'value']
+DAYS_PER_YEAR = 365  # matches TradingMetrics.cash_rate
+
+def rate_grid(start, stop, step):
+    # Inclusive of stop, without float drift in the last point
+    count = int(round((stop - start) / step)) + 1
+    return np.round(start + step * np.arange(count), 10)
+
+def safe_divide_array(numerator, denominator):
+    # Vectorised safe_divide: a zero or NaN denominator gives inf
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=float), np.asarray(denominator, dtype=float))
+    result = np.full(numerator.shape, float('inf'))
+    valid = (denominator != 0) & ~np.isnan(denominator)
+    np.divide(numerator, denominator, out=result, where=valid)
+    return result
+
+def sweep_returns(returns, risk_free_rates=(), confidences=()):
+    # Returns {metric name: array} for a single returns series, broadcast over the parameters
+    returns = np.asarray(returns, dtype=float)
+    cash_rates = np.asarray(risk_free_rates, dtype=float) / DAYS_PER_YEAR
+    confidences = np.asarray(confidences, dtype=float)
+    ordered = quantile_cache(returns)
+    results = {}
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_return = np.mean(returns) if len(returns) else np.nan
+        excess = mean_return - cash_rates
+        results['sharpe_ratio'] = safe_divide_array(excess, np.std(returns) if len(returns) else np.nan)
+        negative = returns[returns < 0]
+        results['sortino_ratio'] = safe_divide_array(excess, np.std(negative) if len(negative) else np.nan)
+
+        # Omega: gains above the threshold over losses at or below it
+        below = ordered.sum_at_or_below(cash_rates)
+        above = ordered.total() - below
+        results['omega_ratio'] = safe_divide_array(above, np.abs(below))
+
+        if len(returns) == 0:
+            results['value_at_risk'] = np.full(confidences.shape, np.nan)
+            results['expected_shortfall'] = np.full(confidences.shape, np.nan)
+        else:
+            var = ordered.percentile(100 * (1 - confidences))
+            results['value_at_risk'] = var
+            results['expected_shortfall'] = ordered.tail_mean(var)
+
+    return results
+
+def market_returns(metrics, market):
+    # The same returns TradingMetrics would use after filter_by_market(market)
+    if market is None or market == ALL_MARKETS:
+        if metrics.filtered_trades.empty:
+            return pd.Series(dtype=float)
+        return metrics.evaluate('returns')
+    trades = metrics.trades
+    if trades.empty:
+        return pd.Series(dtype=float)
+    in_market = LedgerView(trades, np.flatnonzero((trades['MarketName'] == market).to_numpy()))
+    return daily_returns(in_market, metrics.start_date, metrics.end_date)
+
+def sweep(metrics, risk_free_rates=None, confidences=None, markets=None):
+    if risk_free_rates is None:
+        risk_free_rates = [metrics.risk_free_rate]
+    if confidences is None:
+        confidences = [0.95]
+    risk_free_rates = np.asarray(risk_free_rates, dtype=float)
+    confidences = np.asarray(confidences, dtype=float)
+    markets = markets or [ALL_MARKETS]
+
+    frames = []
+    for market in markets:
+        try:
+            results = sweep_returns(market_returns(metrics, market), risk_free_rates, confidences)
+        except Exception as e:
+            logging.error(f"Error sweeping metrics for {market}: {str(e)}")
+            continue
+        for name in RATE_METRICS:
+            frames.append(pd.DataFrame({'market': market, 'risk_free_rate': risk_free_rates,
+                                        'confidence': np.nan, 'metric': name, 'value': results[name]}))
+        for name in CONFIDENCE_METRICS:
+            frames.append(pd.DataFrame({'market': market, 'risk_free_rate': np.nan,
+                                        'confidence': confidences, 'metric': name, 'value': results[name]}))
+
+    if not frames:
+        return pd.DataFrame(columns=SWEEP_COLUMNS)
+    table = pd.concat(frames, ignore_index=True)
+    logging.info(f"Swept {len(risk_free_rates)} risk-free rates x {len(confidences)} confidence levels over {len(markets)} markets")
+    return table[SWEEP_COLUMNS]
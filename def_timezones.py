@@ -0,0 +1,96 @@
+import functools
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+# DST-aware UTC offset tables for the world-clock timezones.
+#
+# Each table is a sorted array of UTC instants at which the zone's offset changes plus the
+# offset in effect from each instant on, so converting millions of timestamps is a single
+# searchsorted instead of a per-row tz conversion. Tables are built once per zone and year
+# range from zoneinfo (weekly samples, then a binary search to the exact second).
+#
+# numpy is imported inside the vectorised helpers only: the clocks use offset_span() at
+# startup, before the analytics stack is loaded.
+
+WORLD_CLOCKS = [
+    ('Japan', 'Asia/Tokyo'),
+    ('Australia', 'Australia/Sydney'),
+    ('Germany', 'Europe/Berlin'),
+    ('London', 'Europe/London'),
+    ('New York', 'America/New_York'),
+    ('San Francisco', 'America/Los_Angeles'),
+]
+
+SAMPLE_STEP = 7 * 86400  # DST transitions are always months apart
+SPAN_LIMIT = 400 * 86400  # offset_span() looks this far ahead for the next transition
+
+def utc_offset(zone, utc_seconds):
+    return int(datetime.fromtimestamp(utc_seconds, zone).utcoffset().total_seconds())
+
+def find_transitions(zone, start, end):
+    # [(utc seconds, new offset)] for every offset change in (start, end]
+    transitions = []
+    previous_time, previous_offset = start, utc_offset(zone, start)
+    for sample in range(start + SAMPLE_STEP, end + SAMPLE_STEP, SAMPLE_STEP):
+        sample = min(sample, end)
+        offset = utc_offset(zone, sample)
+        if offset != previous_offset:
+            low, high = previous_time, sample  # offset changes in (low, high]
+            while high - low > 1:
+                middle = (low + high) // 2
+                if utc_offset(zone, middle) == previous_offset:
+                    low = middle
+                else:
+                    high = middle
+            transitions.append((high, offset))
+            previous_offset = offset
+        previous_time = sample
+    return transitions
+
+def offset_span(tz_name, utc_seconds):
+    # (offset, valid_until): the offset at utc_seconds and the instant it next changes;
+    # callers keep the pair and only ask again once valid_until has passed
+    zone = ZoneInfo(tz_name)
+    transitions = find_transitions(zone, utc_seconds, utc_seconds + SPAN_LIMIT)
+    until = transitions[0][0] if transitions else utc_seconds + SPAN_LIMIT
+    return utc_offset(zone, utc_seconds), until
+
+@functools.lru_cache(maxsize=None)
+def offset_table(tz_name, first_year, last_year):
+    # (transitions, offsets): offsets[i] applies from transitions[i] (UTC seconds) on
+    import numpy as np
+    zone = ZoneInfo(tz_name)
+    start = int(datetime(first_year, 1, 1, tzinfo=timezone.utc).timestamp())
+    end = int(datetime(last_year + 1, 1, 1, tzinfo=timezone.utc).timestamp())
+    changes = [(start, utc_offset(zone, start))] + find_transitions(zone, start, end)
+    return (np.array([time for time, _ in changes], dtype=np.int64),
+            np.array([offset for _, offset in changes], dtype=np.int64))
+
+def year_range(utc_seconds):
+    # Years covered by an array of UTC seconds, padded by one on each side
+    if len(utc_seconds) == 0:
+        year = datetime.now(timezone.utc).year
+        return year - 1, year + 1
+    first = datetime.fromtimestamp(int(utc_seconds.min()), timezone.utc).year
+    last = datetime.fromtimestamp(int(utc_seconds.max()), timezone.utc).year
+    return first - 1, last + 1
+
+def utc_offsets(tz_name, utc_seconds):
+    # Vectorised UTC offsets (seconds) for an int64 array of UTC seconds
+    import numpy as np
+    utc_seconds = np.asarray(utc_seconds, dtype=np.int64)
+    if tz_name in (None, 'UTC'):
+        return np.zeros(len(utc_seconds), dtype=np.int64)
+    transitions, offsets = offset_table(tz_name, *year_range(utc_seconds))
+    return offsets[np.maximum(np.searchsorted(transitions, utc_seconds, side='right') - 1, 0)]
+
+def to_local_seconds(tz_name, utc_seconds):
+    import numpy as np
+    utc_seconds = np.asarray(utc_seconds, dtype=np.int64)
+    return utc_seconds + utc_offsets(tz_name, utc_seconds)
+
+def utc_seconds(times):
+    # Datetime-like values (naive UTC) to int64 seconds; NaT becomes the int64 minimum
+    import numpy as np
+    values = np.asarray(times, dtype='datetime64[ns]').astype(np.int64)
+    return np.where(values == np.iinfo(np.int64).min, values, values // 1_000_000_000)
@@ -0,0 +1,123 @@
+import os
+import time
+import logging
+import numpy as np
+import pandas as pd
+from def_schema import float_values, to_cents
+
+# Row-level validation of an import, before anything is merged into the master.
+#
+# Every rule is a boolean mask over the rows of the import, computed vectorized in one
+# pass: dates that do not parse, P&L and balances that are not numbers, transaction types
+# the ledger does not know. Rows that break any rule are quarantined to a side file with
+# the reasons, the rest are imported, so a handful of bad rows in a 1M-row export no
+# longer aborts the whole import. Balance continuity is reported but does not reject
+# rows: a break usually means a row is missing from the export, not that this one is wrong.
+#
+#   validation = LedgerValidation(new_data)
+#   rejected = validation.rejected_rows(new_data)   # raw text of the bad rows + 'Errors'
+#   new_data = validation.accepted_rows(new_data)   # good rows, dates already parsed
+#   validation.summary()                            # "Imported 999,995 of 1,000,000 rows; ..."
+
+REQUIRED_COLUMNS = ['DateUtc', 'OpenDateUtc', 'PL Amount', 'Transaction type']
+IMPORT_DATE_COLUMNS = ['DateUtc', 'OpenDateUtc']
+IMPORT_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'  # as DataFrameOperations.parse_import_dates
+KNOWN_TRANSACTION_TYPES = ['DEAL', 'DEPO', 'WITH']  # trades, deposits, withdrawals and funding
+ERROR_COLUMN = 'Errors'
+BALANCE_BREAK = 'Balance does not follow from the previous balance'
+
+def balance_breaks(dates, cents, balance_cents, has_balance):
+    # Rows whose Balance is not the previous Balance plus the P&L since: in date order (file
+    # order within a second), Balance - cumulative P&L is the same on every row that has one
+    order = np.argsort(dates, kind='stable')
+    offset = balance_cents[order] - np.cumsum(cents[order])
+    with_balance = order[has_balance[order]]
+    offsets = offset[has_balance[order]]
+    breaks = np.zeros(len(dates), dtype=bool)
+    breaks[with_balance[1:][np.diff(offsets) != 0]] = True
+    return breaks
+
+def quarantine_path(master_path, import_path):
+    # quarantine/<import name>_<time>.csv next to the master file
+    stem = os.path.splitext(os.path.basename(import_path))[0]
+    directory = os.path.join(os.path.dirname(os.path.abspath(master_path)), 'quarantine')
+    return os.path.join(directory, f"{stem}_{time.strftime('%Y%m%d-%H%M%S')}.csv")
+
+class LedgerValidation:
+
+    def __init__(self, raw):
+        missing = [column for column in REQUIRED_COLUMNS if column not in raw.columns]
+        if missing:
+            raise ValueError(f"Import file is missing columns: {', '.join(missing)}")
+        self.rows = len(raw)
+        self.parsed = {}
+        self.errors = {}  # rule -> mask of rows it rejects
+        self.warnings = {}  # rule -> mask of rows it reports; they are still imported
+
+        for column in IMPORT_DATE_COLUMNS:
+            dates = pd.to_datetime(raw[column], format=IMPORT_DATE_FORMAT, errors='coerce')
+            self.parsed[column] = dates
+            self.errors[f"{column} missing or not a date"] = dates.isna().to_numpy()
+
+        amounts = float_values(raw['PL Amount'])
+        self.errors["PL Amount missing or not a number"] = np.isnan(amounts)
+        if 'Balance' in raw.columns:
+            balances = float_values(raw['Balance'])
+            has_balance = ~np.isnan(balances)
+            self.errors["Balance not a number"] = raw['Balance'].notna().to_numpy() & ~has_balance
+        self.errors["Unknown transaction type"] = ~raw['Transaction type'].isin(KNOWN_TRANSACTION_TYPES).to_numpy()
+
+        self.rejected = np.logical_or.reduce(list(self.errors.values())) if self.rows else np.zeros(0, dtype=bool)
+        if 'Balance' in raw.columns and self.rows:
+            accepted = ~self.rejected
+            dates = self.parsed['DateUtc'].to_numpy(dtype='datetime64[ns]')[accepted]
+            breaks = np.zeros(self.rows, dtype=bool)
+            breaks[accepted] = balance_breaks(dates, to_cents(amounts[accepted]), to_cents(balances[accepted]),
+                                              has_balance[accepted])
+            self.warnings[BALANCE_BREAK] = breaks
+        logging.info(f"Import validation: {self.rejected_count()} of {self.rows} rows rejected")
+
+    def rejected_count(self):
+        return int(self.rejected.sum())
+
+    def accepted_count(self):
+        return self.rows - self.rejected_count()
+
+    def counts(self, rules):
+        return {rule: int(mask.sum()) for rule, mask in rules.items() if mask.any()}
+
+    def accepted_rows(self, raw):
+        # The rows that passed, with the dates as parsed here
+        frame = raw.assign(**self.parsed)
+        return frame if not self.rejected.any() else frame[~self.rejected]
+
+    def rejected_rows(self, raw):
+        # The rows that failed, as read, with the rules each one breaks
+        positions = np.flatnonzero(self.rejected)
+        reasons = [[] for _ in positions]
+        for rule, mask in self.errors.items():
+            for row in np.flatnonzero(mask[positions]):
+                reasons[row].append(rule)
+        return raw.iloc[positions].assign(**{ERROR_COLUMN: ['; '.join(rule) for rule in reasons]})
+
+    def write_quarantine(self, raw, file_path):
+        rejected = self.rejected_rows(raw)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        rejected.to_csv(file_path, index=False)
+        logging.info(f"Quarantined {len(rejected)} rows to {file_path}")
+        return file_path
+
+    def summary(self, duplicates=0):
+        # One line: rows imported, rows quarantined per rule, rows the ledger already had
+        # (`duplicates` of the accepted ones), warnings per rule
+        parts = [f"Imported {self.accepted_count() - duplicates:,} of {self.rows:,} rows"]
+        errors = self.counts(self.errors)
+        if errors:
+            rules = ', '.join(f"{rule}: {count:,}" for rule, count in errors.items())
+            parts.append(f"{self.rejected_count():,} quarantined ({rules})")
+        if duplicates:
+            parts.append(f"{duplicates:,} already in the ledger")
+        warnings = self.counts(self.warnings)
+        if warnings:
+            parts.append(', '.join(f"{rule}: {count:,} rows" for rule, count in warnings.items()))
+        return '; '.join(parts)
@@ -4,7 +4,8 @@ from PyQt5.QtWidgets import (QWidget, QLabel, QFrame, QVBoxLayout, QDateEdit, QH
 class WidgetOperations:
 
     def create_metric_widget(self, title, value):
-        widget = QFrame(self)
+        from def_metrics_widgets import MetricsWidgetOperations
+        widget = QFrame()
         widget.setFrameStyle(QFrame.Box | QFrame.Raised)
         widget.setLineWidth(2)
         
@@ -18,7 +19,7 @@ class WidgetOperations:
         value_label.setAlignment(Qt.AlignCenter)
         value_label.setStyleSheet("font-size: 18px; color: #ffffff;")
         
-        explanation = self.get_metric_explanation(title)
+        explanation = MetricsWidgetOperations.get_metric_explanation(self, title)
         explanation_label = QLabel(explanation)
         explanation_label.setWordWrap(True)
         explanation_label.setAlignment(Qt.AlignJustify)
@@ -27,7 +28,10 @@ class WidgetOperations:
         layout.addWidget(title_label)
         layout.addWidget(value_label)
         layout.addWidget(explanation_label)
-        
+
+        # Kept so the value can be filled in after the card is created
+        widget.value_label = value_label
+
         return widget
     
     @classmethod
@@ -1,14 +1,32 @@
+import sys
+import time
+import logging
+
+STARTUP_TIME = time.perf_counter()
+
+if __name__ == "__main__" and sys.argv[1:2] == ["report"]:
+    # Headless batch reports (python -m finapp report ...) must not import Qt
+    from def_report import main
+    sys.exit(main(sys.argv[2:]))
+
+# Only what is needed to paint the main window is imported here; pandas, scipy and the
+# metric modules are imported by the background ledger loader after the first paint.
 from PyQt5 import QtCore, QtGui, QtWidgets
-from def_clock import ClockWidget
-from def_dataframes import DataFrameOperations
-from def_dropDownBox import DropDownBoxOperations
+from def_charts import ChartOperations
+from def_clock import WorldClockOperations
+from def_diagnostics import DiagnosticsWidget
 from def_file import FileOperations
+from def_inbox import InboxOperations
+from def_leaderboard_tab import LeaderboardTabOperations
 from def_menu import MenuOperations
-from def_metrics import TradingMetrics
-from def_ratings import RatingOperations
-from def_widgets import WidgetOperations
+from def_metrics_widgets import MetricsWidgetOperations
+from def_profiling import enable_from_environment
+from def_startup import StartupTimer, LedgerLoader
 from def_windows import WindowOperations
 
+startup_timer = StartupTimer(STARTUP_TIME)
+startup_timer.mark("imports")
+
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         MainWindow.setObjectName("MainWindow")
@@ -17,14 +35,14 @@ class Ui_MainWindow(object):
         # Initialize csv_file_path here
         self.csv_file_path = "m1.csv"  # Set this to your desired CSV file path
 
-        # Craete Empty CSV file
+        # Craete Empty CSV file (only if there is no master file yet)
         FileOperations.create_empty_csv(self.csv_file_path)
 
         # Create an instance of WindowOperations
         self.window_operations = WindowOperations(MainWindow)  # Pass the main window as the parent
 
         # Now pass the overviewTab to FileOperations
-        self.file_operations = FileOperations(self.window_operations, self.csv_file_path)
+        self.file_operations = FileOperations(self.window_operations, self.csv_file_path, self)
         MainWindow.setStyleSheet("""
 QMainWindow {
     background-color: #001f3f;
@@ -210,6 +228,14 @@ QMenu::item:selected {
         self.chart2Tab.setObjectName("chart2Tab")
         self.tabWidget.addTab(self.chart2Tab, "")
 
+        self.diagnosticsTab = DiagnosticsWidget()
+        self.diagnosticsTab.setObjectName("diagnosticsTab")
+        self.tabWidget.addTab(self.diagnosticsTab, "")
+
+        ChartOperations.create_chart_tabs(self)
+        MetricsWidgetOperations.create_metrics_view(self)
+        LeaderboardTabOperations.create_leaderboard_tab(self)
+
         self.gridLayout.addWidget(self.tabWidget, 5, 0, 1, 6)
         self.marketLabel = QtWidgets.QLabel(self.centralwidget)
         self.marketLabel.setAlignment(QtCore.Qt.AlignCenter)
@@ -247,9 +273,10 @@ QMenu::item:selected {
 
         self.menuFile.addAction("Update File", self.file_operations.updateFile,"F1")
         self.menuFile.addAction("Delete File", self.file_operations.deleteFile, "F2")
+        self.menuFile.addAction("Import History", lambda: FileOperations.showImportHistory(self), "F3")
         self.menuFile.addSeparator()
         self.menuFile.addAction(self.actionPreferences)
-        self.menuFile.addAction(MenuOperations.show_version(self))
+        self.menuFile.addAction("Version", lambda: MenuOperations.show_version(self))
         self.menubar.addAction(self.menuFile.menuAction())
 
         self.retranslateUi(MainWindow)
@@ -272,6 +299,7 @@ QMenu::item:selected {
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.metricsView1), _translate("MainWindow", "Metrics"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.chart1View), _translate("MainWindow", "Chart1"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.chart2Tab), _translate("MainWindow", "Chart2"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.diagnosticsTab), _translate("MainWindow", "Diagnostics"))
         self.marketLabel.setText(_translate("MainWindow", "Market"))
         self.menuFile.setTitle(_translate("MainWindow", "File"))
         self.actionUpdate.setText(_translate("MainWindow", "Update"))
@@ -279,11 +307,54 @@ QMenu::item:selected {
         self.actionVersion.setText(_translate("MainWindow", "Version"))
         self.actionPreferences.setText(_translate("MainWindow", "Preferences"))
 
+    def on_first_paint(self):
+        startup_timer.mark("first paint")
+        self.statusbar.showMessage(startup_timer.summary())
+
+        WorldClockOperations.start_world_clocks(self)
+        if MetricsWidgetOperations.show_cached_report(self):
+            startup_timer.mark("cached report")
+
+        # Load the ledger in the background so it never delays the window
+        self.ledger_loader = LedgerLoader(self.csv_file_path, self.centralwidget)
+        self.ledger_loader.loaded.connect(self.on_ledger_loaded)
+        self.ledger_loader.failed.connect(lambda error: self.window_operations.updateOverviewTab(f"<font color='#ff0000'>Error loading master file: {error}</font>"))
+        self.ledger_loader.start()
+
+    def on_ledger_loaded(self, metrics):
+        startup_timer.mark("ledger loaded")
+        self.show_ledger(metrics)
+
+        self.statusbar.showMessage(startup_timer.summary())
+        logging.info(startup_timer.summary())
+
+        # Exports dropped into the inbox are imported from now on
+        InboxOperations.start_inbox(self)
+
+    def show_ledger(self, metrics):
+        self.metrics = metrics
+        self.file_operations.metrics = metrics
+
+        if metrics.start_date is not None:
+            self.dateEdit.setDate(metrics.start_date)
+            self.dateEdit_2.setDate(metrics.end_date)
+
+        self.marketComboBox.clear()
+        self.marketComboBox.addItem("All Markets")
+        if 'MarketName' in metrics.trades.columns:
+            self.marketComboBox.addItems(sorted(metrics.trades['MarketName'].dropna().unique()))
+
+        MetricsWidgetOperations.refresh_metrics_and_ui(self)  # cards and charts
+        LeaderboardTabOperations.refresh_leaderboard(self)
+
 if __name__ == "__main__":
-    import sys
+    enable_from_environment()
     app = QtWidgets.QApplication(sys.argv)
+    startup_timer.mark("QApplication")
     MainWindow = QtWidgets.QMainWindow()
     ui = Ui_MainWindow()
     ui.setupUi(MainWindow)
+    startup_timer.mark("setupUi")
     MainWindow.show()
+    QtCore.QTimer.singleShot(0, ui.on_first_paint)
     sys.exit(app.exec_())
@@ -0,0 +1,64 @@
+import os
+import sys
+import pytest
+
+# The application modules live flat in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(autouse=True)
+def result_cache_directory(tmp_path, monkeypatch):
+    # Every test gets an empty persistent result cache instead of ~/.cache/finapp
+    from def_result_cache import result_cache
+    monkeypatch.setattr(result_cache, 'directory', str(tmp_path / 'cache'))
+
+@pytest.fixture(scope='session')
+def synthetic_ledger(tmp_path_factory):
+    # A small synthetic ledger (see def_benchmark): 2,000 rows over five markets
+    from def_benchmark import generate_ledger
+    return generate_ledger(str(tmp_path_factory.mktemp('ledger') / 'synthetic.csv'), 2000, market_count=5, seed=1)
+
+@pytest.fixture
+def ledger_path(synthetic_ledger, tmp_path):
+    # A private copy, so tests that import into or rewrite the ledger do not see each other
+    import shutil
+    path = str(tmp_path / 'ledger.csv')
+    shutil.copy(synthetic_ledger, path)
+    return path
+
+@pytest.fixture(scope='session')
+def baseline_deals(synthetic_ledger):
+    # DEAL rows as the original loader and TradingMetrics prepared them: float P&L parsed
+    # from the export text, and a Balance that is its running sum over every ledger row
+    import pandas as pd
+    trades = pd.read_csv(synthetic_ledger)
+    trades['DateUtc'] = pd.to_datetime(trades['DateUtc'])
+    trades['PL Amount'] = pd.to_numeric(trades['PL Amount'].str.replace(',', ''))
+    trades['Balance'] = trades['PL Amount'].cumsum()
+    return trades[trades['Transaction type'] == 'DEAL']
+
+@pytest.fixture(scope='session')
+def baseline_returns(baseline_deals):
+    # Daily DEAL P&L as a fraction of the first balance, as the original calculate_returns()
+    return baseline_deals.groupby(baseline_deals['DateUtc'].dt.date)['PL Amount'].sum() / baseline_deals['Balance'].iloc[0]
+
+@pytest.fixture
+def import_files(synthetic_ledger, tmp_path):
+    # The synthetic ledger cut into six overlapping exports, as repeated IG downloads are
+    import pandas as pd
+    raw = pd.read_csv(synthetic_ledger, dtype=str, keep_default_na=False)
+    paths = []
+    for i in range(6):
+        path = str(tmp_path / f'export{i}.csv')
+        raw.iloc[i * 300:i * 300 + 450].to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+@pytest.fixture
+def master_path(tmp_path):
+    # An empty master ledger, as File > New creates it
+    from def_benchmark import LEDGER_HEADERS
+    path = str(tmp_path / 'master.csv')
+    with open(path, 'w', newline='') as f:
+        f.write(",".join(LEDGER_HEADERS) + "\n")
+    return path
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+from def_drawdowns import DrawdownAnalysis
+from def_metrics import TradingMetrics
+
+def naive_episodes(values):
+    # Walks the curve point by point: (start, trough, end) of every underwater run,
+    # end is -1 while the curve has not recovered to its peak
+    episodes, peak, start, trough = [], -np.inf, None, None
+    for i, value in enumerate(values):
+        if value >= peak:
+            if start is not None:
+                episodes.append((start, trough, i))
+                start = None
+            peak, peak_at = value, i
+        elif start is None:
+            start, trough = peak_at, i
+        elif value < values[trough]:
+            trough = i
+    if start is not None:
+        episodes.append((start, trough, -1))
+    return episodes
+
+@pytest.fixture(scope='module')
+def curve():
+    rng = np.random.default_rng(5)
+    return 1000 + np.cumsum(np.round(rng.normal(0.5, 10, size=3000), 2))
+
+def test_underwater_series_matches_cummax(curve):
+    analysis = DrawdownAnalysis(pd.Series(curve))
+    peak = pd.Series(curve).cummax()
+    assert analysis.fraction_series().values == pytest.approx((1 - curve / peak).values)
+    assert analysis.amount_series().values == pytest.approx((peak - curve).values)
+    assert analysis.max_depth() == pytest.approx((1 - curve / peak).max())
+    assert analysis.max_amount() == pytest.approx((peak - curve).max())
+
+def test_episodes_match_a_naive_walk(curve):
+    analysis = DrawdownAnalysis(curve)
+    expected = naive_episodes(curve)
+    starts, troughs, ends = analysis.episode_positions()
+    assert list(zip(starts, troughs, ends)) == expected
+
+    episodes = analysis.episodes()
+    assert len(episodes) == len(expected)
+    assert list(episodes['length']) == [(end if end >= 0 else len(curve) - 1) - start for start, _, end in expected]
+    assert list(episodes['recovered']) == [end >= 0 for _, _, end in expected]
+    assert episodes['depth'].max() == pytest.approx(analysis.max_depth())
+    assert list(analysis.top(3)['depth']) == sorted(episodes['depth'], reverse=True)[:3]
+
+def test_edge_curves():
+    # Flat and rising curves have no episodes, a curve that ends underwater has an open one
+    for values in ([], [5.0], [5.0, 5.0, 6.0]):
+        analysis = DrawdownAnalysis(values)
+        assert analysis.episodes().empty
+        assert analysis.duration_stats()['count'] == 0
+    open_episode = DrawdownAnalysis([5.0, 4.0, 3.0, 4.5]).episodes()
+    assert list(open_episode[['start', 'trough']].iloc[0]) == [0, 2]
+    assert not open_episode['recovered'].iloc[0] and pd.isna(open_episode['recovery'].iloc[0])
+    # Ties at the trough report the first minimum, a return to the exact peak recovers
+    assert naive_episodes([3.0, 1.0, 2.0, 1.0, 3.0]) == [(0, 1, 4)]
+    assert list(zip(*DrawdownAnalysis([3.0, 1.0, 2.0, 1.0, 3.0]).episode_positions())) == [(0, 1, 4)]
+
+def test_metrics_match_the_baseline_formulas(ledger_path, baseline_deals, baseline_returns):
+    metrics = TradingMetrics(ledger_path)
+    balance = baseline_deals['Balance']
+    drawdowns = 1 - balance / balance.cummax()
+    compounded = (1 + baseline_returns).cumprod()
+
+    assert metrics.max_drawdown() == pytest.approx(max(min((compounded / compounded.expanding(min_periods=1).max() - 1).min(), 0), -1))
+    assert metrics.max_drawdown_dollars() == pytest.approx((balance.cummax() - balance).max())
+    assert metrics.pain_index() == pytest.approx(np.mean(drawdowns))
+    assert metrics.ulcer_index() == pytest.approx(np.sqrt(np.mean(drawdowns ** 2)))
+    assert metrics.burke_ratio() == pytest.approx(metrics.return_rate() / np.sqrt(np.sum(drawdowns ** 2)))
+    assert metrics.sterling_ratio() == pytest.approx(metrics.return_rate() / np.mean(drawdowns))
+
+def test_episode_table_and_duration_stats(ledger_path, baseline_deals):
+    metrics = TradingMetrics(ledger_path)
+    balance = baseline_deals['Balance'].values
+    times = baseline_deals['DateUtc'].values
+    expected = naive_episodes(balance)
+
+    episodes = metrics.drawdown_episodes()
+    assert list(episodes['start']) == [times[start] for start, _, _ in expected]
+    assert list(episodes['trough']) == [times[trough] for _, trough, _ in expected]
+    lengths = pd.Series([times[end if end >= 0 else -1] - times[start] for start, _, end in expected])
+    stats = metrics.drawdown_duration_stats()
+    assert stats['count'] == len(expected)
+    assert stats['recovered'] == sum(end >= 0 for _, _, end in expected)
+    assert stats['max'] == lengths.max() and stats['median'] == lengths.median()
+
+    top = metrics.drawdown_episodes(top=3)
+    assert list(top['depth']) == sorted(episodes['depth'], reverse=True)[:3]
+    assert top['depth'].iloc[0] == pytest.approx((1 - balance / np.maximum.accumulate(balance)).max())
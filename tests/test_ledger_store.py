@@ -0,0 +1,132 @@
+import os
+import json
+import pandas as pd
+import pytest
+import def_ledger_store
+from def_adapters import LEDGER_COLUMNS
+from def_dataframes import DataFrameOperations
+from def_ingest import read_import, known_rows, commit_import
+from def_ledger_store import ledger_store, store_exists
+
+def import_file(file_path, master_path):
+    # FileOperations.updateFile without the dialog: returns the combined ledger
+    new_data, _, _ = read_import(file_path, master_path)
+    master_data = DataFrameOperations.read_master(master_path)
+    new_data = new_data[~known_rows(master_data, new_data, master_path)]
+    combined = commit_import(master_data, new_data, master_path, os.path.basename(file_path))
+    store = ledger_store(master_path)
+    if store.compactor is not None:
+        store.compactor.join()
+    return combined
+
+def same_rows(left, right):
+    # The exported columns, row for row; categoricals built from different segments may
+    # list their categories differently, and the derived columns are rebuilt on load
+    def as_text(frame):
+        frame = frame[LEDGER_COLUMNS].reset_index(drop=True)
+        return frame.astype({column: object for column in frame.columns
+                             if isinstance(frame[column].dtype, pd.CategoricalDtype) or frame[column].dtype == 'str'})
+    return as_text(left).equals(as_text(right))
+
+@pytest.fixture(autouse=True)
+def no_background_compaction(monkeypatch):
+    # Every segment stays tier 0 and compaction only runs when a test calls it
+    monkeypatch.setattr(def_ledger_store, 'COMPACTION_MIN_ROWS', 10 ** 9)
+    monkeypatch.setattr(def_ledger_store, 'COMPACTION_FANIN', 100)
+
+def test_first_import_migrates_the_csv_master(master_path, import_files):
+    assert not store_exists(master_path)
+    combined = import_file(import_files[0], master_path)
+    store = ledger_store(master_path)
+    assert store_exists(master_path) and not os.path.exists(master_path)
+    assert same_rows(store.read(), combined)
+    assert same_rows(DataFrameOperations.read_master(master_path), combined)
+
+def test_each_import_is_one_sorted_segment(master_path, import_files, synthetic_ledger):
+    for path in import_files:
+        combined = import_file(path, master_path)
+    store = ledger_store(master_path)
+    segments = store.segments()
+    assert len(segments) == len(import_files)
+    for segment in segments:
+        dates = pd.read_csv(store.segment_path(segment['name']))['DateUtc']
+        assert dates.is_monotonic_increasing and segment['rows'] == len(dates)
+
+    # Overlapping exports only add their new rows, and the read is the whole ledger in date order
+    expected = DataFrameOperations.load_ledger(synthetic_ledger).iloc[:len(import_files) * 300 + 150]
+    assert sum(segment['rows'] for segment in segments) == len(expected)
+    assert same_rows(store.read(), combined)
+    assert store.read()['Reference'].tolist() == expected.sort_values('DateUtc', kind='stable')['Reference'].tolist()
+    partial = store.read(columns=['DateUtc', 'PL Amount'])
+    assert {'DateUtc', 'PL Amount'} <= set(partial.columns) and 'MarketName' not in partial.columns
+    assert partial['PL Amount'].tolist() == store.read()['PL Amount'].tolist()
+
+def test_known_rows_come_from_the_stored_keys(master_path, import_files):
+    import_file(import_files[0], master_path)
+    new_data, _, _ = read_import(import_files[1], master_path)
+    master_data = DataFrameOperations.read_master(master_path)
+    known = known_rows(master_data, new_data, master_path)
+    assert known.sum() == 150 and not known[150:].any()
+    assert list(known) == list(new_data['Reference'].isin(master_data['Reference']))
+
+def test_compaction_keeps_rows_order_and_fingerprint(master_path, import_files, monkeypatch):
+    for path in import_files:
+        combined = import_file(path, master_path)
+    store = ledger_store(master_path)
+    before, fingerprint = store.read(), store.fingerprint()
+    texts = {segment['name']: open(store.segment_path(segment['name'])).read().splitlines()[1:]
+             for segment in store.segments()}
+
+    monkeypatch.setattr(def_ledger_store, 'COMPACTION_FANIN', 2)
+    while store.compact():
+        pass
+    segments = store.segments()
+    assert len(segments) <= 2 and sum(segment['rows'] for segment in segments) == len(combined)
+    assert same_rows(store.read(), before) and store.fingerprint() == fingerprint
+
+    # The merged segments hold the original lines, not re-formatted values
+    merged_lines = set()
+    for segment in segments:
+        merged_lines.update(open(store.segment_path(segment['name'])).read().splitlines()[1:])
+    assert merged_lines == set().union(*texts.values())
+
+def test_garbage_collection_removes_replaced_segments(master_path, import_files, monkeypatch):
+    for path in import_files:
+        import_file(path, master_path)
+    store = ledger_store(master_path)
+    monkeypatch.setattr(def_ledger_store, 'COMPACTION_FANIN', 2)
+    while store.compact():
+        pass
+    store.collect_garbage()
+    assert len(os.listdir(store.segment_directory)) > len(store.segments())  # readers get GARBAGE_SECONDS
+
+    monkeypatch.setattr(def_ledger_store, 'GARBAGE_SECONDS', -1)
+    store.collect_garbage()
+    names = {segment['name'] for segment in store.segments()}
+    files = {name for name in os.listdir(store.segment_directory) if name.endswith('.csv')}
+    assert files == names and store.manifest()['obsolete'] == []
+    assert len(store.read()) == sum(segment['rows'] for segment in store.segments())
+
+def test_unversioned_manifests_are_upgraded(master_path, import_files):
+    for path in import_files[:3]:
+        combined = import_file(path, master_path)
+    store = ledger_store(master_path)
+
+    # Rewrite the store the way the first segmented version left it: no versions or
+    # parts, and each segment's keys next to it
+    manifest = store.manifest()
+    for segment in manifest['segments']:
+        part_id = segment['parts'][0]
+        os.replace(store.keys_path(part_id), store.segment_path(segment['name'][:-len('.csv')] + '.keys.npy'))
+        segment['parts'] = [segment['digest']]
+    legacy = {key: manifest[key] for key in ['next_id', 'segments', 'obsolete']}
+    with open(store.manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(legacy, f)
+    store.key_arrays.clear()
+
+    history = store.history()
+    assert [record['version'] for record in history] == [1] and history[0]['rows'] == len(combined)
+    assert same_rows(store.read(), combined)
+    assert all(os.path.exists(store.keys_path(part['id'])) for part in store.manifest()['parts'])
+    new_data, _, _ = read_import(import_files[2], master_path)
+    assert known_rows(store.read(), new_data, master_path).all()
@@ -0,0 +1,136 @@
+import pytest
+import def_ledger_store
+from def_dataframes import DataFrameOperations
+from def_ingest import read_import, known_rows
+from def_ledger_store import ledger_store
+from def_result_cache import result_cache
+from test_ledger_store import import_file, same_rows
+
+@pytest.fixture(autouse=True)
+def no_background_compaction(monkeypatch):
+    monkeypatch.setattr(def_ledger_store, 'COMPACTION_MIN_ROWS', 10 ** 9)
+    monkeypatch.setattr(def_ledger_store, 'COMPACTION_FANIN', 100)
+
+@pytest.fixture
+def versions(master_path, import_files):
+    # {version: (ledger, fingerprint)} after each of the six imports; version 1 is the migrated empty master
+    store = ledger_store(master_path)
+    kept = {}
+    for path in import_files:
+        combined = import_file(path, master_path)
+        kept[store.manifest()['version']] = (combined, store.fingerprint())
+    return kept
+
+def new_rows(file_path, master_path):
+    new_data, _, _ = read_import(file_path, master_path)
+    return int((~known_rows(DataFrameOperations.read_master(master_path), new_data, master_path)).sum())
+
+def test_every_version_reads_back(master_path, versions):
+    store = ledger_store(master_path)
+    assert sorted(versions) == list(range(2, 8))
+    for version, (ledger, fingerprint) in versions.items():
+        assert same_rows(store.read(version=version), ledger)
+        assert store.fingerprint(version) == fingerprint
+    assert len(store.read(version=1)) == 0
+
+    history = store.history()
+    assert [record['action'] for record in history] == ['create'] + ['import'] * 6
+    assert [record['rows'] for record in history] == [0] + [len(versions[v][0]) for v in range(2, 8)]
+    assert [record['label'] for record in history[1:]] == [f'export{i}.csv' for i in range(6)]
+    assert history[-1]['current'] and not any(record['current'] for record in history[:-1])
+
+def test_revert_then_restore_round_trips(master_path, versions, import_files):
+    store = ledger_store(master_path)
+    last_ledger, last_fingerprint = versions[7]
+
+    # Reverting the last import is the ledger before it, fingerprint included
+    reverted = store.revert(7)
+    assert same_rows(store.read(), versions[6][0]) and store.fingerprint() == versions[6][1]
+    assert store.history()[-1]['action'] == 'revert'
+
+    # Restoring the version before the revert brings back exactly its rows and fingerprint
+    restored = store.restore(7)
+    assert restored == reverted + 1
+    assert same_rows(store.read(), last_ledger) and store.fingerprint() == last_fingerprint
+    assert same_rows(DataFrameOperations.read_master(master_path), last_ledger)
+
+    # And restoring the reverted version goes back again
+    store.restore(reverted)
+    assert same_rows(store.read(), versions[6][0]) and store.fingerprint() == versions[6][1]
+
+def test_reverting_a_middle_import_keeps_later_ones(master_path, versions, import_files):
+    store = ledger_store(master_path)
+    store.revert(4)
+    current = store.read()
+    added_by_4 = set(versions[4][0]['Reference']) - set(versions[3][0]['Reference'])
+    assert len(current) == len(versions[7][0]) - len(added_by_4)
+    assert not added_by_4 & set(current['Reference'])
+    assert same_rows(store.read(version=4), versions[4][0])
+
+    with pytest.raises(ValueError):
+        store.revert(4)  # its rows are already gone
+    store.restore(7)
+    assert same_rows(store.read(), versions[7][0]) and store.fingerprint() == versions[7][1]
+
+def test_reverted_rows_can_be_imported_again(master_path, versions, import_files):
+    store = ledger_store(master_path)
+    assert new_rows(import_files[-1], master_path) == 0
+    store.revert(7)
+    assert new_rows(import_files[-1], master_path) == len(versions[7][0]) - len(versions[6][0])
+    combined = import_file(import_files[-1], master_path)
+    assert same_rows(combined, versions[7][0]) and same_rows(store.read(), versions[7][0])
+
+def test_clear_and_restore(master_path, versions):
+    store = ledger_store(master_path)
+    store.clear()
+    assert len(store.read()) == 0 and store.history()[-1]['label'] == 'Delete File'
+    store.restore(7)
+    assert same_rows(store.read(), versions[7][0]) and store.fingerprint() == versions[7][1]
+
+def test_restored_versions_find_their_cached_results(master_path, versions):
+    store = ledger_store(master_path)
+    fingerprint = result_cache.fingerprint(master_path)
+    store.revert(7)
+    assert result_cache.fingerprint(master_path) != fingerprint
+    store.restore(7)
+    assert result_cache.fingerprint(master_path) == fingerprint
+
+def test_compaction_keeps_every_version(master_path, versions, monkeypatch):
+    store = ledger_store(master_path)
+    store.revert(4)
+    current, fingerprint = store.read(), store.fingerprint()
+    monkeypatch.setattr(def_ledger_store, 'COMPACTION_FANIN', 2)
+    while store.compact():
+        pass
+    assert any(len(segment['parts']) > 1 for segment in store.segments())
+    for version, (ledger, _) in versions.items():
+        assert same_rows(store.read(version=version), ledger)
+    assert same_rows(store.read(), current) and store.fingerprint() == fingerprint
+    store.restore(7)
+    assert same_rows(store.read(), versions[7][0]) and store.fingerprint() == versions[7][1]
+
+def test_history_is_trimmed_to_max_versions(master_path, versions, monkeypatch):
+    store = ledger_store(master_path)
+    added_by_3 = set(versions[3][0]['Reference']) - set(versions[2][0]['Reference'])
+    store.revert(3)                # version 8
+    monkeypatch.setattr(def_ledger_store, 'MAX_VERSIONS', 3)
+    store.clear()                  # version 9
+    store.restore(8)               # version 10
+    assert [record['version'] for record in store.history()] == [8, 9, 10]
+    with pytest.raises(ValueError):
+        store.read(version=7)
+    with pytest.raises(ValueError):
+        store.restore(3)
+
+    # The import of version 3 is in no kept version any more: its part is forgotten and its
+    # rows leave the segments at the next compaction
+    assert len(store.manifest()['parts']) == 5
+    monkeypatch.setattr(def_ledger_store, 'COMPACTION_FANIN', 2)
+    while store.compact():
+        pass
+    stored = set()
+    for segment in store.segments():
+        stored.update(DataFrameOperations.load_ledger(store.segment_path(segment['name']))['Reference'])
+    assert not added_by_3 & stored
+    assert same_rows(store.read(), store.read(version=8)) and len(store.read(version=9)) == 0
+    assert len(store.read()) == len(versions[7][0]) - len(added_by_3)
@@ -0,0 +1,119 @@
+import itertools
+import numpy as np
+import pytest
+from def_metric_registry import registry
+from def_metrics import TradingMetrics
+from def_result_cache import DEFAULT_RISK_FREE_RATE
+
+CASH_RATE = DEFAULT_RISK_FREE_RATE / 365
+
+def count_calls(monkeypatch, node_name):
+    # Counts how often the graph evaluator runs a node
+    node = registry.nodes[node_name]
+    calls = []
+    func = node.func
+    monkeypatch.setattr(node, 'func', lambda *args: calls.append(node_name) or func(*args))
+    return calls
+
+def longest_run(flags):
+    return max((sum(1 for _ in group) for key, group in itertools.groupby(flags) if key), default=0)
+
+def test_metrics_match_the_baseline_formulas(ledger_path, baseline_deals, baseline_returns):
+    metrics = TradingMetrics(ledger_path)
+    pl = baseline_deals['PL Amount']
+    returns = baseline_returns
+    wins, losses = pl[pl > 0].sum(), pl[pl < 0].sum()
+    win_rate = (pl > 0).sum() / len(pl)
+    avg_win, avg_loss = wins / (pl > 0).sum(), losses / (pl <= 0).sum()
+    compounded = (1 + returns).cumprod()
+    balance = baseline_deals['Balance']
+
+    assert metrics.total_trades() == len(pl)
+    assert metrics.win_rate() == pytest.approx(win_rate)
+    assert metrics.profit_factor() == pytest.approx(wins / losses)
+    assert metrics.average_trade() == pytest.approx(pl.mean())
+    assert metrics.expectancy() == pytest.approx(win_rate * avg_win - (1 - win_rate) * avg_loss)
+    assert metrics.maximum_consecutive_wins() == longest_run(pl > 0)
+    assert metrics.maximum_consecutive_losses() == longest_run(pl < 0)
+    assert metrics.sharpe_ratio() == pytest.approx((returns.mean() - CASH_RATE) / np.std(returns))
+    assert metrics.sortino_ratio() == pytest.approx((returns.mean() - CASH_RATE) / np.std(returns[returns < 0]))
+    assert metrics.omega_ratio() == pytest.approx(returns[returns > CASH_RATE].sum() / abs(returns[returns <= CASH_RATE].sum()))
+    assert metrics.gain_to_pain_ratio() == pytest.approx(returns.sum() / abs(returns[returns < 0].sum()))
+    assert metrics.max_drawdown() == pytest.approx(max(min((compounded / compounded.cummax() - 1).min(), 0), -1))
+    assert metrics.max_drawdown_dollars() == pytest.approx((balance.cummax() - balance).max())
+    assert metrics.ulcer_index() == pytest.approx(np.sqrt(np.mean((1 - balance / balance.cummax()) ** 2)))
+
+def test_parameters_pass_through_the_graph(ledger_path, baseline_returns):
+    metrics = TradingMetrics(ledger_path)
+    assert metrics.value_at_risk(0.99) == pytest.approx(np.percentile(baseline_returns, 1))
+    assert metrics.downside_deviation(0.01) == pytest.approx(np.sqrt(np.mean(baseline_returns[baseline_returns < 0.01] ** 2)))
+
+def test_shared_inputs_run_once_per_filter_state(ledger_path, monkeypatch):
+    returns_calls = count_calls(monkeypatch, 'returns')
+    analysis_calls = count_calls(monkeypatch, 'balance_drawdown_analysis')
+    metrics = TradingMetrics(ledger_path)
+    assert returns_calls == [] and analysis_calls == []  # nothing is computed eagerly
+
+    metrics.sharpe_ratio(), metrics.sortino_ratio(), metrics.omega_ratio(), metrics.max_drawdown()
+    metrics.max_drawdown_dollars(), metrics.pain_index(), metrics.ulcer_index()
+    assert len(returns_calls) == 1 and len(analysis_calls) == 1
+
+    market = sorted(metrics.trades['MarketName'].dropna().unique())[1]
+    metrics.filter_by_market(market)
+    assert metrics.graph_cache == {} and len(returns_calls) == 1
+    metrics.sharpe_ratio(), metrics.tail_ratio()
+    assert len(returns_calls) == 2
+
+def test_only_the_requested_subgraph_is_evaluated(ledger_path):
+    metrics = TradingMetrics(ledger_path)
+    metrics.evaluate('win_rate')
+    assert 'returns' not in metrics.graph_cache
+    assert {'deal_trades', 'profitable_trades', 'total_trades', 'win_rate'} <= set(metrics.graph_cache)
+
+def test_custom_metrics_join_the_report(ledger_path, monkeypatch, baseline_returns):
+    monkeypatch.setattr(registry, 'nodes', dict(registry.nodes))
+    registry.register('return_over_vol', lambda metrics, returns, std_dev: np.mean(returns) / std_dev,
+                      inputs=('returns', 'std_dev'), title='Return / Vol')
+    metrics = TradingMetrics(ledger_path)
+    title, metric_func = metrics.generate_report()[-1]
+    assert title == 'Return / Vol'
+    assert metric_func() == format(baseline_returns.mean() / np.std(baseline_returns), '.2f')
+
+def test_dependency_cycles_are_rejected(monkeypatch):
+    monkeypatch.setattr(registry, 'nodes', dict(registry.nodes))
+    registry.register('cycle_a', lambda metrics, b: b, inputs=('cycle_b',))
+    registry.register('cycle_b', lambda metrics, a: a, inputs=('cycle_a',))
+    with pytest.raises(ValueError):
+        registry.evaluation_order(['cycle_a'])
+    with pytest.raises(ValueError):
+        registry.register('self_loop', lambda metrics, x: x, inputs=('self_loop',))
+
+def test_snapshots_fill_their_own_caches(ledger_path):
+    metrics = TradingMetrics(ledger_path)
+    metrics.evaluate('returns')
+    snapshot = metrics.snapshot()
+    assert snapshot.graph_cache == metrics.graph_cache and snapshot.graph_cache is not metrics.graph_cache
+
+    # What a snapshot computes stays in the snapshot until it is merged back
+    snapshot.sharpe_ratio(), snapshot.ledger_calendar_cube('Asia/Tokyo')
+    assert 'sharpe_ratio' not in metrics.graph_cache and metrics.ledger_cubes == {}
+    metrics.merge_snapshot(snapshot)
+    assert metrics.graph_cache['sharpe_ratio'] == snapshot.graph_cache['sharpe_ratio']
+    assert metrics.ledger_cubes['Asia/Tokyo'] is snapshot.ledger_cubes['Asia/Tokyo']
+
+    # A snapshot of an older filter state only brings back the ledger cubes
+    stale = metrics.snapshot()
+    stale.tail_ratio(), stale.ledger_calendar_cube('Europe/London')
+    metrics.filter_by_market(sorted(metrics.trades['MarketName'].dropna().unique())[1])
+    metrics.merge_snapshot(stale)
+    assert 'tail_ratio' not in metrics.graph_cache and 'Europe/London' in metrics.ledger_cubes
+
+def test_imports_extend_new_calendar_cubes(ledger_path, baseline_deals):
+    metrics = TradingMetrics(ledger_path)
+    cube = metrics.ledger_calendar_cube()
+    trades, pnl = len(cube), cube.table('weekday')['pnl'].sum()
+    extended = cube.extended(metrics.trades.iloc[:100])
+    assert len(cube) == trades and cube.table('weekday')['pnl'].sum() == pytest.approx(pnl)
+    new_deals = baseline_deals[baseline_deals.index < 100]
+    assert len(extended) == trades + len(new_deals)
+    assert extended.table('weekday')['pnl'].sum() == pytest.approx(pnl + new_deals['PL Amount'].sum())
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+import def_quantiles
+from def_quantiles import SortedReturns, QuantileDigest, quantile_cache
+from def_metrics import TradingMetrics
+
+PERCENTILES = [0, 0.1, 1, 5, 12.5, 25, 50, 75, 95, 99, 99.9, 100]
+
+@pytest.fixture(scope='module')
+def sample():
+    # Fat-tailed daily returns, with ties, like a real P&L history
+    rng = np.random.default_rng(3)
+    return np.round(rng.standard_t(3, size=5001) * 0.01, 4)
+
+def test_percentiles_match_numpy(sample):
+    ordered = SortedReturns(sample)
+    assert list(ordered.percentile(PERCENTILES)) == list(np.percentile(sample, PERCENTILES))
+    assert all(ordered.percentile(p) == np.percentile(sample, p) for p in PERCENTILES)
+    assert ordered.quantile(0.3) == np.quantile(sample, 0.3)
+    for values in ([], [0.5], [0.2, -0.1]):
+        expected = np.percentile(values, 5) if values else np.nan
+        assert SortedReturns(values).percentile(5) == pytest.approx(expected, nan_ok=True)
+
+def test_prefix_sums_match_naive_counts(sample):
+    ordered = SortedReturns(sample)
+    thresholds = [-1.0, -0.02, 0.0, sample[7], 0.013, 1.0]
+    assert list(ordered.count_at_or_below(thresholds)) == [(sample <= t).sum() for t in thresholds]
+    assert ordered.sum_at_or_below(thresholds) == pytest.approx([sample[sample <= t].sum() for t in thresholds])
+    assert ordered.total() == pytest.approx(sample.sum())
+    assert ordered.tail_mean(-0.02) == pytest.approx(sample[sample <= -0.02].mean())
+    assert np.isnan(ordered.tail_mean(-1.0))
+
+def test_above_and_below_are_strict(sample):
+    ordered = SortedReturns(sample)
+    assert list(ordered.above(0).values) == sorted(sample[sample > 0])
+    assert list(ordered.below(0).values) == sorted(sample[sample < 0])
+    assert ordered.below(0).percentile(95) == np.percentile(sample[sample < 0], 95)
+
+def test_digest_tracks_exact_quantiles():
+    # Added in pieces smaller than the buffer, so several merges happen along the way
+    rng = np.random.default_rng(4)
+    values = rng.standard_t(3, size=400_000) * 0.01
+    digest = QuantileDigest(buffer_size=50_000)
+    for chunk in np.array_split(values, 9):
+        digest.add(chunk)
+    assert len(digest) == len(values)
+    assert len(digest.means) < digest.compression
+
+    exact = SortedReturns(values)
+    spread = exact.percentile(99.9) - exact.percentile(0.1)
+    for p in [0.1, 1, 5, 50, 95, 99, 99.9]:
+        assert abs(digest.percentile(p) - exact.percentile(p)) < 0.005 * spread
+    assert digest.percentile(0) == values.min() and digest.percentile(100) == values.max()
+    assert digest.total() == pytest.approx(values.sum())
+    assert digest.count_at_or_below(0.0) == pytest.approx((values <= 0).sum(), rel=0.01)
+    assert digest.tail_mean(exact.percentile(5)) == pytest.approx(exact.tail_mean(exact.percentile(5)), rel=0.02)
+    assert abs(digest.below(0).percentile(95) - exact.below(0).percentile(95)) < 0.005 * spread
+
+def test_large_histories_switch_to_the_digest(monkeypatch, sample):
+    assert isinstance(quantile_cache(sample), SortedReturns)
+    monkeypatch.setattr(def_quantiles, 'EXACT_LIMIT', 1000)
+    assert isinstance(quantile_cache(sample), QuantileDigest)
+
+def test_tail_metrics_match_the_baseline_formulas(ledger_path, baseline_returns):
+    metrics = TradingMetrics(ledger_path)
+    returns = baseline_returns.values
+    for confidence in (0.9, 0.95, 0.99):
+        var = np.percentile(returns, 100 * (1 - confidence))
+        assert metrics.value_at_risk(confidence) == pytest.approx(var)
+        assert metrics.expected_shortfall(confidence) == pytest.approx(np.mean(returns[returns <= var]))
+    positive, negative = returns[returns > 0], returns[returns < 0]
+    assert metrics.rachev_ratio() == pytest.approx(np.percentile(positive, 5) / abs(np.percentile(negative, 95)))
+    assert metrics.tail_ratio() == pytest.approx(abs(np.percentile(returns, 95)) / abs(np.percentile(returns, 5)))
@@ -0,0 +1,36 @@
+import pytest
+from def_report import run_report, build_parser
+from def_sessions import session_masks, in_session
+
+def test_session_filter(ledger_path, baseline_deals):
+    rows = run_report(ledger_path, trading_sessions=['London', 'Off hours'])
+    assert [row['session'] for row in rows] == ['London', 'Off hours']
+    for row in rows:
+        selected = in_session(session_masks(baseline_deals['DateUtc']), row['session'])
+        pl = baseline_deals.loc[selected, 'PL Amount']
+        assert row['metrics']['Total Trades'] == str(selected.sum())
+        assert row['metrics']['Win Rate'] == f"{(pl > 0).mean():.2%}"
+
+    # Each session is its own cached result
+    assert run_report(ledger_path)[0]['metrics']['Total Trades'] == str(len(baseline_deals))
+    assert run_report(ledger_path, trading_sessions=['London']) == rows[:1]
+
+def test_where_filter(ledger_path, baseline_deals):
+    where = ['or', {'direction': 'long', 'outcome': 'win'}, {'session': 'London'}]
+    rows = run_report(ledger_path, trading_sessions=[None, 'Japan'], where=where)
+    long_wins = (baseline_deals['Size'].astype(float) > 0) & (baseline_deals['PL Amount'] > 0)
+    london = in_session(session_masks(baseline_deals['DateUtc']), 'London')
+    japan = in_session(session_masks(baseline_deals['DateUtc']), 'Japan')
+    assert rows[0]['where'] == '["or", {"direction": "long", "outcome": "win"}, {"session": "London"}]'
+    assert rows[0]['metrics']['Total Trades'] == str((long_wins | london).sum())
+    assert rows[1]['metrics']['Total Trades'] == str(((long_wins | london) & japan).sum())
+
+    # The expression is part of the cache key
+    assert run_report(ledger_path, where={'direction': 'short'})[0]['metrics'] != rows[0]['metrics']
+    assert run_report(ledger_path, where=where) == rows[:1]
+
+def test_where_takes_json_expressions():
+    args = build_parser().parse_args(['m1.csv', '--where', '["or", {"outcome": "win"}, {"session": "London"}]'])
+    assert args.where == ['or', {'outcome': 'win'}, {'session': 'London'}]
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(['m1.csv', '--where', '{direction: long}'])